@@ -12,6 +12,32 @@
 
 class DocsController extends Controller
 {
+    /**
+     * Sample slots kept per sampling (1-5)
+     */
+    private const SAMPLE_SLOTS = 5;
+
+    /**
+     * Maximum measurements accepted by one bulk weight request
+     */
+    private const BULK_MAX_MEASUREMENTS = 200;
+
+    /**
+     * Columns clients may request with ?fields= (cages) and ?sampling_fields= (samplings)
+     */
+    private const CAGE_FIELDS = ['id', 'investor_id', 'feed_types_id', 'number_of_fingerlings', 'type', 'farmer_id', 'created_at', 'updated_at'];
+    private const SAMPLING_FIELDS = ['id', 'investor_id', 'date_sampling', 'doc', 'cage_no', 'mortality', 'feed_types_id', 'created_at', 'updated_at'];
+
+    /**
+     * Columns returned by the DOC lookup
+     */
+    private const LOOKUP_FIELDS = ['id', 'doc', 'cage_no', 'investor_id', 'date_sampling', 'updated_at'];
+
+    /**
+     * Largest page accepted by ?per_page=
+     */
+    private const MAX_PER_PAGE = 200;
+
     /**
      * Check if the provided key is valid
      * In a real system, you'd check against a database or config
@@ -26,10 +52,54 @@ private function checkKey($key)
         return $key !== $validKey;
     }
 
+    /**
+     * JSON response with a strong ETag; answers 304 without a body when the
+     * client's If-None-Match already matches
+     */
+    private function conditionalJson(Request $request, array $payload, int $status = 200)
+    {
+        $response = response()->json($payload, $status);
+        $response->setEtag(md5($response->getContent()));
+        $response->headers->set('Cache-Control', 'private, no-cache');
+        $response->isNotModified($request);
+
+        return $response;
+    }
+
+    /**
+     * Samplings with the given DOC(s), newest first.
+     * A DOC can belong to more than one sampling; every endpoint resolves it to the
+     * newest one (highest id), so a sampling_id from the lookup is the one weighed.
+     */
+    private function samplingsForDoc($docs)
+    {
+        return Sampling::whereIn('doc', (array) $docs)->orderByDesc('id');
+    }
+
+    /**
+     * Comma-separated column list from the request, limited to $allowed.
+     * Always includes $required (keys the relations need).
+     */
+    private function selectedFields(Request $request, string $name, array $allowed, array $required)
+    {
+        if (!$request->filled($name)) {
+            return null;
+        }
+
+        $fields = array_intersect(array_map('trim', explode(',', $request->input($name))), $allowed);
+
+        return array_values(array_unique(array_merge($required, $fields)));
+    }
+
     /**
      * Get all cages with their samplings
-     * 
+     * Without parameters this returns every cage with its samplings, investor and
+     * feed type. ?fields= and ?sampling_fields= (comma-separated columns) return a
+     * lean payload without investor/feed type, and ?per_page= (with ?page=) paginates.
+     * Responses carry an ETag; send it back as If-None-Match to get 304 when unchanged.
+     *
      * GET /api/cages?key=your-api-key
+     * GET /api/cages?key=your-api-key&fields=id&sampling_fields=id,doc&per_page=50&page=2
      */
     public function index(Request $request)
     {
@@ -43,15 +113,79 @@ public function index(Request $request)
             }
         }
 
-        $cages = Cage::with(['samplings', 'investor', 'feedType'])->get();
+        $cageFields = $this->selectedFields($request, 'fields', self::CAGE_FIELDS, ['id']);
+        $samplingFields = $this->selectedFields($request, 'sampling_fields', self::SAMPLING_FIELDS, ['id', 'cage_no']);
 
-        return response()->json(
-            [
+        if ($cageFields === null && $samplingFields === null) {
+            $query = Cage::with(['samplings', 'investor', 'feedType']);
+        } else {
+            $query = Cage::query()
+                ->select($cageFields ?? ['*'])
+                ->with(['samplings' => function ($q) use ($samplingFields) {
+                    $q->select($samplingFields ?? ['*']);
+                }]);
+        }
+        $query->orderBy('id');
+
+        if (!$request->filled('per_page')) {
+            return $this->conditionalJson($request, [
                 'message' => 'Cages fetch successfully',
-                'data' => $cages,
+                'data' => $query->get(),
+            ]);
+        }
+
+        $perPage = max(1, min(self::MAX_PER_PAGE, (int) $request->input('per_page')));
+        $page = $query->paginate($perPage);
+
+        return $this->conditionalJson($request, [
+            'message' => 'Cages fetch successfully',
+            'data' => $page->items(),
+            'meta' => [
+                'current_page' => $page->currentPage(),
+                'last_page' => $page->lastPage(),
+                'per_page' => $page->perPage(),
+                'total' => $page->total(),
             ],
-            200
-        );
+        ]);
+    }
+
+    /**
+     * Resolve a DOC to its sampling
+     * Indexed single-row lookup returning only the fields a device needs, instead of
+     * downloading every cage and sampling. Supports ETag/If-None-Match.
+     *
+     * GET /api/samplings/lookup?key=your-api-key&doc=DOC-20251116-25
+     */
+    public function lookupDoc(Request $request)
+    {
+        if (!$request->filled("key")) {
+            return response()->json(['message' => 'Key is required or the key is invalid'], 422);
+        } else {
+            $isInvalid = $this->checkKey($request->input('key'));
+
+            if ($isInvalid) {
+                return response()->json(['message' => 'Key is required or the key is invalid'], 422);
+            }
+        }
+
+        $validator = Validator::make($request->all(), ['doc' => 'required|string']);
+
+        if ($validator->fails()) {
+            return response()->json(['errors' => $validator->errors()], 422);
+        }
+
+        $sampling = $this->samplingsForDoc($request->input('doc'))
+            ->select(self::LOOKUP_FIELDS)
+            ->first();
+
+        if (!$sampling) {
+            return response()->json(['message' => 'Sampling not found for this DOC.', 'data' => null], 404);
+        }
+
+        return $this->conditionalJson($request, [
+            'message' => 'Sampling found',
+            'data' => $sampling,
+        ]);
     }
 
     /**
@@ -86,54 +220,18 @@ public function getWeight(Request $request)
             return response()->json(['errors' => $validator->errors()], 422);
         }
 
-        // Normalize to centimetres. Devices (e.g. YOLO bbox) often send inches via `unit=in`.
-        // Map longer axis → standard length, shorter → body width (fixes bbox orientation vs. fish axes).
-        $heightRaw = (float) $request->input('height');
-        $widthRaw = (float) $request->input('width');
-        $unit = strtolower((string) $request->input('unit', 'cm'));
-        if ($unit === 'in') {
-            $heightRaw *= 2.54;
-            $widthRaw *= 2.54;
-        }
-        $lengthCm = max($heightRaw, $widthRaw);
-        $widthCm = min($heightRaw, $widthRaw);
-
-        // Convert measurements to weight using the formula from the reference
-        // Formula: weight = (width * (height^2)) / 690
-        // Inputs must be cm; convert cm to inches: 1 cm = 0.3937 inches
-        // Multiply by 453.592 to convert pounds to grams
-        $heightIn = ($lengthCm * 0.3937) * 1.9;
-        $widthIn = $widthCm * 0.3937;
-        $weight = ($widthIn * ($heightIn * $heightIn)) / 690;
-        $final_weight = $weight * 453.592;
+        [$final_weight, $lengthCm, $widthCm] = $this->calculateFishWeight(
+            (float) $request->input('height'),
+            (float) $request->input('width'),
+            (string) $request->input('unit', 'cm')
+        );
 
         // Find the sampling using DOC instead of ID
-        $sampling = Sampling::with('samples')
-            ->where('doc', $request->input('doc'))
+        $sampling = $this->samplingsForDoc($request->input('doc'))
+            ->with('samples')
             ->firstOrFail();
 
-        // Ensure there are always 5 sample slots for this sampling (1-5)
-        $desiredSampleCount = 5;
-        
-        // Get all existing sample numbers for this sampling (convert to integers for proper comparison)
-        $existingSampleNos = Sample::where('sampling_id', $sampling->id)
-            ->pluck('sample_no')
-            ->map(function($no) {
-                return (int) $no; // Convert string to integer
-            })
-            ->toArray();
-        
-        // Create any missing samples from 1 to 5
-        for ($i = 1; $i <= $desiredSampleCount; $i++) {
-            if (!in_array($i, $existingSampleNos)) {
-                Sample::create([
-                    'investor_id' => $sampling->investor_id,
-                    'sampling_id' => $sampling->id,
-                    'sample_no' => (string) $i, // Store as string to match database type
-                    'weight' => 0,
-                ]);
-            }
-        }
+        $this->ensureSampleSlots($sampling);
 
         // Get the first sample with weight 0 (unfilled), ordered by sample_no as integer
         // Use CAST to ensure proper numeric ordering (not string ordering)
@@ -157,17 +255,7 @@ public function getWeight(Request $request)
             ]);
 
             // Recalculate statistics for the sampling
-            $desiredSampleCount = 5;
-            $total_weight = Sample::where('sampling_id', $sampling->id)->sum('weight');
-            $has_data_count = Sample::where('weight', '>', 0)
-                ->where('sampling_id', $sampling->id)
-                ->count();
-
-            // Calculate Average Body Weight (ABW)
-            $abw = $has_data_count > 0 ? round($total_weight / $has_data_count, 3) : 0;
-
-            // Remaining samples = total slots (5) - filled slots
-            $remaining_samples = max(0, $desiredSampleCount - $has_data_count);
+            ['abw' => $abw, 'total_weight' => $total_weight, 'remaining_samples' => $remaining_samples] = $this->samplingStats($sampling);
 
             // If you want to update sampling with these stats, uncomment below
             // Note: Add these fields to samplings table if they don't exist
@@ -198,6 +286,223 @@ public function getWeight(Request $request)
         }
     }
 
+    /**
+     * Calculate weights for many measurements in one request
+     * Used by devices that queue measurements offline and upload them in batches.
+     * Each measurement fills the next empty sample slot of its sampling, exactly like
+     * POST /api/weight. A measurement whose idempotency_key was already stored is
+     * reported as a duplicate instead of filling another slot, so retries are safe.
+     *
+     * POST /api/weight/bulk?key=your-api-key
+     * Body: { "measurements": [{ "doc": "DOC-20251116-25", "height": 8.2, "width": 2.3, "unit": "in", "idempotency_key": "..." }] }
+     */
+    public function getWeightBulk(Request $request)
+    {
+        if (!$request->filled("key")) {
+            return response()->json(['message' => 'Key is required or the key is invalid'], 422);
+        } else {
+            $isInvalid = $this->checkKey($request->input('key'));
+
+            if ($isInvalid) {
+                return response()->json(['message' => 'Key is required or the key is invalid'], 422);
+            }
+        }
+
+        $rules = [
+            'measurements' => 'required|array|min:1|max:' . self::BULK_MAX_MEASUREMENTS,
+            'measurements.*.height' => 'required|numeric|min:0',
+            'measurements.*.width' => 'required|numeric|min:0',
+            'measurements.*.doc' => 'required|string',
+            'measurements.*.unit' => 'nullable|string|in:cm,in',
+            'measurements.*.idempotency_key' => 'nullable|string|max:64',
+        ];
+
+        $validator = Validator::make($request->all(), $rules);
+
+        if ($validator->fails()) {
+            return response()->json(['errors' => $validator->errors()], 422);
+        }
+
+        $measurements = $request->input('measurements');
+
+        // One query each for the samplings and the already-stored idempotency keys.
+        // unique() keeps the first, i.e. newest, sampling of each DOC.
+        $samplings = $this->samplingsForDoc(collect($measurements)->pluck('doc')->unique()->values()->all())
+            ->get()
+            ->unique('doc')
+            ->keyBy('doc');
+
+        $keys = collect($measurements)->pluck('idempotency_key')->filter()->unique()->values();
+        $existing = $keys->isEmpty()
+            ? collect()
+            : Sample::whereIn('idempotency_key', $keys)->get()->keyBy('idempotency_key');
+
+        $results = [];
+        $touched = [];
+
+        DB::beginTransaction();
+        try {
+            $openSlots = [];
+
+            foreach ($measurements as $index => $measurement) {
+                $key = $measurement['idempotency_key'] ?? null;
+                $doc = $measurement['doc'];
+                $result = ['index' => $index, 'idempotency_key' => $key, 'doc' => $doc];
+
+                if ($key !== null && $existing->has($key)) {
+                    $sample = $existing->get($key);
+                    $results[] = $result + [
+                        'status' => 'duplicate',
+                        'sample_no' => $sample->sample_no,
+                        'weight' => round((float) $sample->weight, 3),
+                    ];
+                    continue;
+                }
+
+                $sampling = $samplings->get($doc);
+                if (!$sampling) {
+                    $results[] = $result + ['status' => 'rejected', 'message' => 'The selected doc is invalid.'];
+                    continue;
+                }
+
+                if (!array_key_exists($sampling->id, $openSlots)) {
+                    $this->ensureSampleSlots($sampling);
+                    $openSlots[$sampling->id] = Sample::where('weight', 0)
+                        ->where('sampling_id', $sampling->id)
+                        ->orderByRaw('CAST(sample_no AS UNSIGNED) ASC')
+                        ->get()
+                        ->all();
+                }
+
+                $sample = array_shift($openSlots[$sampling->id]);
+                if (!$sample) {
+                    $results[] = $result + ['status' => 'rejected', 'message' => 'All data is filled in this sampling.'];
+                    continue;
+                }
+
+                [$final_weight, $lengthCm, $widthCm] = $this->calculateFishWeight(
+                    (float) $measurement['height'],
+                    (float) $measurement['width'],
+                    (string) ($measurement['unit'] ?? 'cm')
+                );
+
+                $sample->update([
+                    'weight' => round($final_weight, 3),
+                    'length' => round($lengthCm, 2),
+                    'width' => round($widthCm, 2),
+                    'idempotency_key' => $key,
+                ]);
+
+                if ($key !== null) {
+                    $existing->put($key, $sample);
+                }
+                $touched[$doc] = $sampling;
+
+                $results[] = $result + [
+                    'status' => 'created',
+                    'sample_no' => $sample->sample_no,
+                    'weight' => round($final_weight, 3),
+                ];
+            }
+
+            $stats = [];
+            foreach ($touched as $doc => $sampling) {
+                $stats[$doc] = $this->samplingStats($sampling);
+            }
+
+            DB::commit();
+        } catch (\Exception $e) {
+            DB::rollBack();
+            return response()->json(['message' => 'Something went wrong while processing.'], 422);
+        }
+
+        $statuses = collect($results)->countBy('status');
+
+        return response()->json(
+            [
+                'message' => 'Bulk weights processed',
+                'data' => [
+                    'created' => $statuses->get('created', 0),
+                    'duplicates' => $statuses->get('duplicate', 0),
+                    'rejected' => $statuses->get('rejected', 0),
+                    'results' => $results,
+                    'samplings' => $stats,
+                ],
+            ],
+            200
+        );
+    }
+
+    /**
+     * Convert raw device dimensions to [weight in grams, length cm, width cm]
+     */
+    private function calculateFishWeight(float $heightRaw, float $widthRaw, string $unit)
+    {
+        // Normalize to centimetres. Devices (e.g. YOLO bbox) often send inches via `unit=in`.
+        // Map longer axis → standard length, shorter → body width (fixes bbox orientation vs. fish axes).
+        if (strtolower($unit) === 'in') {
+            $heightRaw *= 2.54;
+            $widthRaw *= 2.54;
+        }
+        $lengthCm = max($heightRaw, $widthRaw);
+        $widthCm = min($heightRaw, $widthRaw);
+
+        // Convert measurements to weight using the formula from the reference
+        // Formula: weight = (width * (height^2)) / 690
+        // Inputs must be cm; convert cm to inches: 1 cm = 0.3937 inches
+        // Multiply by 453.592 to convert pounds to grams
+        $heightIn = ($lengthCm * 0.3937) * 1.9;
+        $widthIn = $widthCm * 0.3937;
+        $weight = ($widthIn * ($heightIn * $heightIn)) / 690;
+
+        return [$weight * 453.592, $lengthCm, $widthCm];
+    }
+
+    /**
+     * Ensure there are always 5 sample slots for this sampling (1-5)
+     */
+    private function ensureSampleSlots(Sampling $sampling)
+    {
+        // Get all existing sample numbers for this sampling (convert to integers for proper comparison)
+        $existingSampleNos = Sample::where('sampling_id', $sampling->id)
+            ->pluck('sample_no')
+            ->map(function($no) {
+                return (int) $no; // Convert string to integer
+            })
+            ->toArray();
+
+        // Create any missing samples from 1 to 5
+        for ($i = 1; $i <= self::SAMPLE_SLOTS; $i++) {
+            if (!in_array($i, $existingSampleNos)) {
+                Sample::create([
+                    'investor_id' => $sampling->investor_id,
+                    'sampling_id' => $sampling->id,
+                    'sample_no' => (string) $i, // Store as string to match database type
+                    'weight' => 0,
+                ]);
+            }
+        }
+    }
+
+    /**
+     * ABW, total weight and remaining slots for a sampling
+     */
+    private function samplingStats(Sampling $sampling)
+    {
+        $total_weight = Sample::where('sampling_id', $sampling->id)->sum('weight');
+        $has_data_count = Sample::where('weight', '>', 0)
+            ->where('sampling_id', $sampling->id)
+            ->count();
+
+        return [
+            // Calculate Average Body Weight (ABW)
+            'abw' => $has_data_count > 0 ? round($total_weight / $has_data_count, 3) : 0,
+            'total_weight' => round($total_weight, 3),
+            // Remaining samples = total slots (5) - filled slots
+            'remaining_samples' => max(0, self::SAMPLE_SLOTS - $has_data_count),
+        ];
+    }
+
     /**
      * Calculate samplings for a given sampling session
      * This is for getting the next sample to measure
@@ -15,6 +15,7 @@ class Sample extends Model
         'weight',
         'length',
         'width',
+        'idempotency_key',
     ];
 
     public function investor() {
@@ -0,0 +1,29 @@
+<?php
+
+use Illuminate\Database\Migrations\Migration;
+use Illuminate\Database\Schema\Blueprint;
+use Illuminate\Support\Facades\Schema;
+
+return new class extends Migration
+{
+    /**
+     * Run the migrations.
+     */
+    public function up(): void
+    {
+        Schema::table('samples', function (Blueprint $table) {
+            $table->string('idempotency_key', 64)->nullable()->unique()->after('width');
+        });
+    }
+
+    /**
+     * Reverse the migrations.
+     */
+    public function down(): void
+    {
+        Schema::table('samples', function (Blueprint $table) {
+            $table->dropUnique(['idempotency_key']);
+            $table->dropColumn('idempotency_key');
+        });
+    }
+};
@@ -0,0 +1,139 @@
+"""
+Motion-gated, latency-adaptive scheduling of YOLO inference.
+
+Running the model on every frame wastes CPU when the tray is empty or nothing has
+moved. `InferenceScheduler` decides per frame whether to run the model:
+
+* a cheap frame difference on a small grayscale copy skips frames with no
+  meaningful change (the caller reuses the last detections), with a forced
+  refresh every `max_idle` seconds so results never go stale;
+* the target inference rate backs off when the measured latency exceeds the
+  budget and recovers when there is headroom.
+"""
+
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+RUN = "run"
+SKIP_STATIC = "skip_static"
+SKIP_RATE = "skip_rate"
+
+
+class MotionGate:
+    """
+    Args:
+        size: Downsampled (width, height) used for differencing.
+        pixel_delta: Grey-level change for a pixel to count as "changed".
+        changed_fraction: Fraction of changed pixels that counts as motion.
+    """
+
+    def __init__(self, size=(160, 90), pixel_delta=20, changed_fraction=0.01):
+        self.size = size
+        self.pixel_delta = pixel_delta
+        self.changed_fraction = changed_fraction
+        self._reference = None
+        self._small = np.empty((size[1], size[0]), dtype=np.uint8)
+        self.last_change = 0.0
+
+    def _downsample(self, frame):
+        gray = cv2.cvtColor(cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def changed(self, frame):
+        """True if `frame` differs meaningfully from the last reference frame."""
+        small = self._downsample(frame)
+        if self._reference is None:
+            self.last_change = 1.0
+            return True
+        cv2.absdiff(small, self._reference, dst=self._small)
+        self.last_change = float(np.count_nonzero(self._small > self.pixel_delta)) / self._small.size
+        return self.last_change >= self.changed_fraction
+
+    def set_reference(self, frame):
+        """Call after inference so later frames are compared with what was analysed."""
+        self._reference = self._downsample(frame)
+
+    def reset(self):
+        self._reference = None
+
+
+class InferenceScheduler:
+    """
+    Args:
+        target_fps / min_fps / max_fps: Starting, lowest and highest inference rate.
+        latency_budget_ms: Inference latency above which the rate is lowered.
+        max_idle: Seconds after which inference runs even without motion.
+    """
+
+    def __init__(self, target_fps=10.0, min_fps=1.0, max_fps=20.0, latency_budget_ms=150.0, max_idle=2.0, gate=None):
+        self.target_fps = target_fps
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.latency_budget = latency_budget_ms / 1000.0
+        self.max_idle = max_idle
+        self.gate = gate or MotionGate()
+
+        self._lock = threading.Lock()
+        self._last_run = 0.0
+        self._latency = None
+        self._decisions = deque(maxlen=120)
+        self._runs = deque(maxlen=60)
+
+    def decide(self, frame, now=None):
+        now = time.perf_counter() if now is None else now
+        since_last = now - self._last_run
+
+        if since_last < 1.0 / self.target_fps:
+            decision = SKIP_RATE
+        elif since_last < self.max_idle and not self.gate.changed(frame):
+            decision = SKIP_STATIC
+        else:
+            decision = RUN
+            self._last_run = now
+            self.gate.set_reference(frame)
+
+        with self._lock:
+            self._decisions.append(decision)
+            if decision == RUN:
+                self._runs.append(now)
+        return decision
+
+    def record_latency(self, seconds):
+        """Feed back the model latency of a RUN decision and adapt the target rate."""
+        with self._lock:
+            self._latency = seconds if self._latency is None else 0.8 * self._latency + 0.2 * seconds
+            if self._latency > self.latency_budget:
+                self.target_fps = max(self.min_fps, self.target_fps * 0.8)
+            elif self._latency < 0.6 * self.latency_budget:
+                self.target_fps = min(self.max_fps, self.target_fps * 1.1)
+
+    def reset(self):
+        self.gate.reset()
+        self._last_run = 0.0
+
+    def stats(self):
+        with self._lock:
+            decisions = list(self._decisions)
+            runs = list(self._runs)
+            latency = self._latency
+            target = self.target_fps
+
+        rate = 0.0
+        if len(runs) > 1 and runs[-1] > runs[0]:
+            rate = (len(runs) - 1) / (runs[-1] - runs[0])
+        skipped = sum(1 for d in decisions if d != RUN)
+        return {
+            "inference_fps": round(rate, 2),
+            "target_fps": round(target, 2),
+            "skip_ratio": round(skipped / len(decisions), 3) if decisions else 0.0,
+            "latency_ms": round(latency * 1000.0, 1) if latency is not None else None,
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        latency = f"{s['latency_ms']:.0f} ms" if s["latency_ms"] is not None else "-- ms"
+        return f"infer {s['inference_fps']:.1f}/s (target {s['target_fps']:.1f}), skip {s['skip_ratio']:.0%}, {latency}"
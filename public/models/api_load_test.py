@@ -0,0 +1,189 @@
+"""
+Asyncio load test comparing DOC resolution strategies against the API.
+
+Scenarios (each runs `--requests` requests over `--concurrency` keep-alive
+connections):
+
+* cages-full: GET /api/cages, the old way of resolving a DOC;
+* cages-lean: GET /api/cages?fields=id&sampling_fields=id,doc;
+* lookup: GET /api/samplings/lookup?doc=..., random known DOCs;
+* lookup-304: the same with If-None-Match from an earlier answer, i.e. what
+  `WeightApiClient` sends when a cached DOC's TTL expires.
+
+For each scenario it reports throughput, latency percentiles and bytes on the
+wire per request (status line + headers + body), plus the reduction against
+cages-full. Without `--url` a `stub_api_server` with a farm of `--cages` cages
+is started in-process.
+
+Usage:
+    python api_load_test.py --cages 300 --samplings 20 --requests 2000 --concurrency 32
+    python api_load_test.py --url http://127.0.0.1:8000 --key your-api-key --docs DOC-20251116-25,DOC-20251117-04
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from urllib.parse import quote, urlparse
+
+from benchmark_models import percentiles
+from stub_api_server import StubApi, serve_in_thread
+
+SCENARIOS = ("cages-full", "cages-lean", "lookup", "lookup-304")
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection on asyncio streams (GET only)."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def get(self, path, headers=None):
+        """Returns `(status, headers, body, wire_bytes)`."""
+        lines = [f"GET {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Accept: application/json"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        response_headers = {}
+        for line in head.decode("latin-1").split("\r\n")[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                response_headers[name.strip().lower()] = value.strip()
+        length = int(response_headers.get("content-length", "0"))
+        body = await self.reader.readexactly(length) if length else b""
+        return status, response_headers, body, len(head) + length
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+
+async def _worker(conn, jobs, samples):
+    while True:
+        try:
+            path, headers = jobs.pop()
+        except IndexError:
+            return
+        started = time.perf_counter()
+        status, _, _, wire = await conn.get(path, headers)
+        samples.append((status, (time.perf_counter() - started) * 1000.0, wire))
+
+
+async def run_scenario(host, port, jobs, concurrency):
+    conns = [Connection(host, port) for _ in range(concurrency)]
+    await asyncio.gather(*(c.open() for c in conns))
+    samples = []
+    started = time.perf_counter()
+    await asyncio.gather(*(_worker(c, jobs, samples) for c in conns))
+    elapsed = time.perf_counter() - started
+    await asyncio.gather(*(c.close() for c in conns))
+
+    statuses = {}
+    for status, _, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "requests": len(samples),
+        "statuses": statuses,
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": percentiles([ms for _, ms, _ in samples]),
+        "bytes_per_request": round(sum(w for _, _, w in samples) / len(samples)) if samples else 0,
+        "total_bytes": sum(w for _, _, w in samples),
+    }
+
+
+async def _etags(host, port, key, docs):
+    conn = Connection(host, port)
+    await conn.open()
+    etags = {}
+    for doc in docs:
+        status, headers, _, _ = await conn.get(f"/api/samplings/lookup?key={quote(key)}&doc={quote(doc)}")
+        if status == 200 and "etag" in headers:
+            etags[doc] = headers["etag"]
+    await conn.close()
+    return etags
+
+
+async def run(url, key, docs, requests, concurrency, scenarios=SCENARIOS, seed=0):
+    parsed = urlparse(url)
+    host, port = parsed.hostname, parsed.port or 80
+    rng = random.Random(seed)
+    key_q = quote(key)
+    picks = [rng.choice(docs) for _ in range(requests)]
+    etags = await _etags(host, port, key, sorted(set(picks))) if "lookup-304" in scenarios else {}
+
+    report = {}
+    for scenario in scenarios:
+        if scenario == "cages-full":
+            jobs = [(f"/api/cages?key={key_q}", None) for _ in picks]
+        elif scenario == "cages-lean":
+            jobs = [(f"/api/cages?key={key_q}&fields=id&sampling_fields=id,doc", None) for _ in picks]
+        elif scenario == "lookup":
+            jobs = [(f"/api/samplings/lookup?key={key_q}&doc={quote(doc)}", None) for doc in picks]
+        else:
+            jobs = [(f"/api/samplings/lookup?key={key_q}&doc={quote(doc)}", {"If-None-Match": etags.get(doc, "")}) for doc in picks]
+        report[scenario] = await run_scenario(host, port, jobs, concurrency)
+
+    baseline = report.get("cages-full")
+    if baseline and baseline["bytes_per_request"]:
+        for scenario, result in report.items():
+            result["bytes_saved_pct"] = round(100.0 * (1 - result["bytes_per_request"] / baseline["bytes_per_request"]), 2)
+            p50, base_p50 = result["latency_ms"].get("p50"), baseline["latency_ms"].get("p50")
+            if p50 and base_p50:
+                result["p50_speedup"] = round(base_p50 / p50, 2)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test DOC lookup vs. the full cages listing")
+    parser.add_argument("--url", default=None, help="API base URL (default: start a local stub)")
+    parser.add_argument("--key", default="stub-key")
+    parser.add_argument("--docs", default=None, help="Comma-separated DOCs to look up (default: all stub DOCs)")
+    parser.add_argument("--cages", type=int, default=300, help="Stub farm size")
+    parser.add_argument("--samplings", type=int, default=20, help="Stub samplings per cage")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.url is None:
+        api = StubApi(args.key, args.cages, args.samplings)
+        server, args.url = serve_in_thread(api)
+        docs = list(api.samplings)
+    elif args.docs:
+        docs = [d.strip() for d in args.docs.split(",") if d.strip()]
+    else:
+        parser.error("--docs is required with --url")
+
+    scenarios = [s for s in args.scenarios.split(",") if s in SCENARIOS]
+    try:
+        report = asyncio.run(run(args.url, args.key, docs, args.requests, args.concurrency, scenarios))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print(json.dumps(report, indent=2))
+    for scenario, result in report.items():
+        saved = f", {result['bytes_saved_pct']}% fewer bytes" if "bytes_saved_pct" in result else ""
+        print(
+            f"{scenario:<11} {result['throughput_rps']:>8} req/s  p50 {result['latency_ms'].get('p50')} ms  "
+            f"p95 {result['latency_ms'].get('p95')} ms  {result['bytes_per_request']} B/req{saved}",
+            file=sys.stderr,
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Headless batch detection for recorded sampling sessions.
+
+Streams frames from a video file, an image directory or a glob pattern through
+the same YOLO model and measurement rules as the desktop app, in fixed-size
+batches, and writes one row per detection as it goes. Only one batch of frames is
+held in memory at a time, so memory use does not grow with the input length.
+
+Usage:
+python batch_detect.py session.mp4 --output detections.jsonl
+python batch_detect.py "captures/*.jpg" --batch-size 16 --output detections.csv
+"""
+
+import argparse
+import contextlib
+import csv
+import glob
+import json
+import os
+import sys
+
+import cv2
+
+from detection import CONF_THRESHOLD, STAGES, load_model, measure_results
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".webp", ".tif", ".tiff"}
+
+ROW_FIELDS = ["frame", "x1", "y1", "x2", "y2", "conf", "length_in", "width_in", "stage"]
+
+
+def iter_image_paths(paths):
+    for path in paths:
+        if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+            yield path
+
+
+def iter_frames(source, frame_step=1):
+    """
+    Yield `(frame_id, frame)` pairs lazily from a video, directory or glob.
+
+    Args:
+        source: Video file, image directory, single image or glob pattern.
+        frame_step: Keep every Nth video frame (images are never skipped).
+    """
+    if os.path.isdir(source):
+        paths = iter_image_paths(sorted(os.path.join(source, name) for name in os.listdir(source)))
+    elif glob.has_magic(source):
+        paths = iter_image_paths(sorted(glob.iglob(source, recursive=True)))
+    elif os.path.splitext(source)[1].lower() in IMAGE_EXTENSIONS:
+        paths = [source]
+    else:
+        yield from iter_video_frames(source, frame_step)
+        return
+
+    for path in paths:
+        frame = cv2.imread(path)
+        if frame is None:
+            print(f"⚠️ Skipping unreadable image: {path}", file=sys.stderr)
+            continue
+        yield os.path.basename(path), frame
+
+
+def iter_video_frames(path, frame_step=1):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video source: {path}")
+
+    index = 0
+    try:
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            if index % frame_step == 0:
+                yield index, frame
+            index += 1
+    finally:
+        capture.release()
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def detections_to_rows(frame_id, boxes, conf_threshold=CONF_THRESHOLD):
+    m = measure_results(boxes, conf_threshold=conf_threshold)
+    return [
+        {
+            "frame": frame_id,
+            "x1": x1,
+            "y1": y1,
+            "x2": x2,
+            "y2": y2,
+            "conf": round(conf, 4),
+            "length_in": round(length_in, 2),
+            "width_in": round(width_in, 2),
+            "stage": STAGES[code],
+        }
+        for (x1, y1, x2, y2), conf, length_in, width_in, code in zip(
+            m.xyxy.tolist(), m.conf.tolist(), m.length_in.tolist(), m.width_in.tolist(), m.stage_codes.tolist()
+        )
+    ]
+
+
+class RowWriter:
+    """Write detection rows as JSONL or CSV, flushing after every batch."""
+
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.fmt = fmt
+        self._csv = None
+        if fmt == "csv":
+            self._csv = csv.DictWriter(stream, fieldnames=ROW_FIELDS)
+            self._csv.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            if self._csv is not None:
+                self._csv.writerow(row)
+            else:
+                self.stream.write(json.dumps(row) + "\n")
+        self.stream.flush()
+
+
+def run_batch(source, model, writer, batch_size=8, frame_step=1, conf_threshold=CONF_THRESHOLD):
+    frames_done = 0
+    detections_done = 0
+
+    for batch in batched(iter_frames(source, frame_step), batch_size):
+        frame_ids = [frame_id for frame_id, _ in batch]
+        frames = [frame for _, frame in batch]
+
+        results = model(frames, verbose=False)
+        for frame_id, result in zip(frame_ids, results):
+            rows = detections_to_rows(frame_id, result.boxes, conf_threshold)
+            writer.write(rows)
+            detections_done += len(rows)
+
+        frames_done += len(batch)
+        print(f"  {frames_done} frames, {detections_done} detections", file=sys.stderr)
+
+    return frames_done, detections_done
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run tilapia detection over recorded frames without the GUI")
+    parser.add_argument("source", help="Video file, image directory or glob pattern (quote it)")
+    parser.add_argument("--model", default=None, help="Model artifact path (default: the MODEL_BACKEND artifact)")
+    parser.add_argument("--backend", default=None, help="pytorch, onnx, onnx-int8 or openvino (default: MODEL_BACKEND)")
+    parser.add_argument("--output", default="-", help="Output file (.jsonl or .csv); '-' writes JSONL to stdout")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Output format (default: from --output extension)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Frames per model call (default: 8)")
+    parser.add_argument("--frame-step", type=int, default=1, help="Process every Nth video frame (default: 1)")
+    parser.add_argument("--conf", type=float, default=CONF_THRESHOLD, help=f"Confidence threshold (default: {CONF_THRESHOLD})")
+    args = parser.parse_args(argv)
+
+    fmt = args.format
+    if fmt is None:
+        fmt = "csv" if args.output.lower().endswith(".csv") else "jsonl"
+
+    # Keep stdout clean for JSONL rows; model loading chatter goes to stderr.
+    with contextlib.redirect_stdout(sys.stderr):
+        model = load_model(args.model, args.backend)
+
+    stream = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        writer = RowWriter(stream, fmt)
+        frames, detections = run_batch(
+            args.source,
+            model,
+            writer,
+            batch_size=max(1, args.batch_size),
+            frame_step=max(1, args.frame_step),
+            conf_threshold=args.conf,
+        )
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+    print(f"✅ Processed {frames} frames, {detections} detections", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Micro-benchmark: per-box detection post-processing vs. `detection.measure_boxes`.
+
+The per-box path reproduces the original `KivyCamera.update` loop (one
+`float(box.conf)` and one `box.xyxy[0].cpu().numpy()` per box, confidence filter,
+calibration, stage and string formatting). The vectorized path takes the whole
+conf/xyxy tensors once. Uses torch tensors when torch is installed, NumPy otherwise.
+With `--calibration` the vectorized path is also timed with the calibrated
+per-pixel scale map (`calibration.py`) instead of the global constants.
+
+Usage:
+python bench_postprocess.py
+python bench_postprocess.py --sizes 1 10 100 1000 --repeat 200
+python bench_postprocess.py --calibration calibration/cam0
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from detection import STAGES, measure_box, measure_boxes
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+
+class FakeBox:
+    """Mimics one element of an Ultralytics `Boxes` iteration."""
+
+    def __init__(self, conf, xyxy):
+        self.conf = conf
+        self.xyxy = xyxy
+
+
+class NumpyTensor(np.ndarray):
+    """ndarray with the `.cpu()` / `.numpy()` calls the loop expects from torch."""
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.view(np.ndarray)
+
+
+def make_boxes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    conf = rng.uniform(0.8, 1.0, size=n).astype(np.float32)
+    x1 = rng.uniform(0, 1000, size=n)
+    y1 = rng.uniform(0, 600, size=n)
+    xyxy = np.stack([x1, y1, x1 + rng.uniform(20, 280, size=n), y1 + rng.uniform(5, 120, size=n)], axis=1).astype(np.float32)
+
+    if torch is not None:
+        conf_t, xyxy_t = torch.from_numpy(conf), torch.from_numpy(xyxy)
+    else:
+        conf_t, xyxy_t = conf.view(NumpyTensor), xyxy.view(NumpyTensor)
+
+    # torch allows float() on a (1,) tensor like Ultralytics' box.conf; NumPy 2 needs 0-d.
+    boxes = [
+        FakeBox(conf_t[i:i + 1] if torch is not None else conf_t[i:i + 1].reshape(()), xyxy_t[i:i + 1])
+        for i in range(n)
+    ]
+    return conf_t, xyxy_t, boxes
+
+
+def per_box_loop(boxes):
+    detected_info = []
+    for box in boxes:
+        conf = float(box.conf)
+        xyxy = box.xyxy[0].cpu().numpy().astype(int)
+        if conf < 0.9:
+            continue
+        long_in, short_in, stage = measure_box(xyxy)
+        detected_info.append((stage, conf, f"{short_in:.2f}", f"{long_in:.2f}"))
+    return detected_info
+
+
+def vectorized(conf, xyxy):
+    m = measure_boxes(conf, xyxy)
+    return [
+        (STAGES[code], c, f"{w:.2f}", f"{l:.2f}")
+        for c, l, w, code in zip(m.conf.tolist(), m.length_in.tolist(), m.width_in.tolist(), m.stage_codes.tolist())
+    ]
+
+
+def vectorized_arrays_only(conf, xyxy):
+    return measure_boxes(conf, xyxy)
+
+
+def time_call(fn, repeat):
+    fn()  # warm-up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark detection post-processing")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000], help="Box counts to test")
+    parser.add_argument("--repeat", type=int, default=200, help="Iterations per measurement")
+    parser.add_argument("--calibration", default=None, help="Calibration directory to time as well")
+    args = parser.parse_args(argv)
+
+    calibration = None
+    if args.calibration:
+        from calibration import Calibration
+
+        calibration = Calibration.load(args.calibration)
+
+    print(f"Tensor backend: {'torch ' + torch.__version__ if torch is not None else 'numpy (torch not installed)'}")
+    print(f"{'boxes':>6} {'loop µs':>12} {'vector µs':>12} {'arrays µs':>12} {'speedup':>9}" + (f" {'calib µs':>12}" if calibration else ""))
+
+    for n in args.sizes:
+        conf, xyxy, boxes = make_boxes(n)
+
+        loop_out = per_box_loop(boxes)
+        vec_out = vectorized(conf, xyxy)
+        assert [(s, w, l) for s, _, w, l in loop_out] == [(s, w, l) for s, _, w, l in vec_out], "outputs differ"
+
+        loop_us = time_call(lambda: per_box_loop(boxes), args.repeat)
+        vec_us = time_call(lambda: vectorized(conf, xyxy), args.repeat)
+        arr_us = time_call(lambda: vectorized_arrays_only(conf, xyxy), args.repeat)
+
+        line = f"{n:>6} {loop_us:>12.1f} {vec_us:>12.1f} {arr_us:>12.1f} {loop_us / vec_us:>8.1f}x"
+        if calibration is not None:
+            cal_us = time_call(lambda: measure_boxes(conf, xyxy, calibration=calibration), args.repeat)
+            line += f" {cal_us:>12.1f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
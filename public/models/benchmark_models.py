@@ -0,0 +1,255 @@
+"""
+Latency / throughput / memory / agreement benchmark for every exported model.
+
+Each available artifact (.pt, ONNX FP32/INT8, OpenVINO, SavedModel, TFLite) is run
+in its own subprocess on the same fixed image set, so peak RSS is measured per
+format and one runtime can't warm caches for another. Reported per artifact:
+
+* load time, per-image latency p50/p95/p99 (batch 1)
+* throughput (images/s) at several batch sizes
+* peak RSS of the process
+* detection/measurement agreement with the PyTorch model (see `model_parity`)
+
+Results go to JSON so runs can be diffed across model versions.
+
+The image set is the annotated set from `yolo_labels.json`: each key (e.g.
+"starter_05 (73)") is looked up as `<images-dir>/<key>.<ext>`.
+
+Usage:
+python benchmark_models.py --images-dir dataset/images --limit 100 --output bench.json
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from datetime import datetime
+from queue import Empty
+
+import numpy as np
+
+from detection import BACKEND_ARTIFACTS, BoxMeasurements, measure_results
+from evaluate_labels import find_image
+from export_cache import file_sha256
+from label_store import LABELS_PATH, open_labels
+
+
+def labelled_image_paths(labels_path, images_dir, limit=None):
+    """Resolve label keys to image files, in sorted key order (deterministic)."""
+    paths = []
+    for key in sorted(open_labels(labels_path)):
+        path = find_image(images_dir, key)
+        if path is not None:
+            paths.append(path)
+        if limit and len(paths) >= limit:
+            break
+    return paths
+
+
+def peak_rss_mb():
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS bytes.
+        return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+def percentiles(samples_ms):
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    if not arr.size:
+        return {}
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 2),
+        "p95": round(float(np.percentile(arr, 95)), 2),
+        "p99": round(float(np.percentile(arr, 99)), 2),
+        "mean": round(float(arr.mean()), 2),
+    }
+
+
+def measurements_to_lists(m):
+    return {field: getattr(m, field).tolist() for field in BoxMeasurements._fields}
+
+
+def lists_to_measurements(d):
+    return BoxMeasurements(
+        np.asarray(d["xyxy"], dtype=np.int32).reshape(-1, 4),
+        np.asarray(d["conf"], dtype=np.float64),
+        np.asarray(d["length_in"], dtype=np.float64),
+        np.asarray(d["width_in"], dtype=np.float64),
+        np.asarray(d["stage_codes"], dtype=np.int8),
+    )
+
+
+def benchmark_artifact(path, image_paths, batch_sizes, imgsz, conf_threshold, warmup):
+    """Runs inside the child process; returns a JSON-serialisable dict."""
+    import cv2
+
+    from detection import load_model
+
+    frames = [cv2.imread(p) for p in image_paths]
+
+    started = time.perf_counter()
+    model = load_model(path)
+    load_s = time.perf_counter() - started
+
+    for frame in frames[:warmup]:
+        model(frame, imgsz=imgsz, verbose=False)
+
+    latencies = []
+    detections = []
+    for frame in frames:
+        t0 = time.perf_counter()
+        result = model(frame, imgsz=imgsz, verbose=False)[0]
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        detections.append(measurements_to_lists(measure_results(result.boxes, conf_threshold=conf_threshold)))
+
+    throughput = {}
+    for batch_size in batch_sizes:
+        try:
+            t0 = time.perf_counter()
+            for i in range(0, len(frames), batch_size):
+                model(frames[i:i + batch_size], imgsz=imgsz, verbose=False)
+            throughput[str(batch_size)] = round(len(frames) / (time.perf_counter() - t0), 2)
+        except Exception as e:
+            # Some exports (e.g. static-shape TFLite) only accept batch 1.
+            throughput[str(batch_size)] = f"unsupported: {e}"
+
+    return {
+        "load_s": round(load_s, 3),
+        "latency_ms": percentiles(latencies),
+        "throughput_ips": throughput,
+        "peak_rss_mb": peak_rss_mb(),
+        "detections": detections,
+    }
+
+
+def _child(queue, *args):
+    try:
+        queue.put(("ok", benchmark_artifact(*args)))
+    except Exception as e:
+        queue.put(("error", f"{type(e).__name__}: {e}"))
+
+
+def run_isolated(path, *args, timeout=3600, poll_interval=1.0):
+    """
+    Benchmark one artifact in a spawned process. A native runtime that kills the
+    child (e.g. a segfault) is reported with its exit code as soon as it happens.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_child, args=(queue, path, *args))
+    process.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                status, payload = queue.get(timeout=poll_interval)
+                break
+            except Empty:
+                if not process.is_alive():
+                    # The result may still be in the pipe right after a clean exit.
+                    try:
+                        status, payload = queue.get(timeout=poll_interval)
+                        break
+                    except Empty:
+                        raise RuntimeError(f"Benchmark process died with exit code {process.exitcode}") from None
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Benchmark timed out after {timeout} s") from None
+    finally:
+        process.join(10)
+        if process.is_alive():
+            process.terminate()
+    if status != "ok":
+        raise RuntimeError(payload)
+    return payload
+
+
+def main(argv=None):
+    from model_parity import compare_measurements, summarize
+
+    parser = argparse.ArgumentParser(description="Benchmark every available model artifact on a fixed image set")
+    parser.add_argument("--images-dir", required=True, help="Directory with the annotated images named after yolo_labels.json keys")
+    parser.add_argument("--labels", default=LABELS_PATH, help="Label file defining the image set")
+    parser.add_argument("--limit", type=int, default=100, help="Number of images (default: 100)")
+    parser.add_argument("--backends", default=",".join(BACKEND_ARTIFACTS), help="Comma-separated BACKEND_ARTIFACTS keys")
+    parser.add_argument("--artifact", action="append", default=[], metavar="NAME=PATH", help="Extra artifact to include")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--conf", type=float, default=0.5, help="Confidence threshold for agreement (default: 0.5)")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args(argv)
+
+    image_paths = labelled_image_paths(args.labels, args.images_dir, args.limit)
+    if not image_paths:
+        print(f"❌ No labelled images found in {args.images_dir}")
+        return 1
+
+    artifacts = {}
+    for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        path = BACKEND_ARTIFACTS.get(name)
+        if path and os.path.exists(path):
+            artifacts[name] = path
+        else:
+            print(f"⏭ Skipping {name}: artifact not found")
+    for spec in args.artifact:
+        name, _, path = spec.partition("=")
+        artifacts[name] = path
+
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "reference": "pytorch",
+        "reference_sha256": file_sha256(BACKEND_ARTIFACTS["pytorch"]) if os.path.exists(BACKEND_ARTIFACTS["pytorch"]) else None,
+        "images": len(image_paths),
+        "image_set_sha256": hashlib.sha256("\n".join(os.path.basename(p) for p in image_paths).encode()).hexdigest(),
+        "settings": {"imgsz": args.imgsz, "conf": args.conf, "batch_sizes": args.batch_sizes, "warmup": args.warmup},
+        "artifacts": {},
+    }
+
+    reference_detections = None
+    # Run the reference first so the others can be compared with it.
+    for name in sorted(artifacts, key=lambda n: n != "pytorch"):
+        path = artifacts[name]
+        print(f"⏱ Benchmarking {name}: {path}")
+        try:
+            result = run_isolated(path, image_paths, args.batch_sizes, args.imgsz, args.conf, args.warmup)
+        except Exception as e:
+            print(f"  ✗ {e}")
+            report["artifacts"][name] = {"path": path, "error": str(e)}
+            continue
+
+        detections = [lists_to_measurements(d) for d in result.pop("detections")]
+        if name == "pytorch":
+            reference_detections = detections
+        if reference_detections is not None:
+            comparisons = [compare_measurements(r, c) for r, c in zip(reference_detections, detections)]
+            result["agreement"] = summarize(comparisons)
+
+        result["path"] = path
+        result["sha256"] = file_sha256(path)
+        report["artifacts"][name] = result
+
+        lat = result["latency_ms"]
+        print(f"  p50 {lat.get('p50')} ms, p95 {lat.get('p95')} ms, p99 {lat.get('p99')} ms, peak RSS {result['peak_rss_mb']} MB")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,375 @@
+"""
+Lens and tray-plane calibration for measuring fish in real units.
+
+`measure_boxes` converts box sizes with one global px→cm factor per axis
+(`IMAGE_WIDTH_PX` / `IMAGE_LENGTH_PX`), which only holds for a distortion-free
+camera looking straight down at the tray. Wide-angle webcams bend lines near
+the edges and are rarely fronto-parallel, so the same fish measures longer in
+one corner than in the middle.
+
+`calibrate` fixes both once per camera:
+
+* intrinsics and lens distortion from several checkerboard views
+  (`cv2.calibrateCamera`), optional;
+* a homography from undistorted pixels to centimetres on the tray plane, from
+  a checkerboard lying on the tray or from reference points measured on it
+  (e.g. the tray corners).
+
+From those it precomputes, for the camera resolution:
+
+* `map_x.npy` / `map_y.npy`: `cv2.remap` tables that undistort a frame;
+* `scale.npy`: `(H, W, 2)` float32 cm per pixel along x and y at every raw
+  pixel (the local derivative of pixel → tray-plane coordinates).
+
+`Calibration.load` memory-maps the arrays, so startup only touches the pages a
+lookup needs and nothing is recomputed. Measuring is then one fancy-index into
+`scale` per frame for all boxes: box width × x-scale and height × y-scale at
+the box centre.
+
+`calibration.json` next to the arrays keeps the matrices, the resolution and the
+reprojection error.
+
+Usage:
+    # Checkerboard (9x6 inner corners, 25 mm squares): views for the lens, one on the tray for the plane
+    python calibration.py calibrate --images "calib/*.jpg" --reference calib/tray.jpg --board 9x6 --square-mm 25 -o calibration/cam0
+
+    # Grab the views from the camera instead (frames where the board is found)
+    python calibration.py calibrate --source v4l2:/dev/video0 --frames 20 --board 9x6 --square-mm 25 -o calibration/cam0
+
+    # No checkerboard: four or more tray points, [{"px": [x, y], "cm": [X, Y]}, ...]
+    python calibration.py calibrate --reference tray.jpg --points tray_points.json -o calibration/cam0
+
+    # Write an undistorted copy of a frame and print the scale range
+    python calibration.py check calibration/cam0 frame.jpg -o undistorted.jpg
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+META_FILE = "calibration.json"
+ARRAY_FILES = ("map_x.npy", "map_y.npy", "scale.npy")
+
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+
+def board_points(board, square_cm):
+    """Tray-plane coordinates (cm) of a checkerboard's inner corners, in OpenCV corner order."""
+    cols, rows = board
+    grid = np.mgrid[0:cols, 0:rows].T.reshape(-1, 2).astype(np.float32)
+    return grid * square_cm
+
+
+def find_corners(image, board):
+    """Sub-pixel inner corners of the checkerboard, or None if it is not fully visible."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    found, corners = cv2.findChessboardCorners(gray, board, cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE)
+    if not found:
+        return None
+    return cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), SUBPIX_CRITERIA)
+
+
+def calibrate_intrinsics(images, board, square_cm):
+    """
+    Camera matrix and distortion from checkerboard views.
+
+    Returns `(camera_matrix, dist_coeffs, image_size, rms, views_used)`.
+    """
+    object_points, image_points, image_size = [], [], None
+    template = np.zeros((board[0] * board[1], 3), dtype=np.float32)
+    template[:, :2] = board_points(board, square_cm)
+
+    for image in images:
+        size = (image.shape[1], image.shape[0])
+        if image_size is None:
+            image_size = size
+        elif size != image_size:
+            raise ValueError(f"All calibration views must have the same size ({image_size} != {size})")
+        corners = find_corners(image, board)
+        if corners is not None:
+            object_points.append(template)
+            image_points.append(corners)
+
+    if len(image_points) < 3:
+        raise ValueError(f"Checkerboard found in {len(image_points)} view(s); at least 3 are needed")
+
+    rms, camera_matrix, dist_coeffs, _, _ = cv2.calibrateCamera(object_points, image_points, image_size, None, None)
+    return camera_matrix, dist_coeffs.reshape(-1), image_size, float(rms), len(image_points)
+
+
+def default_intrinsics(image_size):
+    """Pinhole camera without distortion, for a homography-only calibration."""
+    width, height = image_size
+    camera_matrix = np.array([[width, 0, width / 2.0], [0, width, height / 2.0], [0, 0, 1]], dtype=np.float64)
+    return camera_matrix, np.zeros(5, dtype=np.float64)
+
+
+def plane_homography(pixel_points, plane_points_cm, camera_matrix, dist_coeffs, new_camera_matrix):
+    """Homography from undistorted pixels to tray-plane cm, and its mean reprojection error in cm."""
+    pixels = np.asarray(pixel_points, dtype=np.float32).reshape(-1, 1, 2)
+    plane = np.asarray(plane_points_cm, dtype=np.float32).reshape(-1, 2)
+    if len(plane) < 4:
+        raise ValueError("A plane homography needs at least 4 reference points")
+
+    undistorted = cv2.undistortPoints(pixels, camera_matrix, dist_coeffs, P=new_camera_matrix)
+    homography, _ = cv2.findHomography(undistorted, plane, 0)
+    if homography is None:
+        raise ValueError("Reference points are degenerate (collinear?)")
+    projected = cv2.perspectiveTransform(undistorted, homography).reshape(-1, 2)
+    return homography, float(np.linalg.norm(projected - plane, axis=1).mean())
+
+
+def build_maps(camera_matrix, dist_coeffs, new_camera_matrix, homography, image_size):
+    """
+    `cv2.remap` undistortion tables and the per-pixel cm/px scale map.
+
+    Every raw pixel is undistorted and projected onto the tray plane once; the
+    scale along x (y) is the length of the plane-coordinate step between
+    horizontally (vertically) neighbouring pixels.
+    """
+    width, height = image_size
+    map_x, map_y = cv2.initUndistortRectifyMap(camera_matrix, dist_coeffs, None, new_camera_matrix, image_size, cv2.CV_32FC1)
+
+    xs, ys = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+    pixels = np.stack([xs, ys], axis=-1).reshape(-1, 1, 2)
+    undistorted = cv2.undistortPoints(pixels, camera_matrix, dist_coeffs, P=new_camera_matrix)
+    plane = cv2.perspectiveTransform(undistorted, homography).reshape(height, width, 2)
+
+    step_x = np.gradient(plane, axis=1)
+    step_y = np.gradient(plane, axis=0)
+    scale = np.stack([np.hypot(step_x[..., 0], step_x[..., 1]), np.hypot(step_y[..., 0], step_y[..., 1])], axis=-1)
+    return map_x, map_y, scale.astype(np.float32)
+
+
+class Calibration:
+    """
+    Args:
+        meta: Contents of `calibration.json`.
+        map_x / map_y: Undistortion tables, `(H, W)` float32.
+        scale: cm per pixel along x and y, `(H, W, 2)` float32.
+    """
+
+    def __init__(self, meta, map_x, map_y, scale):
+        self.meta = meta
+        self.map_x = map_x
+        self.map_y = map_y
+        self.scale = scale
+        self.image_size = tuple(meta["image_size"])
+
+    @classmethod
+    def load(cls, directory):
+        """Memory-map a saved calibration (nothing is read until it is used)."""
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        arrays = [np.load(os.path.join(directory, name), mmap_mode="r") for name in ARRAY_FILES]
+        return cls(meta, *arrays)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name, array in zip(ARRAY_FILES, (self.map_x, self.map_y, self.scale)):
+            path = os.path.join(directory, name)
+            np.save(f"{path}.tmp.npy", np.ascontiguousarray(array))
+            os.replace(f"{path}.tmp.npy", path)
+        tmp_path = os.path.join(directory, f"{META_FILE}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp_path, os.path.join(directory, META_FILE))
+        return directory
+
+    def undistort(self, frame):
+        return cv2.remap(frame, self.map_x, self.map_y, cv2.INTER_LINEAR)
+
+    def box_size_cm(self, xyxy, frame_size=None):
+        """
+        Width and height in cm of `(N, 4)` pixel boxes, from the scale at each box centre.
+
+        `frame_size` is the `(width, height)` the boxes were detected in; boxes
+        are rescaled to the calibrated resolution when it differs.
+        """
+        xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        if not len(xyxy):
+            return np.zeros(0), np.zeros(0)
+
+        width, height = self.image_size
+        sx, sy = (1.0, 1.0) if frame_size is None else (width / frame_size[0], height / frame_size[1])
+        cx = np.clip(((xyxy[:, 0] + xyxy[:, 2]) * (0.5 * sx)).astype(np.intp), 0, width - 1)
+        cy = np.clip(((xyxy[:, 1] + xyxy[:, 3]) * (0.5 * sy)).astype(np.intp), 0, height - 1)
+        scale = np.asarray(self.scale[cy, cx], dtype=np.float64)
+
+        width_cm = (xyxy[:, 2] - xyxy[:, 0]) * sx * scale[:, 0]
+        height_cm = (xyxy[:, 3] - xyxy[:, 1]) * sy * scale[:, 1]
+        return width_cm, height_cm
+
+    def summary(self):
+        scale = np.asarray(self.scale)
+        return {
+            "image_size": list(self.image_size),
+            "method": self.meta.get("method"),
+            "rms_px": self.meta.get("rms_px"),
+            "plane_error_cm": self.meta.get("plane_error_cm"),
+            "cm_per_px_x": [round(float(scale[..., 0].min()), 5), round(float(scale[..., 0].max()), 5)],
+            "cm_per_px_y": [round(float(scale[..., 1].min()), 5), round(float(scale[..., 1].max()), 5)],
+        }
+
+
+def load_calibration(*directories):
+    """The first calibration found among `directories`, or None."""
+    for directory in directories:
+        if directory and os.path.exists(os.path.join(directory, META_FILE)):
+            return Calibration.load(directory)
+    return None
+
+
+def calibrate(views=(), reference=None, points=None, board=(9, 6), square_cm=2.5):
+    """
+    Build a `Calibration` from checkerboard views and/or a reference image.
+
+    Args:
+        views: Checkerboard images for the intrinsics (empty: assume no distortion).
+        reference: Image of the tray with the checkerboard lying on it, or the
+            image `points` were measured in (default: the last view).
+        points: `[{"px": [x, y], "cm": [X, Y]}, ...]` tray points; without them
+            the checkerboard in `reference` defines the plane.
+        board: Inner corners per row and column.
+        square_cm: Checkerboard square size.
+    """
+    views = list(views)
+    meta = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "board": list(board), "square_cm": square_cm}
+
+    if views:
+        camera_matrix, dist_coeffs, image_size, rms, used = calibrate_intrinsics(views, board, square_cm)
+        meta.update(rms_px=round(rms, 4), views=used)
+    else:
+        if reference is None:
+            raise ValueError("Need checkerboard views or a reference image")
+        image_size = (reference.shape[1], reference.shape[0])
+        camera_matrix, dist_coeffs = default_intrinsics(image_size)
+
+    plane_image = reference if reference is not None else views[-1]
+    if (plane_image.shape[1], plane_image.shape[0]) != tuple(image_size):
+        raise ValueError("The reference image must have the calibration resolution")
+
+    if points:
+        pixel_points = [p["px"] for p in points]
+        plane_points = [p["cm"] for p in points]
+        meta["method"] = "points"
+    else:
+        corners = find_corners(plane_image, board)
+        if corners is None:
+            raise ValueError("Checkerboard not found in the reference image")
+        pixel_points, plane_points = corners, board_points(board, square_cm)
+        meta["method"] = "checkerboard"
+
+    # alpha=0 keeps only valid pixels, so the undistorted frame has no black border.
+    new_camera_matrix, _ = cv2.getOptimalNewCameraMatrix(camera_matrix, dist_coeffs, image_size, 0)
+    homography, plane_error = plane_homography(pixel_points, plane_points, camera_matrix, dist_coeffs, new_camera_matrix)
+    map_x, map_y, scale = build_maps(camera_matrix, dist_coeffs, new_camera_matrix, homography, image_size)
+
+    meta.update(
+        image_size=list(image_size),
+        camera_matrix=camera_matrix.tolist(),
+        dist_coeffs=np.asarray(dist_coeffs).reshape(-1).tolist(),
+        new_camera_matrix=new_camera_matrix.tolist(),
+        homography=homography.tolist(),
+        plane_error_cm=round(plane_error, 4),
+    )
+    return Calibration(meta, map_x, map_y, scale)
+
+
+def capture_views(spec, frames, board, interval=1.0, timeout=120.0):
+    """Grab `frames` camera frames that show the whole checkerboard, at least `interval` s apart."""
+    from frame_source import open_source
+
+    source = open_source(spec)
+    if not source.isOpened():
+        raise RuntimeError(f"Could not open source {spec}")
+    views, last = [], 0.0
+    deadline = time.perf_counter() + timeout
+    try:
+        while len(views) < frames and time.perf_counter() < deadline:
+            ok, frame = source.read()
+            if not ok:
+                continue
+            if time.perf_counter() - last >= interval and find_corners(frame, board) is not None:
+                views.append(frame.copy())
+                last = time.perf_counter()
+                print(f"📷 View {len(views)}/{frames}")
+    finally:
+        source.release()
+    return views
+
+
+def _read_image(path):
+    image = cv2.imread(path)
+    if image is None:
+        raise FileNotFoundError(f"Cannot read image: {path}")
+    return image
+
+
+def _board(text):
+    cols, rows = text.lower().split("x")
+    return int(cols), int(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Camera and tray-plane calibration")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    cal = sub.add_parser("calibrate", help="Compute and save a calibration")
+    cal.add_argument("--images", default=None, help="Glob of checkerboard views for the lens intrinsics")
+    cal.add_argument("--source", default=None, help="Capture the views from this frame source instead")
+    cal.add_argument("--frames", type=int, default=20, help="Views to capture with --source")
+    cal.add_argument("--reference", default=None, help="Tray image (checkerboard on the tray, or the --points image)")
+    cal.add_argument("--points", default=None, help="JSON file of tray reference points")
+    cal.add_argument("--board", type=_board, default=(9, 6), help="Inner corners, e.g. 9x6")
+    cal.add_argument("--square-mm", type=float, default=25.0)
+    cal.add_argument("-o", "--output", required=True, help="Output directory")
+
+    check = sub.add_parser("check", help="Print a calibration's scale range and undistort a frame")
+    check.add_argument("calibration")
+    check.add_argument("image", nargs="?", default=None)
+    check.add_argument("-o", "--output", default=None, help="Where to write the undistorted image")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "check":
+        calibration = Calibration.load(args.calibration)
+        print(json.dumps(calibration.summary(), indent=2))
+        if args.image:
+            undistorted = calibration.undistort(_read_image(args.image))
+            output = args.output or os.path.splitext(args.image)[0] + "_undistorted.jpg"
+            cv2.imwrite(output, undistorted)
+            print(f"✅ Undistorted frame written to {output}")
+        return 0
+
+    views = []
+    if args.images:
+        views = [_read_image(path) for path in sorted(glob.glob(args.images))]
+    elif args.source:
+        views = capture_views(args.source, args.frames, args.board)
+    reference = _read_image(args.reference) if args.reference else None
+    points = None
+    if args.points:
+        with open(args.points) as f:
+            points = json.load(f)
+
+    try:
+        calibration = calibrate(views, reference, points, args.board, args.square_mm / 10.0)
+    except ValueError as e:
+        print(f"❌ Calibration failed: {e}")
+        return 1
+
+    calibration.save(args.output)
+    print(json.dumps(calibration.summary(), indent=2))
+    print(f"✅ Calibration written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
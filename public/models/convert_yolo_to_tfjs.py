@@ -1,41 +1,268 @@
 """
-YOLO Model Converter for TensorFlow.js
+YOLO Model Converter for TensorFlow.js, ONNX and OpenVINO
 
 This script helps convert the YOLOv8 PyTorch model (best_SMF.pt) to TensorFlow.js format
-for use in the browser-based fish detection system.
+for use in the browser-based fish detection system, and to CPU-optimised formats
+(ONNX FP32, dynamically quantized ONNX INT8, OpenVINO) for the desktop app
+(`MODEL_BACKEND=onnx|onnx-int8|openvino python redRilapia.py`).
 
 Requirements:
 - ultralytics
-- onnx
-- tf2onnx
-- tensorflowjs
+- tensorflowjs, tensorflow (tfjs)
+- onnx, onnxruntime (onnx, onnx-int8)
+- openvino (openvino)
 
 Installation:
 pip install ultralytics onnx tf2onnx tensorflowjs
+pip install onnx onnxruntime openvino
 
 Usage:
 python convert_yolo_to_tfjs.py
+python convert_yolo_to_tfjs.py --formats onnx,onnx-int8,openvino --parity-images "captures/*.jpg"
+python convert_yolo_to_tfjs.py --formats tfjs,onnx,openvino --jobs 3
+python convert_yolo_to_tfjs.py --tfjs-variants float32,float16,uint8 --shard-size 1048576 --parity-images "captures/*.jpg"
+
+Each stage (SavedModel, TF.js, ONNX, INT8, OpenVINO) is cached under --cache-dir
+keyed by the weights hash and export options, so re-running with unchanged inputs
+only copies the cached outputs into place. Pass --no-cache to rebuild.
 """
 
+import multiprocessing
 import os
+import shutil
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from export_cache import ExportCache, file_sha256, publish
+from tfjs_variants import DEFAULT_SHARD_SIZE, TFJS_VARIANTS, converter_flags, variant_dir_name, variant_report
+
 try:
     from ultralytics import YOLO
-    import tensorflowjs as tfjs
-    import tensorflow as tf
 except ImportError as e:
     print(f"Error: Missing required package: {e}")
     print("\nPlease install required packages:")
-    print("pip install ultralytics tensorflowjs tensorflow")
+    print("pip install ultralytics")
     sys.exit(1)
 
+FORMATS = ("tfjs", "onnx", "onnx-int8", "openvino")
+
+# Stage outputs keyed by weights hash + options; see export_cache.py
+DEFAULT_CACHE_DIR = "public/models/.export_cache"
+
+# Packages needed per format, imported lazily so an ONNX-only run doesn't need TensorFlow.
+FORMAT_REQUIREMENTS = {
+    "tfjs": ["tensorflowjs", "tensorflow"],
+    "onnx": ["onnx"],
+    "onnx-int8": ["onnx", "onnxruntime"],
+    "openvino": ["openvino"],
+}
+
+
+def check_requirements(formats):
+    import importlib
+
+    missing = set()
+    for fmt in formats:
+        for package in FORMAT_REQUIREMENTS[fmt]:
+            try:
+                importlib.import_module(package)
+            except ImportError:
+                missing.add(package)
+
+    if missing:
+        print(f"Error: Missing required package(s): {', '.join(sorted(missing))}")
+        print("\nPlease install required packages:")
+        print(f"pip install {' '.join(sorted(missing))}")
+        return False
+    return True
+
+
+EXPORT_CHAINS = {
+    # Formats that share intermediates run as one chain; chains are independent.
+    "tfjs": ("tfjs",),
+    "onnx": ("onnx", "onnx-int8"),
+    "openvino": ("openvino",),
+}
+
+TFJS_CONVERTER_OPTIONS = {
+    "input_format": "tf_saved_model",
+    "output_format": "tfjs_graph_model",
+    "signature_name": "serving_default",
+    "saved_model_tags": "serve",
+}
+
+
+def tfjs_format(variant):
+    """Artifact name of a TF.js variant: "tfjs" for float32, else "tfjs-<variant>"."""
+    return "tfjs" if variant == "float32" else f"tfjs-{variant}"
+
+
+def _exporter_version():
+    import ultralytics
+
+    return ultralytics.__version__
+
+
+def _export_copy(pt_model_path, work_dir, **export_kwargs):
+    """
+    Export from a private copy of the weights inside `work_dir`.
+
+    Ultralytics writes exports next to the .pt file (the SavedModel export also
+    leaves an intermediate .onnx there), so parallel exports of the same file
+    would otherwise overwrite each other's output.
+    """
+    local = os.path.join(work_dir, os.path.basename(pt_model_path))
+    shutil.copy2(pt_model_path, local)
+    exported = YOLO(local).export(**export_kwargs)
+    os.remove(local)
+    return str(exported)
+
+
+def _cached_stage(cache, stage, builder, **inputs):
+    key = cache.key(stage, **inputs)
+    return key, cache.build(stage, key, builder, inputs=inputs)
+
+
+def saved_model_stage(cache, pt_model_path, weights, image_size):
+    print(f"\n[SavedModel] Exporting {pt_model_path} to TensorFlow SavedModel...")
+    return _cached_stage(
+        cache, "saved_model",
+        lambda work_dir: _export_copy(pt_model_path, work_dir, format="saved_model", imgsz=image_size, optimize=True),
+        weights=weights, imgsz=image_size, optimize=True, exporter=_exporter_version(),
+    )
+
+
+def tfjs_stage(cache, saved_model_key, saved_model_path, variant="float32", shard_size=DEFAULT_SHARD_SIZE):
+    import subprocess
+
+    def build(work_dir):
+        tfjs_output = os.path.join(work_dir, "web_model")
+        cmd = ["tensorflowjs_converter"]
+        cmd += [f"--{name}={value}" for name, value in TFJS_CONVERTER_OPTIONS.items()]
+        cmd += converter_flags(variant, shard_size)
+        cmd += [saved_model_path, tfjs_output]
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"tensorflowjs_converter failed: {result.stderr}")
+        return tfjs_output
+
+    print(f"\n[TF.js] Converting SavedModel to TensorFlow.js ({variant}, {shard_size} byte shards)...")
+    return _cached_stage(
+        cache, "tfjs", build,
+        saved_model=saved_model_key, quantization=variant, shard_size=int(shard_size), **TFJS_CONVERTER_OPTIONS,
+    )
+
+
+def onnx_stage(cache, pt_model_path, weights, image_size):
+    print(f"\n[ONNX] Exporting {pt_model_path} to ONNX (FP32)...")
+    return _cached_stage(
+        cache, "onnx",
+        lambda work_dir: _export_copy(pt_model_path, work_dir, format="onnx", imgsz=image_size, dynamic=True, simplify=True),
+        weights=weights, imgsz=image_size, dynamic=True, simplify=True, exporter=_exporter_version(),
+    )
+
+
+def onnx_int8_stage(cache, onnx_key, onnx_path):
+    import onnxruntime
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    def build(work_dir):
+        int8_path = os.path.join(work_dir, "best_SMF.int8.onnx")
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QUInt8)
+        return int8_path
+
+    print("\n[ONNX] Quantizing weights to INT8 (dynamic quantization)...")
+    return _cached_stage(cache, "onnx_int8", build, onnx=onnx_key, weight_type="QUInt8", onnxruntime=onnxruntime.__version__)
+
+
+def openvino_stage(cache, pt_model_path, weights, image_size):
+    print(f"\n[OpenVINO] Exporting {pt_model_path} to OpenVINO IR...")
+    return _cached_stage(
+        cache, "openvino",
+        lambda work_dir: _export_copy(pt_model_path, work_dir, format="openvino", imgsz=image_size),
+        weights=weights, imgsz=image_size, exporter=_exporter_version(),
+    )
+
+
+def run_export_chain(
+    chain,
+    formats,
+    pt_model_path,
+    weights,
+    image_size,
+    cache_dir,
+    use_cache=True,
+    tfjs_variants=("float32",),
+    shard_size=DEFAULT_SHARD_SIZE,
+):
+    """
+    Run one independent chain of export stages; returns `{format: cached path}`.
+
+    Top-level (picklable) so `convert_models` can run chains in worker processes.
+    """
+    cache = ExportCache(cache_dir, enabled=use_cache)
+    outputs = {}
+
+    if chain == "tfjs":
+        saved_model_key, saved_model_path = saved_model_stage(cache, pt_model_path, weights, image_size)
+        outputs["saved_model"] = saved_model_path
+        # All TF.js variants share the one SavedModel export.
+        for variant in tfjs_variants:
+            outputs[tfjs_format(variant)] = tfjs_stage(cache, saved_model_key, saved_model_path, variant, shard_size)[1]
+    elif chain == "onnx":
+        onnx_key, onnx_path = onnx_stage(cache, pt_model_path, weights, image_size)
+        if "onnx" in formats:
+            outputs["onnx"] = onnx_path
+        if "onnx-int8" in formats:
+            outputs["onnx-int8"] = onnx_int8_stage(cache, onnx_key, onnx_path)[1]
+    elif chain == "openvino":
+        outputs["openvino"] = openvino_stage(cache, pt_model_path, weights, image_size)[1]
+
+    return outputs
+
+
+def write_tfjs_metadata(tfjs_output, pt_model_path, image_size, weights, quantization="float32", variants=None):
+    import json
+
+    metadata = {
+        "modelFormat": "graph-model",
+        "generatedBy": "YOLO to TensorFlow.js Converter",
+        "convertedFrom": pt_model_path,
+        "weightsSha256": weights,
+        "imageSize": image_size,
+        "classes": ["tilapia"],
+        "stageThresholds": {
+            "starter": 3.0,
+            "grower": 6.0
+        },
+        "calibration": {
+            "realLengthCm": 2.54,
+            "realWidthCm": 30.0,
+            "imageWidthPx": 1200,
+            "imageLengthPx": 127.13
+        },
+        "quantization": quantization,
+        # Size and float32 agreement of every variant written alongside this one
+        "variants": variants or {},
+    }
+
+    metadata_path = os.path.join(tfjs_output, "metadata.json")
+    with open(metadata_path, "w") as f:
+        json.dump(metadata, f, indent=2)
+    print(f"✓ Metadata saved to {metadata_path}")
+    return metadata_path
+
 
 def convert_yolo_to_tfjs(
     pt_model_path: str = "best_SMF.pt",
     output_dir: str = "public/models/yolo_tfjs",
-    image_size: int = 640
+    image_size: int = 640,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    use_cache: bool = True,
+    tfjs_variants=("float32",),
+    shard_size: int = DEFAULT_SHARD_SIZE,
 ):
     """
     Convert YOLOv8 PyTorch model to TensorFlow.js format.
@@ -44,111 +271,178 @@ def convert_yolo_to_tfjs(
         pt_model_path: Path to the .pt model file
         output_dir: Directory to save the converted model
         image_size: Input image size for the model
+        cache_dir: Export cache; unchanged stages are reused from here
+        use_cache: Set to False to rebuild every stage
+        tfjs_variants: Weight encodings to emit (float32, float16, uint16, uint8)
+        shard_size: Weight shard size in bytes
     """
-    
-    print("=" * 60)
-    print("YOLO to TensorFlow.js Converter")
-    print("=" * 60)
-    
-    # Check if input file exists
+    return convert_models(
+        pt_model_path, output_dir, export_dir=None, image_size=image_size,
+        formats=("tfjs",), cache_dir=cache_dir, use_cache=use_cache,
+        tfjs_variants=tfjs_variants, shard_size=shard_size,
+    )
+
+
+def publish_artifacts(outputs, pt_model_path, output_dir, export_dir):
+    """Copy cached outputs to where the app and the web build load them from."""
+    published = {}
+    stem = Path(pt_model_path).stem
+
+    if "saved_model" in outputs:
+        # detection.BACKEND_ARTIFACTS expects the SavedModel (and its TFLite files) next to the weights.
+        publish(outputs["saved_model"], os.path.join(os.path.dirname(os.path.abspath(pt_model_path)), f"{stem}_saved_model"))
+    for variant in TFJS_VARIANTS:
+        name = tfjs_format(variant)
+        if name in outputs:
+            published[name] = publish(outputs[name], os.path.join(output_dir, variant_dir_name(variant)))
+            print(f"✓ TensorFlow.js model ({variant}) saved to {published[name]}")
+    if "onnx" in outputs:
+        published["onnx"] = publish(outputs["onnx"], os.path.join(export_dir, f"{stem}.onnx"))
+    if "onnx-int8" in outputs:
+        published["onnx-int8"] = publish(outputs["onnx-int8"], os.path.join(export_dir, f"{stem}.int8.onnx"))
+    if "openvino" in outputs:
+        published["openvino"] = publish(outputs["openvino"], os.path.join(export_dir, f"{stem}_openvino_model"))
+    return published
+
+
+def report_tfjs_variants(published, pt_model_path, image_size, weights, shard_size, parity_images=None, limit=20):
+    """Write metadata.json (with the size/agreement table) into every published TF.js variant."""
+    model_dirs = {variant: published[tfjs_format(variant)] for variant in TFJS_VARIANTS if tfjs_format(variant) in published}
+    if not model_dirs:
+        return {}
+
+    frames = None
+    if parity_images and len(model_dirs) > 1:
+        from batch_detect import iter_frames
+
+        frames = [frame for _, (_, frame) in zip(range(limit), iter_frames(parity_images))]
+
+    print("\n[TF.js] Variant report:")
+    variants = variant_report(model_dirs, frames, image_size=image_size, shard_size=shard_size)
+    for variant, model_dir in model_dirs.items():
+        write_tfjs_metadata(model_dir, pt_model_path, image_size, weights, quantization=variant, variants=variants)
+    return variants
+
+
+def run_parity_checks(pt_model_path, artifacts, images, limit=50):
+    """Compare each exported artifact with the PyTorch model; returns True if all pass."""
+    from batch_detect import iter_frames
+    from detection import load_model
+    from model_parity import check_parity
+
+    reference = load_model(pt_model_path)
+    all_passed = True
+
+    for fmt, path in artifacts.items():
+        print(f"\n[Parity] {fmt}: {path}")
+        candidate = load_model(path)
+        frames = (item for _, item in zip(range(limit), iter_frames(images)))
+        summary = check_parity(reference, candidate, frames)
+        print(
+            f"  recall {summary['recall']:.3f}, mean IoU {summary['mean_iou']}, "
+            f"max conf diff {summary['max_conf_diff']:.3f}, "
+            f"max length diff {summary['max_length_diff_in']:.3f} in"
+        )
+        print("  ✓ within tolerance" if summary["passed"] else "  ✗ outside tolerance")
+        all_passed = all_passed and summary["passed"]
+
+    return all_passed
+
+
+def convert_models(
+    pt_model_path,
+    output_dir,
+    export_dir,
+    image_size=640,
+    formats=("tfjs",),
+    parity_images=None,
+    cache_dir=DEFAULT_CACHE_DIR,
+    use_cache=True,
+    jobs=1,
+    tfjs_variants=("float32",),
+    shard_size=DEFAULT_SHARD_SIZE,
+):
+    """
+    Run every requested export; returns True if all succeeded (and parity passed).
+
+    Stage outputs come from the content-addressed cache in `cache_dir` when the
+    weights and options are unchanged. Independent chains (tfjs, onnx/onnx-int8,
+    openvino) run in up to `jobs` worker processes. Quantized TF.js variants are
+    always built next to the float32 model, which is their accuracy baseline.
+    """
+    tfjs_variants = ["float32"] + [v for v in tfjs_variants if v != "float32"]
+
+    if not check_requirements(formats):
+        return False
+
     if not os.path.exists(pt_model_path):
         print(f"Error: Model file not found: {pt_model_path}")
         return False
-    
-    # Create output directory
-    os.makedirs(output_dir, exist_ok=True)
-    
+
+    print("=" * 60)
+    print("YOLO Model Converter")
+    print("=" * 60)
+
+    weights = file_sha256(pt_model_path)
+    print(f"\nWeights {pt_model_path} sha256 {weights[:12]}…, cache {cache_dir}{'' if use_cache else ' (disabled)'}")
+
+    chains = {
+        name: [fmt for fmt in chain_formats if fmt in formats]
+        for name, chain_formats in EXPORT_CHAINS.items()
+    }
+    chains = {name: fmts for name, fmts in chains.items() if fmts}
+
+    outputs = {}
+    started = time.perf_counter()
     try:
-        # Step 1: Load YOLO model
-        print(f"\n[1/4] Loading YOLO model from {pt_model_path}...")
-        model = YOLO(pt_model_path)
-        print("✓ Model loaded successfully")
-        
-        # Step 2: Export to TensorFlow SavedModel format
-        print(f"\n[2/4] Exporting to TensorFlow SavedModel format...")
-        saved_model_path = os.path.join(output_dir, "saved_model")
-        
-        # Export using Ultralytics built-in export
-        model.export(
-            format="saved_model",
-            imgsz=image_size,
-            optimize=True,
-        )
-        print(f"✓ SavedModel exported to {saved_model_path}")
-        
-        # Step 3: Convert SavedModel to TensorFlow.js
-        print(f"\n[3/4] Converting to TensorFlow.js format...")
-        
-        # Use tensorflowjs converter
-        import subprocess
-        
-        tfjs_output = os.path.join(output_dir, "web_model")
-        
-        cmd = [
-            "tensorflowjs_converter",
-            "--input_format=tf_saved_model",
-            "--output_format=tfjs_graph_model",
-            "--signature_name=serving_default",
-            "--saved_model_tags=serve",
-            saved_model_path,
-            tfjs_output
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            print(f"Error during conversion: {result.stderr}")
-            return False
-        
-        print(f"✓ TensorFlow.js model saved to {tfjs_output}")
-        
-        # Step 4: Create model metadata
-        print(f"\n[4/4] Creating model metadata...")
-        
-        metadata = {
-            "modelFormat": "graph-model",
-            "generatedBy": "YOLO to TensorFlow.js Converter",
-            "convertedFrom": pt_model_path,
-            "imageSize": image_size,
-            "classes": ["tilapia"],
-            "stageThresholds": {
-                "starter": 3.0,
-                "grower": 6.0
-            },
-            "calibration": {
-                "realLengthCm": 2.54,
-                "realWidthCm": 30.0,
-                "imageWidthPx": 1200,
-                "imageLengthPx": 127.13
-            }
-        }
-        
-        import json
-        
-        metadata_path = os.path.join(tfjs_output, "metadata.json")
-        with open(metadata_path, "w") as f:
-            json.dump(metadata, f, indent=2)
-        
-        print(f"✓ Metadata saved to {metadata_path}")
-        
-        # Success!
-        print("\n" + "=" * 60)
-        print("✓ Conversion completed successfully!")
-        print("=" * 60)
-        print(f"\nModel files are ready at: {tfjs_output}")
-        print("\nTo use in your application:")
-        print("1. Copy the contents to your public/models/ directory")
-        print("2. Update the model path in useFishDetection.ts")
-        print("3. Load the model using tf.loadGraphModel()")
-        
-        return True
-        
+        if jobs > 1 and len(chains) > 1:
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(jobs, len(chains)), mp_context=ctx) as pool:
+                futures = [
+                    pool.submit(
+                        run_export_chain, name, fmts, pt_model_path, weights, image_size, cache_dir, use_cache,
+                        tfjs_variants, shard_size,
+                    )
+                    for name, fmts in chains.items()
+                ]
+                for future in futures:
+                    outputs.update(future.result())
+        else:
+            for name, fmts in chains.items():
+                outputs.update(run_export_chain(
+                    name, fmts, pt_model_path, weights, image_size, cache_dir, use_cache, tfjs_variants, shard_size,
+                ))
+
+        artifacts = publish_artifacts(outputs, pt_model_path, output_dir, export_dir)
+        report_tfjs_variants(artifacts, pt_model_path, image_size, weights, shard_size, parity_images)
     except Exception as e:
-        print(f"\n✗ Error during conversion: {e}")
+        print(f"\n✗ Error during export: {e}")
         import traceback
         traceback.print_exc()
         return False
 
+    print("\n" + "=" * 60)
+    print(f"✓ Conversion completed in {time.perf_counter() - started:.1f}s")
+    print("=" * 60)
+
+    if "tfjs" in artifacts:
+        print(f"\nModel files are ready at: {artifacts['tfjs']}")
+        print("\nTo use in your application:")
+        print("1. Copy the contents to your public/models/ directory")
+        print("2. Update the model path in useFishDetection.ts")
+        print("3. Load the model using tf.loadGraphModel()")
+
+    cpu_artifacts = {fmt: path for fmt, path in artifacts.items() if not fmt.startswith("tfjs")}
+    if cpu_artifacts:
+        print("\nCPU artifacts:")
+        for fmt, path in cpu_artifacts.items():
+            print(f"  {fmt:<10} {path}  (MODEL_BACKEND={fmt})")
+
+    if parity_images and cpu_artifacts:
+        return run_parity_checks(pt_model_path, cpu_artifacts, parity_images)
+
+    return True
+
 
 def create_example_usage():
     """Create an example JavaScript file showing how to use the converted model."""
@@ -201,7 +495,7 @@ const detections = await detectFish(model, videoElement);
 if __name__ == "__main__":
     import argparse
     
-    parser = argparse.ArgumentParser(description="Convert YOLO model to TensorFlow.js")
+    parser = argparse.ArgumentParser(description="Convert YOLO model to TensorFlow.js, ONNX and OpenVINO")
     parser.add_argument(
         "--model",
         type=str,
@@ -221,16 +515,84 @@ if __name__ == "__main__":
         help="Input image size (default: 640)"
     )
     
+    parser.add_argument(
+        "--formats",
+        type=str,
+        default="tfjs",
+        help=f"Comma-separated formats to produce: {', '.join(FORMATS)} (default: tfjs)"
+    )
+    parser.add_argument(
+        "--export-dir",
+        type=str,
+        default="public/models/exports",
+        help="Output directory for ONNX/OpenVINO artifacts"
+    )
+    parser.add_argument(
+        "--tfjs-variants",
+        type=str,
+        default="float32",
+        help=f"Comma-separated TF.js weight encodings: {', '.join(TFJS_VARIANTS)} (default: float32)"
+    )
+    parser.add_argument(
+        "--shard-size",
+        type=int,
+        default=DEFAULT_SHARD_SIZE,
+        help=f"TF.js weight shard size in bytes (default: {DEFAULT_SHARD_SIZE})"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Export cache directory (default: {DEFAULT_CACHE_DIR})"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore cached stages and rebuild everything"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=3,
+        help="Independent format chains (tfjs, onnx, openvino) to export in parallel (default: 3)"
+    )
+    parser.add_argument(
+        "--parity-images",
+        type=str,
+        default=None,
+        help="Image directory/glob to check exported detections against the .pt model"
+    )
+
     args = parser.parse_args()
+
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    unknown = [f for f in formats if f not in FORMATS]
+    if unknown:
+        parser.error(f"Unknown format(s): {', '.join(unknown)}")
+
+    tfjs_variants = [v.strip() for v in args.tfjs_variants.split(",") if v.strip()]
+    unknown = [v for v in tfjs_variants if v not in TFJS_VARIANTS]
+    if unknown:
+        parser.error(f"Unknown TF.js variant(s): {', '.join(unknown)}")
     
-    success = convert_yolo_to_tfjs(
+    success = convert_models(
         pt_model_path=args.model,
         output_dir=args.output,
-        image_size=args.size
+        export_dir=args.export_dir,
+        image_size=args.size,
+        formats=formats,
+        parity_images=args.parity_images,
+        cache_dir=args.cache_dir,
+        use_cache=not args.no_cache,
+        jobs=args.jobs,
+        tfjs_variants=tfjs_variants,
+        shard_size=args.shard_size,
     )
     
-    if success:
+    if success and "tfjs" in formats:
         create_example_usage()
+
+    if success:
         sys.exit(0)
     else:
         sys.exit(1)
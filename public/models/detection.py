@@ -0,0 +1,198 @@
+"""
+Model and measurement helpers shared by the desktop app and the headless tools.
+
+Nothing in here imports Kivy, so batch jobs, benchmarks and servers can reuse the
+exact calibration and stage rules of `redRilapia.py` without opening a window.
+"""
+
+import os
+from collections import namedtuple
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "best_SMF.pt")
+
+# CPU-optimised artifacts written by `convert_yolo_to_tfjs.py --formats ...`
+EXPORT_DIR = os.path.join(BASE_DIR, "exports")
+# The tfjs step leaves the Ultralytics SavedModel (and its TFLite files) next to the .pt
+SAVED_MODEL_DIR = os.path.join(BASE_DIR, "best_SMF_saved_model")
+BACKEND_ARTIFACTS = {
+    "pytorch": MODEL_PATH,
+    "onnx": os.path.join(EXPORT_DIR, "best_SMF.onnx"),
+    "onnx-int8": os.path.join(EXPORT_DIR, "best_SMF.int8.onnx"),
+    "openvino": os.path.join(EXPORT_DIR, "best_SMF_openvino_model"),
+    "savedmodel": SAVED_MODEL_DIR,
+    "tflite": os.path.join(SAVED_MODEL_DIR, "best_SMF_float32.tflite"),
+    "tflite-fp16": os.path.join(SAVED_MODEL_DIR, "best_SMF_float16.tflite"),
+}
+
+# Inference backend: a BACKEND_ARTIFACTS key, e.g. pytorch, onnx, onnx-int8 or openvino
+# (MODEL_ARTIFACT overrides the path)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "pytorch")
+
+# Calibration constants
+REAL_LENGTH_CM = 2.54
+REAL_WIDTH_CM = 30.0
+IMAGE_WIDTH_PX = 1200
+IMAGE_LENGTH_PX = 127.13
+
+# Stage thresholds (in inches)
+STARTER_MAX_IN = 3.0
+GROWER_MAX_IN = 6.0
+
+# Detections below this confidence are ignored
+CONF_THRESHOLD = 0.9
+
+STAGES = ("Starter", "Grower", "Finisher")
+
+# Result of `measure_boxes`: one row per kept detection, all NumPy arrays.
+BoxMeasurements = namedtuple("BoxMeasurements", ["xyxy", "conf", "length_in", "width_in", "stage_codes"])
+
+
+def resolve_model_path(backend=None):
+    backend = backend or MODEL_BACKEND
+    if os.getenv("MODEL_ARTIFACT"):
+        return os.getenv("MODEL_ARTIFACT")
+    if backend not in BACKEND_ARTIFACTS:
+        raise ValueError(f"Unknown model backend '{backend}'. Choose from: {', '.join(BACKEND_ARTIFACTS)}")
+    return BACKEND_ARTIFACTS[backend]
+
+
+def load_model(model_path=None, backend=None):
+    """
+    Load the detector for the configured backend.
+
+    Ultralytics runs .pt, ONNX (FP32/INT8) and OpenVINO artifacts behind the same
+    `model(frame)` call and `Results.boxes` output, so post-processing is shared.
+    """
+    from ultralytics import YOLO
+
+    model_path = model_path or resolve_model_path(backend)
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model artifact not found: {model_path} (run convert_yolo_to_tfjs.py --formats ...)")
+
+    print(f"⏳ Loading YOLO model: {model_path}")
+    # Exported formats don't carry the task reliably; this is a detection model.
+    model = YOLO(model_path) if model_path.endswith(".pt") else YOLO(model_path, task="detect")
+    print("✅ Model loaded successfully")
+    return model
+
+
+def classify_stage(long_in):
+    if long_in <= STARTER_MAX_IN:
+        return "Starter"
+    if long_in <= GROWER_MAX_IN:
+        return "Grower"
+    return "Finisher"
+
+
+def measure_box(
+    xyxy,
+    real_length_cm=REAL_LENGTH_CM,
+    real_width_cm=REAL_WIDTH_CM,
+    image_width_px=IMAGE_WIDTH_PX,
+    image_length_px=IMAGE_LENGTH_PX,
+):
+    """
+    Convert one pixel bbox to (length_in, width_in, stage).
+
+    Standard length is the longer bbox axis and width the shorter one, matching the
+    sampling report and the /api/weight endpoint.
+    """
+    pixel_width = xyxy[2] - xyxy[0]
+    pixel_length = xyxy[3] - xyxy[1]
+
+    real_world_length_cm = (pixel_length / image_length_px) * real_length_cm
+    real_world_width_cm = (pixel_width / image_width_px) * real_width_cm
+
+    real_world_length_in = real_world_length_cm / 2.54
+    real_world_width_in = real_world_width_cm / 2.54
+
+    long_in = max(real_world_length_in, real_world_width_in)
+    short_in = min(real_world_length_in, real_world_width_in)
+
+    return long_in, short_in, classify_stage(long_in)
+
+
+def to_numpy(values):
+    """Accept torch tensors (any device) or array-likes and return a NumPy array."""
+    if hasattr(values, "cpu"):
+        values = values.cpu()
+    if hasattr(values, "numpy"):
+        values = values.numpy()
+    return np.asarray(values)
+
+
+def classify_stages(long_in, starter_max_in=STARTER_MAX_IN, grower_max_in=GROWER_MAX_IN):
+    """Vectorized `classify_stage`: returns codes indexing into `STAGES`."""
+    return np.searchsorted(np.array([starter_max_in, grower_max_in]), long_in, side="left").astype(np.int8)
+
+
+def measure_boxes(
+    conf,
+    xyxy,
+    conf_threshold=CONF_THRESHOLD,
+    real_length_cm=REAL_LENGTH_CM,
+    real_width_cm=REAL_WIDTH_CM,
+    image_width_px=IMAGE_WIDTH_PX,
+    image_length_px=IMAGE_LENGTH_PX,
+    starter_max_in=STARTER_MAX_IN,
+    grower_max_in=GROWER_MAX_IN,
+    calibration=None,
+    frame_size=None,
+):
+    """
+    Filter and measure a whole frame's detections at once.
+
+    Same rules as `measure_box` (integer pixel boxes, long axis = length), but takes
+    the `(N,)` confidences and `(N, 4)` boxes in one go, e.g. `boxes.conf` and
+    `boxes.xyxy` from an Ultralytics result, and does a single device→host copy.
+
+    With a `calibration.Calibration` the per-pixel scale map replaces the global
+    px→cm constants; `frame_size` is the `(width, height)` of the detection frame.
+    """
+    # float64 so the threshold compares exactly like `float(box.conf) < 0.9` did.
+    conf = to_numpy(conf).reshape(-1).astype(np.float64)
+    xyxy = to_numpy(xyxy).reshape(-1, 4)
+
+    keep = conf >= conf_threshold
+    conf = conf[keep]
+    xyxy = xyxy[keep].astype(np.int32)
+
+    if calibration is not None:
+        width_cm, length_cm = calibration.box_size_cm(xyxy, frame_size)
+        length_in = length_cm / 2.54
+        width_in = width_cm / 2.54
+    else:
+        pixel_width = xyxy[:, 2] - xyxy[:, 0]
+        pixel_length = xyxy[:, 3] - xyxy[:, 1]
+
+        length_in = (pixel_length / image_length_px) * real_length_cm / 2.54
+        width_in = (pixel_width / image_width_px) * real_width_cm / 2.54
+
+    long_in = np.maximum(length_in, width_in)
+    short_in = np.minimum(length_in, width_in)
+
+    return BoxMeasurements(xyxy, conf, long_in, short_in, classify_stages(long_in, starter_max_in, grower_max_in))
+
+
+def estimate_weight_g(length_in, width_in):
+    """
+    Weight estimate in grams, the formula of `DocsController::calculateFishWeight`.
+
+    Accepts scalars or arrays of standard length and body width in inches.
+    """
+    length_in = np.asarray(length_in, dtype=np.float64)
+    width_in = np.asarray(width_in, dtype=np.float64)
+    # The server converts to cm and back with 0.3937, not exactly 1/2.54.
+    height = np.maximum(length_in, width_in) * 2.54 * 0.3937 * 1.9
+    width = np.minimum(length_in, width_in) * 2.54 * 0.3937
+    return width * height * height / 690 * 453.592
+
+
+def measure_results(boxes, **kwargs):
+    """`measure_boxes` for an Ultralytics `Boxes` object (or an empty list)."""
+    if boxes is None or len(boxes) == 0:
+        return measure_boxes(np.zeros(0), np.zeros((0, 4)), **kwargs)
+    return measure_boxes(boxes.conf, boxes.xyxy, **kwargs)
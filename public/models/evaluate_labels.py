@@ -0,0 +1,342 @@
+"""
+Measurement-accuracy evaluation against the annotated set in `yolo_labels.json`.
+
+Runs the model over the labelled images on a process pool and streams one JSONL
+record per image (raw predictions plus that image's scores) as results arrive,
+then reports:
+
+* detection quality: mAP@0.5, mAP@0.5:0.95, precision/recall and mean IoU at
+  the app's confidence threshold
+* length/width error in inches between matched predicted and labelled boxes
+* a stage confusion matrix: the stage in the image name (starter/grower/
+  finisher) vs the stage the app would assign, plus the same matrix for the
+  labelled boxes themselves (a check of the calibration and thresholds that
+  doesn't involve the model)
+
+Labels come from the columnar store (`label_store.py`) when it is up to date.
+The predictions file keeps raw pixel boxes and confidences, so `--rescore`
+re-evaluates it under different calibration constants or stage thresholds
+without running the model again.
+
+Usage:
+python evaluate_labels.py --images-dir dataset/images --workers 4 --predictions preds.jsonl --report eval.json
+python evaluate_labels.py --rescore --predictions preds.jsonl --image-length-px 130 --grower-max-in 6.5
+python evaluate_labels.py --images-dir dataset/images --tile-size 640 --conf 0.6 --predictions preds_tiled.jsonl
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from detection import (
+    CONF_THRESHOLD,
+    GROWER_MAX_IN,
+    IMAGE_LENGTH_PX,
+    IMAGE_WIDTH_PX,
+    REAL_LENGTH_CM,
+    REAL_WIDTH_CM,
+    STAGES,
+    STARTER_MAX_IN,
+    measure_boxes,
+)
+from label_store import LABELS_PATH, open_labels, stage_from_key
+from tracker import greedy_match, iou_matrix
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+# Keyword arguments of `detection.measure_boxes` that --rescore can override
+DEFAULT_CALIBRATION = {
+    "real_length_cm": REAL_LENGTH_CM,
+    "real_width_cm": REAL_WIDTH_CM,
+    "image_width_px": IMAGE_WIDTH_PX,
+    "image_length_px": IMAGE_LENGTH_PX,
+    "starter_max_in": STARTER_MAX_IN,
+    "grower_max_in": GROWER_MAX_IN,
+}
+
+MATCH_IOU = 0.5
+MAP_IOU_THRESHOLDS = np.round(np.arange(0.5, 0.96, 0.05), 2)
+NO_DETECTION = "none"
+
+
+def find_image(images_dir, key):
+    for ext in IMAGE_EXTENSIONS:
+        candidate = os.path.join(images_dir, key + ext)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def label_boxes_xyxy(boxes, width, height):
+    """
+    Normalized YOLO centre/size label boxes → `(N, 4)` pixel xyxy.
+
+    `boxes` is a list of label dicts (JSON) or an `(N, 4)` array (`LabelStore`).
+    """
+    if len(boxes) == 0:
+        return np.zeros((0, 4), dtype=np.float64)
+    if isinstance(boxes[0], dict):
+        cxcywh = np.array([[b["x_center"], b["y_center"], b["width"], b["height"]] for b in boxes], dtype=np.float64)
+    else:
+        cxcywh = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+    cxcywh *= [width, height, width, height]
+    half = cxcywh[:, 2:] / 2.0
+    return np.hstack([cxcywh[:, :2] - half, cxcywh[:, :2] + half])
+
+
+# --- Inference (worker processes) -------------------------------------------
+
+_worker_model = None
+
+
+def _init_worker(model_path, threads, tile_size=0, imgsz=640):
+    global _worker_model
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    from detection import load_model
+
+    _worker_model = load_model(model_path)
+    if tile_size:
+        from tiled_inference import TiledDetector
+
+        _worker_model = TiledDetector(_worker_model, imgsz=imgsz, tile_scales=(tile_size / imgsz,))
+
+
+def predict_image(task):
+    """Worker: run the model on one labelled image and return its raw record."""
+    key, path, imgsz, store_conf = task
+    import cv2
+
+    frame = cv2.imread(path)
+    if frame is None:
+        return {"image": key, "error": f"Could not read {path}"}
+
+    started = time.perf_counter()
+    result = _worker_model(frame, imgsz=imgsz, conf=store_conf, verbose=False)[0]
+    boxes = result.boxes
+    return {
+        "image": key,
+        "width": int(frame.shape[1]),
+        "height": int(frame.shape[0]),
+        "inference_ms": round((time.perf_counter() - started) * 1000.0, 2),
+        "pred_xyxy": np.asarray(boxes.xyxy.cpu() if hasattr(boxes.xyxy, "cpu") else boxes.xyxy).round(2).tolist(),
+        "pred_conf": np.asarray(boxes.conf.cpu() if hasattr(boxes.conf, "cpu") else boxes.conf).round(5).tolist(),
+    }
+
+
+def run_inference(labels, images_dir, model_path=None, workers=2, imgsz=640, store_conf=0.01, limit=None, tile_size=0):
+    """Yield raw prediction records as the pool finishes them (unordered)."""
+    tasks = []
+    for key in sorted(labels):
+        path = find_image(images_dir, key)
+        if path is not None:
+            tasks.append((key, path, imgsz, store_conf))
+        if limit and len(tasks) >= limit:
+            break
+    if not tasks:
+        return
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(model_path, threads, tile_size, imgsz)) as pool:
+        yield from pool.imap_unordered(predict_image, tasks, chunksize=4)
+
+
+# --- Scoring -----------------------------------------------------------------
+
+def score_image(record, labels, calibration, conf_threshold=CONF_THRESHOLD):
+    """Per-image scores at the operating threshold; also the inputs for the aggregates."""
+    gt_xyxy = label_boxes_xyxy(labels.get(record["image"], []), record["width"], record["height"])
+    pred_xyxy = np.asarray(record["pred_xyxy"], dtype=np.float64).reshape(-1, 4)
+    pred_conf = np.asarray(record["pred_conf"], dtype=np.float64)
+
+    pred = measure_boxes(pred_conf, pred_xyxy, conf_threshold=conf_threshold, **calibration)
+    gt = measure_boxes(np.ones(len(gt_xyxy)), gt_xyxy, conf_threshold=0.0, **calibration)
+
+    iou = iou_matrix(pred.xyxy, gt.xyxy)
+    pairs = greedy_match(iou, MATCH_IOU)
+
+    true_stage = stage_from_key(record["image"])
+    best = int(np.argmax(pred.conf)) if len(pred.conf) else None
+    return {
+        "image": record["image"],
+        "true_stage": true_stage,
+        "pred_stage": STAGES[pred.stage_codes[best]] if best is not None else NO_DETECTION,
+        "label_stage": STAGES[gt.stage_codes[0]] if len(gt.stage_codes) else NO_DETECTION,
+        "gt_boxes": len(gt.conf),
+        "pred_boxes": len(pred.conf),
+        "matched": len(pairs),
+        "ious": [round(float(iou[p, g]), 4) for p, g in pairs],
+        "length_err_in": [round(float(pred.length_in[p] - gt.length_in[g]), 4) for p, g in pairs],
+        "width_err_in": [round(float(pred.width_in[p] - gt.width_in[g]), 4) for p, g in pairs],
+    }
+
+
+def average_precision(records, labels, iou_threshold):
+    """Single-class AP (COCO-style 101-point interpolation) over all records."""
+    scores, hits = [], []
+    total_gt = 0
+    for record in records:
+        gt = label_boxes_xyxy(labels.get(record["image"], []), record["width"], record["height"])
+        conf = np.asarray(record["pred_conf"], dtype=np.float64)
+        pred = np.asarray(record["pred_xyxy"], dtype=np.float64).reshape(-1, 4)
+        total_gt += len(gt)
+
+        order = np.argsort(-conf)
+        iou = iou_matrix(pred[order], gt)
+        used = np.zeros(len(gt), dtype=bool)
+        for row, i in enumerate(order):
+            candidates = np.where(~used, iou[row], -1.0) if len(gt) else np.zeros(0)
+            hit = bool(candidates.size and candidates.max() >= iou_threshold)
+            if hit:
+                used[int(candidates.argmax())] = True
+            scores.append(conf[i])
+            hits.append(hit)
+
+    if not total_gt:
+        return None
+    order = np.argsort(-np.asarray(scores))
+    hits = np.asarray(hits, dtype=bool)[order]
+    tp = np.cumsum(hits)
+    fp = np.cumsum(~hits)
+    recall = tp / total_gt
+    precision = tp / np.maximum(tp + fp, 1)
+    # Precision envelope, sampled at 101 recall points.
+    precision = np.maximum.accumulate(precision[::-1])[::-1] if precision.size else precision
+    points = np.linspace(0, 1, 101)
+    idx = np.searchsorted(recall, points, side="left")
+    sampled = np.where(idx < len(precision), precision[np.minimum(idx, len(precision) - 1)], 0.0)
+    return float(sampled.mean())
+
+
+def error_stats(errors):
+    errors = np.asarray(errors, dtype=np.float64)
+    if not errors.size:
+        return None
+    return {
+        "count": int(errors.size),
+        "mae": round(float(np.abs(errors).mean()), 4),
+        "bias": round(float(errors.mean()), 4),
+        "rmse": round(float(np.sqrt((errors ** 2).mean())), 4),
+        "p95_abs": round(float(np.percentile(np.abs(errors), 95)), 4),
+    }
+
+
+def confusion(scored, predicted_field):
+    columns = list(STAGES) + [NO_DETECTION]
+    matrix = np.zeros((len(STAGES), len(columns)), dtype=np.int64)
+    for s in scored:
+        if s["true_stage"] in STAGES:
+            matrix[STAGES.index(s["true_stage"]), columns.index(s[predicted_field])] += 1
+    labelled = matrix.sum()
+    return {
+        "rows": list(STAGES),
+        "columns": columns,
+        "matrix": matrix.tolist(),
+        "accuracy": round(float(np.trace(matrix[:, :len(STAGES)]) / labelled), 4) if labelled else None,
+    }
+
+
+def evaluate(records, labels, calibration=None, conf_threshold=CONF_THRESHOLD):
+    """Aggregate report for raw prediction records (from `run_inference` or a predictions file)."""
+    calibration = {**DEFAULT_CALIBRATION, **(calibration or {})}
+    records = [r for r in records if "error" not in r]
+    scored = [score_image(r, labels, calibration, conf_threshold) for r in records]
+
+    ious = [v for s in scored for v in s["ious"]]
+    matched = sum(s["matched"] for s in scored)
+    gt_boxes = sum(s["gt_boxes"] for s in scored)
+    pred_boxes = sum(s["pred_boxes"] for s in scored)
+    ap = {float(t): average_precision(records, labels, t) for t in MAP_IOU_THRESHOLDS}
+    valid_ap = [v for v in ap.values() if v is not None]
+
+    return {
+        "images": len(records),
+        "conf_threshold": conf_threshold,
+        "calibration": calibration,
+        "detection": {
+            "map50": round(ap[0.5], 4) if ap[0.5] is not None else None,
+            "map50_95": round(float(np.mean(valid_ap)), 4) if valid_ap else None,
+            "precision": round(matched / pred_boxes, 4) if pred_boxes else None,
+            "recall": round(matched / gt_boxes, 4) if gt_boxes else None,
+            "mean_iou": round(float(np.mean(ious)), 4) if ious else None,
+        },
+        "measurement": {
+            "length_in": error_stats([v for s in scored for v in s["length_err_in"]]),
+            "width_in": error_stats([v for s in scored for v in s["width_err_in"]]),
+        },
+        "stage_confusion": confusion(scored, "pred_stage"),
+        "label_stage_confusion": confusion(scored, "label_stage"),
+    }
+
+
+def read_predictions(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate detections and measurements against yolo_labels.json")
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--images-dir", help="Labelled images named after the label keys (runs inference)")
+    parser.add_argument("--rescore", action="store_true", help="Score an existing --predictions file without inference")
+    parser.add_argument("--predictions", default="predictions.jsonl", help="Per-image JSONL (written, or read with --rescore)")
+    parser.add_argument("--report", default=None, help="Write the aggregate report as JSON here")
+    parser.add_argument("--model", default=None, help="Model artifact (default: MODEL_BACKEND)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--tile-size", type=int, default=0, help="Sliced inference with this tile size in pixels (0 = off)")
+    parser.add_argument("--conf", type=float, default=CONF_THRESHOLD, help="Operating confidence threshold")
+    for name, value in DEFAULT_CALIBRATION.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, default=value)
+    args = parser.parse_args(argv)
+
+    if not args.rescore and not args.images_dir:
+        parser.error("pass --images-dir to run inference or --rescore to score existing predictions")
+
+    labels = open_labels(args.labels)
+    calibration = {name: getattr(args, name) for name in DEFAULT_CALIBRATION}
+
+    if args.rescore:
+        records = read_predictions(args.predictions)
+    else:
+        records = []
+        started = time.perf_counter()
+        with open(args.predictions, "w") as out:
+            for record in run_inference(labels, args.images_dir, args.model, args.workers, args.imgsz, limit=args.limit, tile_size=args.tile_size):
+                records.append(record)
+                line = dict(record)
+                if "error" not in record:
+                    line["score"] = score_image(record, labels, {**DEFAULT_CALIBRATION, **calibration}, args.conf)
+                out.write(json.dumps(line) + "\n")
+                out.flush()
+                if len(records) % 50 == 0:
+                    rate = len(records) / (time.perf_counter() - started)
+                    print(f"⏳ {len(records)} images ({rate:.1f}/s)", file=sys.stderr)
+        if not records:
+            print(f"❌ No labelled images found in {args.images_dir}")
+            return 1
+        print(f"✅ {len(records)} predictions written to {args.predictions}", file=sys.stderr)
+
+    report = evaluate(records, labels, calibration, args.conf)
+    text = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(text)
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Content-addressed cache for model export stages.
+
+Every stage output (SavedModel, TF.js, ONNX, ...) is stored under
+`<root>/<stage>/<key>/`, where `key` hashes everything that determines the
+output: the weight file's SHA-256, the export options, the keys of upstream
+stages and the exporter version. If the same inputs come up again, the stored
+directory is reused and the export doesn't run. Entries are built in a temporary
+directory and renamed into place, so an interrupted or concurrent export never
+leaves a half-written entry behind.
+
+Usage:
+cache = ExportCache("public/models/.export_cache")
+key = cache.key("onnx", weights=file_sha256("best_SMF.pt"), imgsz=640)
+path = cache.build("onnx", key, lambda work_dir: export_into(work_dir))
+"""
+
+import glob
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+
+
+def file_sha256(path):
+    """SHA-256 of a file, or of every file (in sorted order) under a directory."""
+    digest = hashlib.sha256()
+    paths = [path]
+    if os.path.isdir(path):
+        paths = [p for p in sorted(glob.glob(os.path.join(path, "**", "*"), recursive=True)) if os.path.isfile(p)]
+    for p in paths:
+        with open(p, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExportCache:
+    """
+    Args:
+        root: Cache directory.
+        enabled: When False every lookup misses and entries are rebuilt (and
+            overwritten), e.g. for `--no-cache`.
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, root, enabled=True):
+        self.root = root
+        self.enabled = enabled
+
+    @staticmethod
+    def key(stage, **inputs):
+        payload = json.dumps({"stage": stage, "inputs": inputs}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:20]
+
+    def entry_dir(self, stage, key):
+        return os.path.join(self.root, stage, key)
+
+    def lookup(self, stage, key):
+        """Path of the stage's output if it is cached, else None."""
+        if not self.enabled:
+            return None
+        manifest_path = os.path.join(self.entry_dir(stage, key), self.MANIFEST)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        output = os.path.join(self.entry_dir(stage, key), manifest["output"])
+        return output if os.path.exists(output) else None
+
+    def build(self, stage, key, builder, inputs=None):
+        """
+        Return the cached output for `(stage, key)`, running `builder` on a miss.
+
+        `builder(work_dir)` must write its output inside `work_dir` and return the
+        output's path (absolute or relative to `work_dir`).
+        """
+        cached = self.lookup(stage, key)
+        if cached is not None:
+            print(f"✓ [{stage}] cache hit {key}")
+            return cached
+
+        final_dir = self.entry_dir(stage, key)
+        work_dir = os.path.join(self.root, stage, f".tmp-{key}-{uuid.uuid4().hex[:8]}")
+        os.makedirs(work_dir)
+        try:
+            output = os.path.relpath(os.path.abspath(builder(work_dir)), os.path.abspath(work_dir))
+            manifest = {
+                "stage": stage,
+                "key": key,
+                "output": output,
+                "inputs": inputs or {},
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            with open(os.path.join(work_dir, self.MANIFEST), "w") as f:
+                json.dump(manifest, f, indent=2, default=str)
+
+            if os.path.exists(final_dir):
+                shutil.rmtree(final_dir)
+            try:
+                os.replace(work_dir, final_dir)
+            except OSError:
+                # Another process finished the same entry first; theirs is identical.
+                if self.lookup(stage, key) is None:
+                    raise
+        finally:
+            if os.path.exists(work_dir):
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        return os.path.join(final_dir, output)
+
+
+def publish(src, dst):
+    """Copy a cached file or directory to its published location, replacing it."""
+    parent = os.path.dirname(os.path.abspath(dst))
+    os.makedirs(parent, exist_ok=True)
+    if os.path.isdir(dst):
+        shutil.rmtree(dst)
+    elif os.path.exists(dst):
+        os.remove(dst)
+    if os.path.isdir(src):
+        shutil.copytree(src, dst)
+    else:
+        shutil.copy2(src, dst)
+    return dst
@@ -0,0 +1,415 @@
+"""
+Pluggable frame sources for the tilapia detector.
+
+Every source has the same small interface as `cv2.VideoCapture` (`read()`
+returning `(ok, frame)`, `release()`, `isOpened()`) plus latency accounting:
+`read()` stamps each frame with the time it arrived (`captured_at`), and the
+consumer calls `record_display(captured_at)` once the frame is on screen, which
+feeds the source's capture→display latency stats.
+
+Backends:
+
+* `v4l2:/dev/video0` (or a bare index on Linux): V4L2, MJPEG, buffer size 1 so a
+  read never returns a frame that sat in the driver queue.
+* `dshow:0` (or a bare index on Windows): DirectShow, buffer size 1.
+* `gst:<pipeline>`: a GStreamer pipeline string ending in `appsink`.
+* `file:clip.mp4` (or any path with a video extension): a video file, paced at
+  its own frame rate so it behaves like a camera; loops by default.
+* `replay:recording.npy`: raw BGR frames from a memory-mapped `.npy` recording.
+  No decoding, no camera and the same frames every run, so pipeline benchmarks
+  are reproducible. Frames are served at the recorded fps, or as fast as
+  possible with `?fps=0`.
+
+Options go after `?`, e.g. `v4l2:/dev/video2?width=1920&height=1080&fps=30`.
+Stream URLs such as `rtsp://...` or `http://...` are opened by OpenCV as given.
+
+Usage:
+    # Record 300 frames from the camera for later replay
+    python frame_source.py record v4l2:/dev/video0 -o recording.npy --frames 300
+
+    # Read a source for 10 s and print capture fps / latency
+    python frame_source.py probe replay:recording.npy?fps=0 --seconds 10
+"""
+
+import argparse
+import inspect
+import json
+import os
+import sys
+import time
+from urllib.parse import parse_qsl
+
+import cv2
+import numpy as np
+
+from pipeline import StageStats
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".webm", ".m4v")
+# Spec prefixes handled by `open_source`; other "scheme://" URLs go to OpenCV as they are.
+SOURCE_KINDS = ("v4l2", "dshow", "gst", "file", "replay")
+
+DEFAULT_WIDTH = 1280
+DEFAULT_HEIGHT = 720
+
+
+class FrameSource:
+    """
+    Base class. Subclasses implement `_read()` returning `(ok, frame)` and
+    optionally `_release()`.
+
+    Args:
+        name: Label used in stats.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.captured_at = None
+        self.capture_stats = StageStats(f"{name} capture")
+        self.latency_stats = StageStats(f"{name} capture→display")
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        started = time.perf_counter()
+        ok, frame = self._read()
+        if ok and frame is not None:
+            self.captured_at = time.perf_counter()
+            self.capture_stats.record(self.captured_at - started)
+        return ok, frame
+
+    def _read(self):
+        raise NotImplementedError
+
+    def release(self):
+        self._release()
+
+    def _release(self):
+        pass
+
+    def record_display(self, captured_at):
+        """Call once the frame read at `captured_at` has been displayed."""
+        if captured_at is not None:
+            self.latency_stats.record(time.perf_counter() - captured_at)
+
+    def stats(self):
+        capture = self.capture_stats.snapshot()
+        latency = self.latency_stats.snapshot()
+        return {
+            "source": self.name,
+            "capture_fps": capture["fps"],
+            "read_ms": capture["avg_ms"],
+            "capture_to_display_ms": latency["avg_ms"],
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        return f"{s['capture_fps']:.1f} fps, capture→display {s['capture_to_display_ms']:.0f} ms"
+
+
+class OpenCVSource(FrameSource):
+    """
+    `cv2.VideoCapture` on a given backend.
+
+    Args:
+        target: Device index, device path, file path or GStreamer pipeline.
+        api: OpenCV backend (`cv2.CAP_V4L2`, `cv2.CAP_DSHOW`, `cv2.CAP_GSTREAMER`, ...).
+        width / height / fps: Requested capture format (None leaves the default).
+        fourcc: Requested pixel format, e.g. "MJPG" (None leaves the default).
+        buffer_size: Driver queue length; 1 keeps only the newest frame.
+    """
+
+    def __init__(self, target, api=cv2.CAP_ANY, width=None, height=None, fps=None, fourcc=None, buffer_size=None, name=None):
+        super().__init__(name or str(target))
+        self.capture = cv2.VideoCapture(target, api)
+        # FOURCC has to be set before the size for V4L2 to pick the MJPEG modes.
+        if fourcc:
+            self.capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        if width:
+            self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height:
+            self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if fps:
+            self.capture.set(cv2.CAP_PROP_FPS, fps)
+        if buffer_size:
+            self.capture.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def _read(self):
+        return self.capture.read()
+
+    def _release(self):
+        if self.capture.isOpened():
+            self.capture.release()
+
+
+class V4L2Source(OpenCVSource):
+    def __init__(self, device=0, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, fps=None, fourcc="MJPG", buffer_size=1):
+        target = int(device) if str(device).isdigit() else device
+        super().__init__(target, cv2.CAP_V4L2, width, height, fps, fourcc, buffer_size, name=f"v4l2:{device}")
+
+
+class DirectShowSource(OpenCVSource):
+    def __init__(self, device=0, width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, fps=None, fourcc=None, buffer_size=1):
+        super().__init__(int(device), cv2.CAP_DSHOW, width, height, fps, fourcc, buffer_size, name=f"dshow:{device}")
+
+
+class GStreamerSource(OpenCVSource):
+    """
+    Args:
+        pipeline: GStreamer pipeline ending in an appsink, e.g.
+            "v4l2src ! image/jpeg,width=1280,height=720 ! jpegdec ! videoconvert ! appsink drop=true max-buffers=1".
+    """
+
+    def __init__(self, pipeline):
+        super().__init__(pipeline, cv2.CAP_GSTREAMER, name="gst")
+
+
+class FileSource(OpenCVSource):
+    """
+    Args:
+        path: Video file.
+        loop: Restart at the end instead of reporting end of stream.
+        realtime: Pace reads at the file's frame rate, like a live camera.
+    """
+
+    def __init__(self, path, loop=True, realtime=True):
+        super().__init__(path, cv2.CAP_ANY, name=f"file:{os.path.basename(path)}")
+        self.loop = loop
+        fps = self.capture.get(cv2.CAP_PROP_FPS) or 0.0
+        self.interval = 1.0 / fps if realtime and fps > 0 else 0.0
+        self._next_at = None
+
+    def _read(self):
+        _pace(self)
+        ok, frame = self.capture.read()
+        if not ok and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.capture.read()
+        return ok, frame
+
+
+class ReplaySource(FrameSource):
+    """
+    Frames from a memory-mapped `(N, H, W, 3)` uint8 `.npy` recording.
+
+    The array is mapped read-only, so opening is instant and only the pages of
+    frames actually served are read. Every read returns a read-only view into the
+    map, so no copy is made.
+
+    Args:
+        path: Recording written by `record()`.
+        fps: Serving rate; None uses the rate stored with the recording, 0 is unpaced.
+        loop: Restart at frame 0 after the last frame.
+    """
+
+    def __init__(self, path, fps=None, loop=True):
+        super().__init__(f"replay:{os.path.basename(path)}")
+        self.frames = np.load(path, mmap_mode="r")
+        if self.frames.ndim != 4 or self.frames.dtype != np.uint8:
+            raise ValueError(f"{path}: expected an (N, H, W, 3) uint8 recording, got {self.frames.shape} {self.frames.dtype}")
+
+        meta = read_recording_meta(path)
+        if fps is None:
+            fps = meta.get("fps", 0.0)
+        self.interval = 1.0 / fps if fps else 0.0
+        self.loop = loop
+        self.index = 0
+        self._next_at = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def _read(self):
+        if self.index >= len(self.frames):
+            if not self.loop:
+                return False, None
+            self.index = 0
+        _pace(self)
+        frame = self.frames[self.index]
+        self.index += 1
+        return True, frame
+
+    def _release(self):
+        # Drop the map so the file can be replaced on Windows.
+        self.frames = np.empty((0, 0, 0, 3), dtype=np.uint8)
+
+
+def _pace(source):
+    """Sleep until the next frame is due at `source.interval` seconds per frame."""
+    if not source.interval:
+        return
+    now = time.perf_counter()
+    if source._next_at is None or now - source._next_at > source.interval:
+        # First frame, or we fell behind: resynchronise instead of bursting.
+        source._next_at = now
+    elif source._next_at > now:
+        time.sleep(source._next_at - now)
+    source._next_at += source.interval
+
+
+def _meta_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def read_recording_meta(path):
+    try:
+        with open(_meta_path(path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _options(query):
+    options = {}
+    for key, value in parse_qsl(query):
+        if value.lower() in ("true", "false"):
+            options[key] = value.lower() == "true"
+        else:
+            try:
+                options[key] = float(value) if "." in value else int(value)
+            except ValueError:
+                options[key] = value
+    return options
+
+
+def _build(cls, target, options):
+    """`cls(target, **options)`, with unknown option names reported as ValueError."""
+    accepted = list(inspect.signature(cls.__init__).parameters)[2:]
+    unknown = sorted(set(options) - set(accepted))
+    if unknown:
+        raise ValueError(f"Unknown option(s) {', '.join(unknown)} for {cls.__name__} (accepted: {', '.join(accepted)})")
+    return cls(target, **options)
+
+
+def open_source(spec):
+    """
+    Build a `FrameSource` from a spec string (see the module docstring).
+
+    A bare camera index uses DirectShow on Windows and V4L2 elsewhere. Any other
+    `scheme://` URL (rtsp://, http://, ...) goes to `cv2.VideoCapture` unchanged.
+    """
+    spec = str(spec).strip()
+    scheme, sep, _ = spec.partition("://")
+    if sep and scheme not in SOURCE_KINDS:
+        return OpenCVSource(spec, cv2.CAP_ANY)
+
+    kind, sep, rest = spec.partition(":")
+    if not sep or len(kind) == 1:
+        # "0", "clip.mp4", or a Windows path such as "C:\\clip.mp4".
+        kind, rest = ("camera", spec) if spec.isdigit() else ("file", spec)
+
+    # GStreamer pipelines contain their own "?"/"=" characters; never split them.
+    if kind == "gst":
+        return GStreamerSource(rest)
+
+    target, _, query = rest.partition("?")
+    options = _options(query)
+
+    if kind == "camera":
+        kind = "dshow" if os.name == "nt" else "v4l2"
+    if kind == "v4l2":
+        return _build(V4L2Source, target, options)
+    if kind == "dshow":
+        return _build(DirectShowSource, target, options)
+    if kind == "file":
+        if not target.lower().endswith(VIDEO_EXTENSIONS):
+            print(f"⚠️ {target} has no known video extension; opening it as a file anyway")
+        return _build(FileSource, target, options)
+    if kind == "replay":
+        return _build(ReplaySource, target, options)
+    raise ValueError(f"Unknown frame source type {kind!r} in {spec!r}")
+
+
+def record(source, path, frames, fps=None):
+    """
+    Write `frames` frames from `source` to a `.npy` recording for `ReplaySource`.
+
+    Frames are written straight into a memory-mapped output file, so memory use
+    stays at one frame regardless of the recording length.
+    """
+    ok, first = source.read()
+    if not ok or first is None:
+        raise RuntimeError(f"Could not read a frame from {source.name}")
+
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(frames, *first.shape))
+    out[0] = first
+    started = time.perf_counter()
+    written = 1
+    while written < frames:
+        ok, frame = source.read()
+        if not ok or frame is None:
+            break
+        if frame.shape != first.shape:
+            raise RuntimeError(f"Frame size changed mid-recording: {frame.shape} vs {first.shape}")
+        out[written] = frame
+        written += 1
+    elapsed = time.perf_counter() - started
+    out.flush()
+    del out
+
+    if written < frames:
+        # Source ended early; rewrite with the real length.
+        tmp_path = f"{path}.tmp.npy"
+        np.save(tmp_path, np.load(path, mmap_mode="r")[:written])
+        os.replace(tmp_path, path)
+
+    measured_fps = (written - 1) / elapsed if elapsed > 0 else 0.0
+    meta = {"frames": written, "shape": list(first.shape), "fps": round(fps or measured_fps, 2), "source": source.name}
+    with open(_meta_path(path), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def probe(source, seconds):
+    """Read `source` for `seconds`, treating each frame as displayed immediately."""
+    deadline = time.perf_counter() + seconds
+    frames = 0
+    while time.perf_counter() < deadline:
+        ok, frame = source.read()
+        if not ok or frame is None:
+            break
+        source.record_display(source.captured_at)
+        frames += 1
+    return {**source.stats(), "frames": frames}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record or probe detector frame sources")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record", help="Record raw frames for replay")
+    rec.add_argument("source", help="Source spec, e.g. v4l2:/dev/video0 or dshow:0")
+    rec.add_argument("-o", "--output", required=True, help="Output .npy file")
+    rec.add_argument("--frames", type=int, default=300)
+    rec.add_argument("--fps", type=float, default=None, help="Replay rate to store (default: measured)")
+
+    prb = sub.add_parser("probe", help="Measure capture fps and read latency")
+    prb.add_argument("source")
+    prb.add_argument("--seconds", type=float, default=5.0)
+
+    args = parser.parse_args(argv)
+    try:
+        source = open_source(args.source)
+    except (ValueError, OSError) as e:
+        print(f"❌ {e}")
+        return 1
+    if not source.isOpened():
+        print(f"❌ Could not open {args.source}")
+        return 1
+
+    try:
+        if args.command == "record":
+            meta = record(source, args.output, args.frames, args.fps)
+            print(f"✅ Recorded {meta['frames']} frames {tuple(meta['shape'])} at {meta['fps']} fps → {args.output}")
+        else:
+            print(json.dumps(probe(source, args.seconds), indent=2))
+    finally:
+        source.release()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
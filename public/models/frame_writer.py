@@ -0,0 +1,152 @@
+"""
+Background snapshot writer with a disk retention policy.
+
+Encoding a PNG on the UI thread stalls the preview, and overwriting a single
+`frame.png` keeps no history. `FrameWriter` encodes on a worker thread fed by a
+bounded queue (frames are dropped, not queued up, when the disk is slow), names
+files by timestamp and sampling tag, and deletes the oldest snapshots once the
+count or byte budget is exceeded.
+"""
+
+import os
+import queue
+import re
+import threading
+from collections import deque
+from contextlib import nullcontext
+from datetime import datetime
+
+import cv2
+
+FORMATS = {
+    "jpg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),
+    "png": (".png", None),
+}
+
+FILE_PREFIX = "frame_"
+
+
+def sanitize_tag(tag):
+    return re.sub(r"[^A-Za-z0-9_-]+", "-", tag or "").strip("-") or "untagged"
+
+
+class FrameWriter:
+    """
+    Args:
+        output_dir: Directory for snapshots.
+        fmt: "jpg", "webp" or "png".
+        quality: JPEG/WebP quality (0-100); ignored for PNG.
+        max_files: Keep at most this many snapshots (0 = unlimited).
+        max_bytes: Keep at most this many bytes of snapshots (0 = unlimited).
+        queue_size: Pending frames before new ones are dropped.
+        on_saved: Called from the worker thread with the path of each saved file.
+        metrics: Optional `metrics.Metrics`; encode + write time goes to the "save" span.
+    """
+
+    def __init__(self, output_dir, fmt="jpg", quality=85, max_files=200, max_bytes=0, queue_size=4, on_saved=None, metrics=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported snapshot format: {fmt}")
+
+        self.output_dir = output_dir
+        self.extension, quality_flag = FORMATS[fmt]
+        self.params = [quality_flag, int(quality)] if quality_flag is not None else []
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.on_saved = on_saved
+        self.metrics = metrics
+
+        self.saved = 0
+        self.dropped = 0
+        self.deleted = 0
+        self.latest_path = None
+
+        os.makedirs(output_dir, exist_ok=True)
+        self._files = deque(self._scan_existing())
+        self._total_bytes = sum(size for _, size in self._files)
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="frame-writer", daemon=True)
+        self._thread.start()
+
+    def _scan_existing(self):
+        entries = []
+        for entry in os.scandir(self.output_dir):
+            if entry.is_file() and entry.name.startswith(FILE_PREFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+        entries.sort()
+        return [(path, size) for _, path, size in entries]
+
+    def submit(self, frame, tag=None, timestamp=None):
+        """Queue a copy of `frame` for saving; returns False if it was dropped."""
+        timestamp = timestamp or datetime.now()
+        try:
+            self._queue.put_nowait((frame.copy(), sanitize_tag(tag), timestamp))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            try:
+                self._write(*item)
+            except Exception as e:
+                print(f"❌ Failed to save frame: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, frame, tag, timestamp):
+        name = f"{FILE_PREFIX}{timestamp.strftime('%Y%m%d_%H%M%S_%f')[:-3]}_{tag}{self.extension}"
+        path = os.path.join(self.output_dir, name)
+        # Write to a temp name first so the preview widget never loads a half-written file.
+        tmp_path = os.path.join(self.output_dir, f".tmp_{name}")
+        with self.metrics.span("save") if self.metrics else nullcontext():
+            if not cv2.imwrite(tmp_path, frame, self.params):
+                raise IOError(f"cv2.imwrite failed for {path}")
+            os.replace(tmp_path, path)
+
+        size = os.path.getsize(path)
+        self._files.append((path, size))
+        self._total_bytes += size
+        self.saved += 1
+        self.latest_path = path
+
+        self._enforce_retention()
+
+        if self.on_saved is not None:
+            self.on_saved(path)
+
+    def _enforce_retention(self):
+        # Never delete the file that was just written.
+        while len(self._files) > 1 and (
+            (self.max_files and len(self._files) > self.max_files)
+            or (self.max_bytes and self._total_bytes > self.max_bytes)
+        ):
+            path, size = self._files.popleft()
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._total_bytes -= size
+            self.deleted += 1
+
+    def stats(self):
+        return {
+            "saved": self.saved,
+            "dropped": self.dropped,
+            "deleted": self.deleted,
+            "files": len(self._files),
+            "bytes": self._total_bytes,
+        }
+
+    def close(self, timeout=5.0):
+        """Flush pending frames and stop the worker."""
+        self._queue.put(None)
+        self._thread.join(timeout)
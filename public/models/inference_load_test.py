@@ -0,0 +1,139 @@
+"""
+Load test for `inference_server.py`.
+
+Opens `--concurrency` keep-alive connections (HTTP POST /detect or one
+WebSocket each), every one sending the same JPEG back-to-back for `--seconds`.
+Prints throughput, client-side latency percentiles, status counts and the
+server's batching stats, so `--max-batch` / `--max-wait-ms` can be tuned
+against a real load.
+
+Usage:
+    python inference_load_test.py --url http://127.0.0.1:8766 --image frame.jpg --concurrency 16 --seconds 30
+    python inference_load_test.py --url http://127.0.0.1:8766 --image frame.jpg --ws --concurrency 8
+"""
+
+import argparse
+import base64
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from urllib.parse import urlparse
+
+from benchmark_models import percentiles
+from inference_server import WS_BINARY, WS_CLOSE, ws_frame, ws_read_message
+
+
+def _connection(url):
+    cls = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+    conn = cls(url.hostname, url.port or (443 if url.scheme == "https" else 80), timeout=30)
+    conn.connect()
+    conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return conn
+
+
+def http_worker(url, path, body, deadline, out):
+    conn = _connection(url)
+    headers = {"Content-Type": "image/jpeg", "Content-Length": str(len(body))}
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            conn.request("POST", path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            status = "error"
+            conn.close()
+            conn = _connection(url)
+        out.append((status, (time.perf_counter() - started) * 1000.0))
+    conn.close()
+
+
+def ws_worker(url, path, body, deadline, out):
+    conn = _connection(url)
+    key = base64.b64encode(os.urandom(16)).decode()
+    conn.putrequest("GET", path.replace("/detect", "/ws"))
+    for name, value in (("Upgrade", "websocket"), ("Connection", "Upgrade"), ("Sec-WebSocket-Key", key), ("Sec-WebSocket-Version", "13")):
+        conn.putheader(name, value)
+    conn.endheaders()
+    response = conn.getresponse()
+    if response.status != 101:
+        out.append(("error", 0.0))
+        return
+    sock = conn.sock
+    stream = sock.makefile("rb")
+    frame = ws_frame(body, WS_BINARY, mask=True)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        sock.sendall(frame)
+        message = ws_read_message(stream)
+        if message is None:
+            out.append(("error", 0.0))
+            break
+        status = json.loads(message[1]).get("status", "error")
+        out.append((status, (time.perf_counter() - started) * 1000.0))
+    sock.sendall(ws_frame(b"", WS_CLOSE, mask=True))
+    conn.close()
+
+
+def run(url, image, concurrency=8, seconds=10.0, websocket=False, key=None):
+    url = urlparse(url)
+    path = "/detect" + (f"?key={key}" if key else "")
+    with open(image, "rb") as f:
+        body = f.read()
+
+    results = [[] for _ in range(concurrency)]
+    worker = ws_worker if websocket else http_worker
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(url, path, body, deadline, results[i]), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    samples = [sample for worker_results in results for sample in worker_results]
+    statuses = {}
+    for status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    ok = [ms for status, ms in samples if status == 200]
+
+    conn = _connection(url)
+    conn.request("GET", "/stats")
+    server_stats = json.loads(conn.getresponse().read())
+    conn.close()
+
+    return {
+        "transport": "websocket" if websocket else "http",
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 2),
+        "requests": len(samples),
+        "statuses": statuses,
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": percentiles(ok),
+        "server": server_stats,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the micro-batching inference server")
+    parser.add_argument("--url", default="http://127.0.0.1:8766")
+    parser.add_argument("--image", required=True, help="JPEG sent with every request")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--ws", action="store_true", help="Use the WebSocket endpoint")
+    parser.add_argument("--key", default=None)
+    args = parser.parse_args(argv)
+
+    report = run(args.url, args.image, args.concurrency, args.seconds, args.ws, args.key)
+    print(json.dumps(report, indent=2))
+    return 0 if report["statuses"].get("200") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,510 @@
+"""
+Headless inference server with dynamic micro-batching.
+
+Low-end phones struggle to run the TF.js model in the browser. This server runs
+the same model (`detection.load_model`, so `MODEL_BACKEND` applies) and the same
+post-processing as `redRilapia.py` on a machine on the farm network. Browsers
+send JPEG frames and get back boxes, inch measurements, stage and estimated
+weight.
+
+Concurrent requests go into one bounded queue. The batching thread takes the
+first waiting frame, keeps collecting until it has `max_batch` frames or the
+first frame has waited `max_wait_ms`, then runs them all in a single model
+call. Under light load a request waits at most `max_wait_ms`; under heavy load
+the batches fill up and throughput rises. When the queue is full, requests get
+503 with Retry-After instead of piling up latency.
+
+Endpoints (all JSON except /metrics):
+
+    POST /detect[?conf=0.9]    body: JPEG bytes (Content-Type image/jpeg)
+    GET  /ws                   WebSocket; send JPEG frames as binary messages,
+                               one JSON result comes back per frame
+    GET  /stats                queue depth, batch sizes, request counts
+    GET  /metrics              Prometheus text (stage latencies, queue, batches)
+    GET  /health               200 once the model is loaded, 503 before
+
+The server listens on localhost only unless `--host` says otherwise; when it is
+exposed to the farm network, set `--key` (and `--cors-origin` to the web app's
+origin) as well.
+
+Usage:
+    python inference_server.py --port 8766 --max-batch 8 --max-wait-ms 15
+    python inference_server.py --host 0.0.0.0 --key your-api-key --cors-origin https://your-sfm-host
+    python inference_load_test.py --url http://127.0.0.1:8766 --image frame.jpg --concurrency 16
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import queue
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+from detection import CONF_THRESHOLD, STAGES, estimate_weight_g, load_model, measure_results
+from metrics import Metrics
+from model_loader import ModelLoader
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+WS_TEXT, WS_BINARY, WS_CLOSE, WS_PING, WS_PONG = 0x1, 0x2, 0x8, 0x9, 0xA
+
+MAX_BODY_BYTES = 16 * 1024 * 1024
+
+
+class _Request:
+    __slots__ = ("frame", "conf", "future", "enqueued")
+
+    def __init__(self, frame, conf):
+        self.frame = frame
+        self.conf = conf
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Args:
+        model: Callable model (Ultralytics YOLO); may be set later with `set_model`.
+        max_batch: Upper bound on frames per model call.
+        max_wait_ms: How long the first frame of a batch may wait for company.
+        max_queue: Waiting frames before `submit` raises `queue.Full`.
+        imgsz: Inference size passed to the model.
+        metrics: Optional `metrics.Metrics` for the queue/inference/postprocess spans.
+    """
+
+    def __init__(self, model=None, max_batch=8, max_wait_ms=10.0, max_queue=64, imgsz=640, metrics=None):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.imgsz = imgsz
+        self.metrics = metrics or Metrics(enabled=False)
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._lock = threading.Lock()
+
+        self.max_queue = max_queue
+        self.max_depth = 0
+        self.requests = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batch_sizes = deque(maxlen=1000)
+        self.batch_histogram = [0] * (max_batch + 1)
+
+    def set_model(self, model):
+        self.model = model
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        self._thread.join(timeout)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def submit(self, frame, conf=CONF_THRESHOLD):
+        """Queue one BGR frame; returns a Future of its result dict. Raises `queue.Full`."""
+        request = _Request(frame, conf)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise
+        with self._lock:
+            self.requests += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return request.future
+
+    def _collect(self):
+        """Block for the first request, then gather more until full or its deadline passes."""
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = first.enqueued + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._infer(batch)
+
+    def _infer(self, batch):
+        started = time.perf_counter()
+        for request in batch:
+            self.metrics.record("queue_wait", started - request.enqueued)
+
+        try:
+            if self.model is None:
+                raise RuntimeError("Model is loading")
+            # The model's own floor (0.25 in Ultralytics) must not cut boxes a request asked for.
+            conf = min(r.conf for r in batch)
+            results = self.model([r.frame for r in batch], imgsz=self.imgsz, conf=conf, verbose=False)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        inference = time.perf_counter() - started
+        self.metrics.record("batch_inference", inference)
+
+        with self._lock:
+            self.batches += 1
+            self.batch_sizes.append(len(batch))
+            self.batch_histogram[len(batch)] += 1
+
+        for request, result in zip(batch, results):
+            try:
+                with self.metrics.span("postprocess"):
+                    payload = detections_payload(result.boxes, request.frame.shape, request.conf)
+            except Exception as e:
+                request.future.set_exception(e)
+                continue
+            payload["timing"] = {
+                "queue_ms": round((started - request.enqueued) * 1000.0, 2),
+                "inference_ms": round(inference * 1000.0, 2),
+                "batch_size": len(batch),
+            }
+            request.future.set_result(payload)
+
+    def stats(self):
+        with self._lock:
+            sizes = list(self.batch_sizes)
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_depth,
+                "queue_capacity": self.max_queue,
+                "requests": self.requests,
+                "rejected": self.rejected,
+                "batches": self.batches,
+                "avg_batch": round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+                "batch_histogram": {str(size): count for size, count in enumerate(self.batch_histogram) if count},
+                "max_batch": self.max_batch,
+                "max_wait_ms": round(self.max_wait * 1000.0, 2),
+            }
+
+    def prometheus_text(self, prefix="tilapia_server"):
+        s = self.stats()
+        lines = [
+            f"# TYPE {prefix}_queue_depth gauge",
+            f"{prefix}_queue_depth {s['queue_depth']}",
+            f"# TYPE {prefix}_requests_total counter",
+            f"{prefix}_requests_total {s['requests']}",
+            f"# TYPE {prefix}_rejected_total counter",
+            f"{prefix}_rejected_total {s['rejected']}",
+            f"# TYPE {prefix}_batch_size histogram",
+        ]
+        cumulative = 0
+        for size in range(1, self.max_batch + 1):
+            cumulative += self.batch_histogram[size]
+            lines.append(f'{prefix}_batch_size_bucket{{le="{size}"}} {cumulative}')
+        lines.append(f'{prefix}_batch_size_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{prefix}_batch_size_sum {sum(size * count for size, count in enumerate(self.batch_histogram))}")
+        lines.append(f"{prefix}_batch_size_count {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+def detections_payload(boxes, frame_shape, conf_threshold=CONF_THRESHOLD):
+    """Boxes → the JSON result: pixel box, confidence, inches, stage and weight per fish."""
+    m = measure_results(boxes, conf_threshold=conf_threshold)
+    weights = estimate_weight_g(m.length_in, m.width_in)
+    detections = [
+        {
+            "box": xyxy,
+            "conf": round(conf, 4),
+            "length_in": round(length, 2),
+            "width_in": round(width, 2),
+            "stage": STAGES[code],
+            "weight_g": round(weight, 2),
+        }
+        for xyxy, conf, length, width, code, weight in zip(
+            m.xyxy.tolist(), m.conf.tolist(), m.length_in.tolist(), m.width_in.tolist(), m.stage_codes.tolist(), weights.tolist()
+        )
+    ]
+    return {"width": int(frame_shape[1]), "height": int(frame_shape[0]), "detections": detections}
+
+
+def decode_jpeg(data):
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError("Body is not a decodable image")
+    return frame
+
+
+# --- WebSocket (RFC 6455, just what the endpoint needs) -----------------------
+
+def ws_accept_key(key):
+    return base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+
+
+def _read_exact(stream, n):
+    data = stream.read(n)
+    if len(data) < n:
+        raise ConnectionError("WebSocket closed mid-frame")
+    return data
+
+
+def ws_read_frame(stream):
+    """Read one frame; returns `(fin, opcode, payload)`."""
+    b1, b2 = _read_exact(stream, 2)
+    length = b2 & 0x7F
+    if length == 126:
+        length = struct.unpack(">H", _read_exact(stream, 2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", _read_exact(stream, 8))[0]
+    if length > MAX_BODY_BYTES:
+        raise ValueError("WebSocket frame too large")
+    mask = _read_exact(stream, 4) if b2 & 0x80 else None
+    payload = _read_exact(stream, length)
+    if mask is not None:
+        # XOR with the repeated 4-byte key, vectorized.
+        key = np.frombuffer((mask * (length // 4 + 1))[:length], dtype=np.uint8)
+        payload = (np.frombuffer(payload, dtype=np.uint8) ^ key).tobytes()
+    return bool(b1 & 0x80), b1 & 0x0F, payload
+
+
+def ws_read_message(stream, on_ping=None):
+    """
+    Read one (possibly fragmented) message as `(opcode, payload)`; None on close.
+
+    Control frames may arrive between the fragments of a message, so pings are
+    answered through `on_ping(payload)` as they come, without returning early.
+    """
+    parts, opcode = [], None
+    while True:
+        fin, op, payload = ws_read_frame(stream)
+        if op == WS_CLOSE:
+            return None
+        if op == WS_PING:
+            if on_ping is not None:
+                on_ping(payload)
+            continue
+        if op == WS_PONG:
+            continue
+        if op != 0:
+            opcode = op
+        parts.append(payload)
+        if fin:
+            return opcode, b"".join(parts)
+
+
+def ws_frame(payload, opcode=WS_TEXT, mask=False):
+    """Encode one unfragmented frame (clients must mask, servers must not)."""
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header.append(mask_bit | length)
+    elif length < 1 << 16:
+        header.append(mask_bit | 126)
+        header += struct.pack(">H", length)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack(">Q", length)
+    if mask:
+        key = np.random.randint(0, 256, 4, dtype=np.uint8).tobytes()
+        masked = np.frombuffer(payload, dtype=np.uint8) ^ np.frombuffer((key * (length // 4 + 1))[:length], dtype=np.uint8)
+        return bytes(header) + key + masked.tobytes()
+    return bytes(header) + payload
+
+
+# --- HTTP ----------------------------------------------------------------------
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    server_state = None  # set by make_server
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status, payload, content_type="application/json", headers=None):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", self.server_state.cors_origin)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _authorized(self, query):
+        key = self.server_state.api_key
+        return key is None or query.get("key", [None])[0] == key
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", self.server_state.cors_origin)
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        state = self.server_state
+
+        if url.path == "/health":
+            if state.loader.ready:
+                return self._send(200, {"status": "ok"})
+            return self._send(503, {"status": "error" if state.loader.error else "loading", "message": str(state.loader.error or "")})
+        if url.path == "/stats":
+            return self._send(200, state.batcher.stats())
+        if url.path == "/metrics":
+            text = state.metrics.prometheus_text("tilapia_server") + state.batcher.prometheus_text()
+            return self._send(200, text.encode(), content_type="text/plain; version=0.0.4")
+        if not self._authorized(query):
+            return self._send(422, {"message": "Key is required or the key is invalid"})
+        if url.path == "/ws" and self.headers.get("Upgrade", "").lower() == "websocket":
+            return self._websocket(query)
+        return self._send(404, {"message": "Not Found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        started = time.perf_counter()
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            # The body stays unread, so this connection can't carry another request.
+            self.close_connection = True
+            return self._send(413, {"message": f"Send a JPEG body of at most {MAX_BODY_BYTES} bytes"}, headers={"Connection": "close"})
+        body = self.rfile.read(length) if length > 0 else b""
+        if not self._authorized(query):
+            return self._send(422, {"message": "Key is required or the key is invalid"})
+        if url.path != "/detect":
+            return self._send(404, {"message": "Not Found"})
+        if not body:
+            return self._send(400, {"message": f"Send a JPEG body of at most {MAX_BODY_BYTES} bytes"})
+
+        status, payload, headers = self.server_state.detect(body, query)
+        self.server_state.metrics.record("request", time.perf_counter() - started)
+        return self._send(status, payload, headers=headers)
+
+    def _websocket(self, query):
+        key = self.headers.get("Sec-WebSocket-Key")
+        if not key:
+            return self._send(400, {"message": "Missing Sec-WebSocket-Key"})
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", ws_accept_key(key))
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+
+        # One frame in flight per socket: the client sends the next frame after each result.
+        try:
+            while True:
+                message = ws_read_message(self.rfile, on_ping=lambda data: self.wfile.write(ws_frame(data, WS_PONG)))
+                if message is None:
+                    self.wfile.write(ws_frame(b"", WS_CLOSE))
+                    return
+                _, data = message
+                started = time.perf_counter()
+                status, payload, _ = self.server_state.detect(data, query)
+                self.server_state.metrics.record("request", time.perf_counter() - started)
+                self.wfile.write(ws_frame(json.dumps({"status": status, **payload}).encode()))
+        except (ConnectionError, ValueError, OSError):
+            return
+
+
+class ServerState:
+    """What the handler threads share: model loader, batcher, metrics and settings."""
+
+    def __init__(self, loader, batcher, metrics, api_key=None, cors_origin="*", timeout=10.0):
+        self.loader = loader
+        self.batcher = batcher
+        self.metrics = metrics
+        self.api_key = api_key
+        self.cors_origin = cors_origin
+        self.timeout = timeout
+
+    def detect(self, body, query):
+        """Decode, queue and wait for one frame; returns `(status, payload, headers)`."""
+        if not self.loader.ready:
+            return 503, {"message": "Model is loading"}, {"Retry-After": "2"}
+        try:
+            conf = float(query.get("conf", [CONF_THRESHOLD])[0])
+            if not 0.0 <= conf <= 1.0:
+                raise ValueError(f"conf must be between 0 and 1, got {conf}")
+            with self.metrics.span("decode"):
+                frame = decode_jpeg(body)
+        except ValueError as e:
+            return 400, {"message": str(e)}, None
+
+        try:
+            future = self.batcher.submit(frame, conf)
+        except queue.Full:
+            return 503, {"message": "Server busy"}, {"Retry-After": "1"}
+        try:
+            return 200, future.result(self.timeout), None
+        except Exception as e:
+            return 500, {"message": f"Inference failed: {e}"}, None
+
+
+def make_server(state, host="127.0.0.1", port=0):
+    handler = type("BoundInferenceHandler", (InferenceHandler,), {"server_state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve fish detection over HTTP/WebSocket with micro-batching")
+    parser.add_argument("--host", default="127.0.0.1", help="Use 0.0.0.0 to serve phones on the farm network (with --key)")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--model", default=None, help="Model artifact (default: MODEL_BACKEND)")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0, help="Longest a frame waits for a batch to fill")
+    parser.add_argument("--max-queue", type=int, default=64, help="Waiting frames before 503")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds a request waits for its result")
+    parser.add_argument("--key", default=None, help="Require ?key=... on /detect and /ws")
+    parser.add_argument("--cors-origin", default="*")
+    args = parser.parse_args(argv)
+
+    metrics = Metrics()
+    batcher = MicroBatcher(None, args.max_batch, args.max_wait_ms, args.max_queue, args.imgsz, metrics).start()
+    loader = ModelLoader(lambda: load_model(args.model), warmup_shape=(args.imgsz, args.imgsz, 3), on_ready=batcher.set_model).start()
+    state = ServerState(loader, batcher, metrics, args.key, args.cors_origin, args.timeout)
+
+    server = make_server(state, args.host, args.port)
+    print(f"📡 Inference server on http://{args.host}:{server.server_address[1]} (batch ≤{args.max_batch}, wait ≤{args.max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""
+Columnar, memory-mappable store for the YOLO annotation set.
+
+`yolo_labels.json` is a single dict of image key → list of box dicts, so every
+consumer parses all of it. `build_store` converts it (or any label dump with the
+same layout) into a directory of flat `.npy` arrays:
+
+    keys.npy        (M,)   image keys, sorted
+    stages.npy      (M,)   int8 index into detection.STAGES from the key, -1 if unknown
+    offsets.npy     (M+1,) int64, boxes of image i are rows offsets[i]:offsets[i+1]
+    boxes.npy       (N, 4) float32 normalized x_center, y_center, width, height
+    classes.npy     (N,)   int16 class id ("class_0" → 0)
+    image_index.npy (N,)   int32 owning image of every box
+    meta.json              counts and the source file's size/mtime/sha256
+
+`LabelStore` opens the arrays with `mmap_mode="r"`, so opening takes about as long
+as reading meta.json, and filtered queries are NumPy masks over the columns.
+`open_labels` uses the store when it is up to date with the JSON file and falls
+back to parsing the JSON otherwise.
+
+Usage:
+python label_store.py                          # yolo_labels.json → yolo_labels.store/
+python label_store.py --query --stage Grower --min-width 0.3
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+
+import numpy as np
+
+from detection import BASE_DIR, STAGES
+
+LABELS_PATH = os.path.join(BASE_DIR, "yolo_labels.json")
+STORE_PATH = os.path.join(BASE_DIR, "yolo_labels.store")
+
+ARRAYS = ("keys", "stages", "offsets", "boxes", "classes", "image_index")
+
+
+def load_labels(path=LABELS_PATH):
+    """Parse a label JSON file into `{image key: [box dict, ...]}`."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def stage_from_key(key):
+    """Stage named in an image key ("grower1_... (12)" → "Grower"), or None."""
+    match = re.match(r"[a-z]+", key.lower())
+    name = match.group().capitalize() if match else None
+    return name if name in STAGES else None
+
+
+def class_id(name):
+    """"class_3" → 3; plain integers pass through."""
+    if isinstance(name, (int, np.integer)):
+        return int(name)
+    match = re.search(r"(\d+)$", str(name))
+    return int(match.group(1)) if match else 0
+
+
+def _source_info(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def build_store(source=LABELS_PATH, store_path=STORE_PATH):
+    """Convert a label JSON file into a columnar store directory; returns its path."""
+    labels = load_labels(source)
+    keys = sorted(labels)
+
+    counts = np.array([len(labels[k]) for k in keys], dtype=np.int64)
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    flat = [box for k in keys for box in labels[k]]
+    boxes = np.array(
+        [[b["x_center"], b["y_center"], b["width"], b["height"]] for b in flat], dtype=np.float32
+    ).reshape(-1, 4)
+
+    arrays = {
+        "keys": np.array(keys, dtype=str),
+        "stages": np.array(
+            [STAGES.index(s) if (s := stage_from_key(k)) else -1 for k in keys], dtype=np.int8
+        ),
+        "offsets": offsets,
+        "boxes": boxes,
+        "classes": np.array([class_id(b.get("class", 0)) for b in flat], dtype=np.int16),
+        "image_index": np.repeat(np.arange(len(keys), dtype=np.int32), counts),
+    }
+
+    digest = hashlib.sha256()
+    with open(source, "rb") as f:
+        digest.update(f.read())
+
+    os.makedirs(store_path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(store_path, f"{name}.npy"), array)
+    meta = {
+        "source": {**_source_info(source), "sha256": digest.hexdigest()},
+        "images": len(keys),
+        "boxes": int(len(boxes)),
+        "stages": list(STAGES),
+    }
+    # meta.json last: a store without it is incomplete and never considered fresh.
+    with open(os.path.join(store_path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return store_path
+
+
+def store_is_fresh(store_path=STORE_PATH, source=LABELS_PATH):
+    meta_path = os.path.join(store_path, "meta.json")
+    if not os.path.exists(meta_path) or not os.path.exists(source):
+        return False
+    with open(meta_path) as f:
+        recorded = json.load(f)["source"]
+    current = _source_info(source)
+    return recorded["size"] == current["size"] and recorded["mtime_ns"] == current["mtime_ns"]
+
+
+class LabelStore:
+    """
+    Read-only view of a store directory. Box arrays are memory-mapped.
+
+    Filters on `select` combine with AND; widths/heights are normalized (0-1).
+    """
+
+    def __init__(self, store_path=STORE_PATH):
+        self.path = store_path
+        with open(os.path.join(store_path, "meta.json")) as f:
+            self.meta = json.load(f)
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(store_path, f"{name}.npy"), mmap_mode="r"))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.keys.tolist())
+
+    def __contains__(self, key):
+        return self.index_of(key) is not None
+
+    def index_of(self, key):
+        i = int(np.searchsorted(self.keys, key))
+        return i if i < len(self.keys) and self.keys[i] == key else None
+
+    def image_boxes(self, key):
+        """`(n, 4)` normalized centre/size boxes of one image (empty if unknown)."""
+        i = self.index_of(key)
+        if i is None:
+            return np.zeros((0, 4), dtype=np.float32)
+        return np.asarray(self.boxes[self.offsets[i]:self.offsets[i + 1]])
+
+    def get(self, key, default=None):
+        return self.image_boxes(key) if key in self else default
+
+    def __getitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        return self.image_boxes(key)
+
+    def images(self, stage=None):
+        """Keys of all images, or of one stage ("Starter", "Grower", "Finisher")."""
+        if stage is None:
+            return self.keys.tolist()
+        return self.keys[np.asarray(self.stages) == STAGES.index(stage)].tolist()
+
+    def select(self, stage=None, cls=None, min_width=None, max_width=None, min_height=None, max_height=None):
+        """Row indices of boxes matching every given filter."""
+        mask = np.ones(len(self.boxes), dtype=bool)
+        if stage is not None:
+            mask &= np.asarray(self.stages)[self.image_index] == STAGES.index(stage)
+        if cls is not None:
+            mask &= np.asarray(self.classes) == class_id(cls)
+        for column, low, high in ((2, min_width, max_width), (3, min_height, max_height)):
+            if low is not None:
+                mask &= self.boxes[:, column] >= low
+            if high is not None:
+                mask &= self.boxes[:, column] <= high
+        return np.flatnonzero(mask)
+
+    def query(self, **filters):
+        """`(keys, boxes)` of the boxes matching `select(**filters)`, one row per box."""
+        rows = self.select(**filters)
+        return self.keys[self.image_index[rows]], np.asarray(self.boxes[rows])
+
+
+def open_labels(source=LABELS_PATH, store_path=None):
+    """
+    Labels as a mapping of image key → boxes.
+
+    Uses the columnar store (next to `source` by default) when it matches the
+    JSON file; otherwise parses the JSON. Both give boxes that
+    `evaluate_labels.label_boxes_xyxy` accepts.
+    """
+    store_path = store_path or os.path.splitext(source)[0] + ".store"
+    if store_is_fresh(store_path, source):
+        return LabelStore(store_path)
+    return load_labels(source)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the columnar label store")
+    parser.add_argument("--labels", default=LABELS_PATH, help="Label JSON to convert")
+    parser.add_argument("--store", default=None, help="Store directory (default: next to --labels)")
+    parser.add_argument("--query", action="store_true", help="Query the store instead of building it")
+    parser.add_argument("--stage", choices=STAGES)
+    parser.add_argument("--min-width", type=float)
+    parser.add_argument("--max-width", type=float)
+    parser.add_argument("--min-height", type=float)
+    parser.add_argument("--max-height", type=float)
+    args = parser.parse_args(argv)
+
+    store_path = args.store or os.path.splitext(args.labels)[0] + ".store"
+
+    if not args.query:
+        build_store(args.labels, store_path)
+        store = LabelStore(store_path)
+        print(f"✅ {store.meta['images']} images / {store.meta['boxes']} boxes written to {store_path}")
+        return 0
+
+    if not os.path.exists(os.path.join(store_path, "meta.json")):
+        print(f"❌ No label store at {store_path}; build it first")
+        return 1
+    store = LabelStore(store_path)
+    keys, boxes = store.query(
+        stage=args.stage, min_width=args.min_width, max_width=args.max_width,
+        min_height=args.min_height, max_height=args.max_height,
+    )
+    for key, box in zip(keys, boxes):
+        print(json.dumps({"image": str(key), "x_center": float(box[0]), "y_center": float(box[1]),
+                          "width": float(box[2]), "height": float(box[3])}))
+    print(f"{len(keys)} boxes", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+Offline-first measurement journal and batched uploader.
+
+Connectivity at the cages drops often, so "Get Weight" never talks to the API
+directly any more: each measurement is first committed to a local SQLite journal
+with a unique idempotency key. `BulkUploader` drains the journal in batches
+through `/api/weight/bulk`, retrying with exponential backoff; because the server
+recognises idempotency keys it has already stored, a retry after a lost response
+never fills a second sample slot.
+"""
+
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from datetime import datetime
+
+import requests
+
+from weight_client import ApiError
+
+PENDING = "pending"
+UPLOADED = "uploaded"
+REJECTED = "rejected"
+
+# Laravel validation keys of one bulk row, e.g. "measurements.3.height"
+ROW_ERROR_KEY = re.compile(r"^measurements\.(\d+)\.")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    doc TEXT NOT NULL,
+    -- Resolved through /api/samplings/lookup before queueing (NULL if queued offline).
+    -- Local only: the bulk endpoint matches samplings by DOC.
+    sampling_id INTEGER,
+    width REAL NOT NULL,
+    height REAL NOT NULL,
+    unit TEXT NOT NULL DEFAULT 'in',
+    measured_at TEXT NOT NULL,
+    frame_ref TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    response TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_measurements_due ON measurements (status, next_attempt_at);
+"""
+
+
+class MeasurementJournal:
+    """SQLite-backed queue of measurements waiting to be uploaded."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def add(self, doc, width, height, unit="in", sampling_id=None, frame_ref=None, measured_at=None):
+        """
+        Persist one measurement; returns its idempotency key.
+
+        `sampling_id` is the id the DOC resolved to when it was queued; it is kept
+        for the upload report, not sent (the server resolves the DOC itself).
+        """
+        key = uuid.uuid4().hex
+        measured_at = (measured_at or datetime.now()).isoformat(timespec="seconds")
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO measurements (idempotency_key, doc, sampling_id, width, height, unit, measured_at, frame_ref) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, doc, sampling_id, float(width), float(height), unit, measured_at, frame_ref),
+            )
+        return key
+
+    def due(self, limit, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM measurements WHERE status = ? AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (PENDING, now, limit),
+            ).fetchall()
+
+    def next_due_in(self, now=None):
+        """Seconds until the earliest pending retry, or None if nothing is pending."""
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM measurements WHERE status = ?", (PENDING,)
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - now)
+
+    def mark_done(self, results):
+        """`results`: iterable of `(idempotency_key, status, response_dict, error)`."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "UPDATE measurements SET status = ?, response = ?, last_error = ?, attempts = attempts + 1 "
+                "WHERE idempotency_key = ?",
+                [(status, json.dumps(response), error, key) for key, status, response, error in results],
+            )
+            self._conn.execute("COMMIT")
+
+    def mark_retry(self, keys, error, delay):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "UPDATE measurements SET attempts = attempts + 1, last_error = ?, next_attempt_at = ? "
+                "WHERE idempotency_key = ?",
+                [(error, time.time() + delay, key) for key in keys],
+            )
+            self._conn.execute("COMMIT")
+
+    def counts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM measurements GROUP BY status").fetchall()
+        return {status: count for status, count in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BulkUploader:
+    """
+    Background thread that drains a `MeasurementJournal` through the bulk endpoint.
+
+    Args:
+        journal: The journal to drain.
+        client: A `WeightApiClient` (only `submit_weights_bulk` is used).
+        batch_size: Measurements per request (server accepts up to 200).
+        base_delay / max_delay: Exponential backoff bounds in seconds for failed batches.
+        on_result: Called from the uploader thread with `(row, result)` for every
+            measurement that reached a final state (`result["status"]` is
+            "created", "duplicate" or "rejected").
+        metrics: Optional `metrics.Metrics`; each bulk request goes to the "api" span.
+    """
+
+    def __init__(
+        self,
+        journal,
+        client,
+        batch_size=50,
+        base_delay=2.0,
+        max_delay=300.0,
+        idle_interval=30.0,
+        on_result=None,
+        metrics=None,
+    ):
+        self.journal = journal
+        self.client = client
+        self.batch_size = batch_size
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.idle_interval = idle_interval
+        self.on_result = on_result
+        self.metrics = metrics
+
+        self.batches_sent = 0
+        self.failures = 0
+        self._consecutive_failures = 0
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="measurement-uploader", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def wake(self):
+        """Upload now instead of waiting for the next poll (e.g. after `journal.add`)."""
+        self._wake.set()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+    def _backoff(self):
+        delay = min(self.max_delay, self.base_delay * (2 ** min(self._consecutive_failures, 16)))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _run(self):
+        while not self._stop.is_set():
+            sent = self.drain_once()
+            if sent:
+                continue
+
+            wait = self.journal.next_due_in()
+            wait = self.idle_interval if wait is None else min(wait, self.idle_interval)
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def drain_once(self):
+        """Upload one batch of due measurements; returns how many were sent."""
+        rows = self.journal.due(self.batch_size)
+        if not rows:
+            return 0
+
+        measurements = [
+            {
+                "doc": row["doc"],
+                "height": row["height"],
+                "width": row["width"],
+                "unit": row["unit"],
+                "idempotency_key": row["idempotency_key"],
+            }
+            for row in rows
+        ]
+        keys = [row["idempotency_key"] for row in rows]
+
+        try:
+            with self.metrics.span("api") if self.metrics else nullcontext():
+                data = self.client.submit_weights_bulk(measurements)
+        except (requests.RequestException, ApiError) as e:
+            permanent = isinstance(e, ApiError) and e.status_code == 422 and e.payload and "errors" in e.payload
+            if permanent:
+                return self._reject_invalid(rows, e.payload["errors"])
+            else:
+                self.failures += 1
+                self._consecutive_failures += 1
+                delay = self._backoff()
+                print(f"📴 Upload of {len(rows)} measurements failed ({e}); retrying in {delay:.0f}s")
+                self.journal.mark_retry(keys, str(e), delay)
+                return 0
+            return len(rows)
+
+        self._consecutive_failures = 0
+        self.batches_sent += 1
+
+        by_key = {result.get("idempotency_key"): result for result in data.get("results", [])}
+        done = []
+        for key in keys:
+            result = by_key.get(key, {"status": REJECTED, "message": "Missing from bulk response"})
+            status = REJECTED if result.get("status") == REJECTED else UPLOADED
+            done.append((key, status, result, result.get("message")))
+        self.journal.mark_done(done)
+        self._notify(rows, by_key)
+
+        print(f"📤 Uploaded {len(rows)} measurements ({data.get('created', 0)} new, {data.get('duplicates', 0)} duplicate)")
+        return len(rows)
+
+    def _reject_invalid(self, rows, errors):
+        """
+        Handle a 422 validation failure: reject only the rows the server named and
+        put the rest straight back in the queue. Returns how many were rejected.
+        """
+        messages = {}
+        for field, field_errors in errors.items():
+            match = ROW_ERROR_KEY.match(field)
+            if match and int(match.group(1)) < len(rows):
+                first = field_errors[0] if isinstance(field_errors, list) and field_errors else field_errors
+                messages.setdefault(int(match.group(1)), str(first))
+        if not messages:
+            # Not tied to a row (e.g. the batch itself); retrying the same payload can't succeed.
+            messages = {index: str(errors) for index in range(len(rows))}
+
+        rejected = [rows[index] for index in sorted(messages)]
+        by_key = {rows[index]["idempotency_key"]: {"status": REJECTED, "message": message} for index, message in messages.items()}
+        self.journal.mark_done([(key, REJECTED, result, result["message"]) for key, result in by_key.items()])
+
+        valid = [row["idempotency_key"] for index, row in enumerate(rows) if index not in messages]
+        if valid:
+            self.journal.mark_retry(valid, "Resent without the rows rejected by validation", 0.0)
+        self._notify(rejected, by_key)
+
+        print(f"⚠️ {len(rejected)} of {len(rows)} measurements rejected by validation; {len(valid)} requeued")
+        return len(rejected)
+
+    def _notify(self, rows, by_key):
+        if self.on_result is None:
+            return
+        for row in rows:
+            result = by_key.get(row["idempotency_key"])
+            if result is not None:
+                self.on_result(dict(row), result)
@@ -0,0 +1,264 @@
+"""
+Low-overhead timing spans for the detector's hot path.
+
+`Metrics.span(name)` times a block (capture, inference, postprocess, save,
+upload, api, ...) into a fixed-size histogram per span name. The histograms use
+log-spaced buckets from 0.1 ms to 30 s. Each one keeps:
+
+* cumulative bucket counts, sum and count, exported in Prometheus text format;
+* a ring of short sub-windows, so p50/p95/p99 reflect only the last
+  `window` seconds (for the overlay and the JSONL log).
+
+Memory is fixed per span name and recording is a bisect and a few integer adds
+under a lock, a couple of microseconds. When disabled, `span()` returns a shared
+no-op context manager and `record()` returns immediately.
+
+`MetricsExporter` flushes a JSONL line (rotated at `max_bytes`, so a device
+running for weeks keeps a bounded history) and rewrites a Prometheus textfile
+(atomically, for node_exporter's textfile collector) every `interval` seconds.
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+
+# Bucket upper bounds in seconds: 0.1 ms .. 30 s, each 1.4× the previous.
+BUCKETS = []
+_edge = 0.0001
+while _edge < 30.0:
+    BUCKETS.append(round(_edge, 6))
+    _edge *= 1.4
+BUCKETS.append(30.0)
+
+_NULL_SPAN = nullcontext()
+
+
+class RollingHistogram:
+    """
+    Args:
+        window: Seconds covered by the rolling percentiles.
+        slots: Sub-windows in the ring; the window advances in `window / slots` steps.
+    """
+
+    def __init__(self, window=60.0, slots=6):
+        self.slot_seconds = window / slots
+        self.total_counts = [0] * (len(BUCKETS) + 1)
+        self.total_sum = 0.0
+        self.total_count = 0
+        self._slots = [[0] * (len(BUCKETS) + 1) for _ in range(slots)]
+        self._slot_ids = [-1] * slots
+        self._lock = threading.Lock()
+
+    def record(self, seconds, now=None):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        slot_id = int((time.monotonic() if now is None else now) / self.slot_seconds)
+        ring = slot_id % len(self._slots)
+        with self._lock:
+            if self._slot_ids[ring] != slot_id:
+                counts = self._slots[ring]
+                for i in range(len(counts)):
+                    counts[i] = 0
+                self._slot_ids[ring] = slot_id
+            self._slots[ring][index] += 1
+            self.total_counts[index] += 1
+            self.total_sum += seconds
+            self.total_count += 1
+
+    def window_counts(self, now=None):
+        current = int((time.monotonic() if now is None else now) / self.slot_seconds)
+        oldest = current - len(self._slots) + 1
+        merged = [0] * (len(BUCKETS) + 1)
+        with self._lock:
+            for slot_id, counts in zip(self._slot_ids, self._slots):
+                if oldest <= slot_id <= current:
+                    for i, c in enumerate(counts):
+                        merged[i] += c
+        return merged
+
+    @staticmethod
+    def quantile(counts, q):
+        """Upper bucket bound containing quantile `q` (seconds), or None if empty."""
+        total = sum(counts)
+        if not total:
+            return None
+        target = q * total
+        running = 0
+        for i, c in enumerate(counts):
+            running += c
+            if running >= target:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+        return float("inf")
+
+    def summary(self, now=None):
+        counts = self.window_counts(now)
+
+        def ms(q):
+            value = self.quantile(counts, q)
+            return None if value is None else round(value * 1000.0, 2)
+
+        return {
+            "count": sum(counts),
+            "p50_ms": ms(0.5),
+            "p95_ms": ms(0.95),
+            "p99_ms": ms(0.99),
+            "total_count": self.total_count,
+            "total_sum_s": round(self.total_sum, 4),
+        }
+
+
+class _Span:
+    __slots__ = ("_histogram", "_started")
+
+    def __init__(self, histogram):
+        self._histogram = histogram
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.record(time.perf_counter() - self._started)
+        return False
+
+
+class Metrics:
+    """
+    Registry of named span histograms.
+
+    Args:
+        enabled: When False every span/record call is a no-op.
+        window: Seconds covered by the rolling percentiles.
+    """
+
+    def __init__(self, enabled=True, window=60.0):
+        self.enabled = enabled
+        self.window = window
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name):
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(name, RollingHistogram(self.window))
+        return histogram
+
+    def span(self, name):
+        """Context manager timing its block into the `name` histogram."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self.histogram(name))
+
+    def record(self, name, seconds):
+        """Add a duration measured elsewhere."""
+        if self.enabled:
+            self.histogram(name).record(seconds)
+
+    def snapshot(self):
+        with self._lock:
+            items = list(self._histograms.items())
+        return {name: histogram.summary() for name, histogram in sorted(items)}
+
+    def format_overlay(self):
+        lines = []
+        for name, s in self.snapshot().items():
+            if s["count"]:
+                lines.append(f"{name:<12} p50 {s['p50_ms']:>7.1f}  p95 {s['p95_ms']:>7.1f}  p99 {s['p99_ms']:>7.1f} ms  n={s['count']}")
+        return "\n".join(lines) or "No spans recorded yet"
+
+    def prometheus_text(self, prefix="tilapia"):
+        metric = f"{prefix}_stage_duration_seconds"
+        out = [
+            f"# HELP {metric} Duration of detector pipeline stages.",
+            f"# TYPE {metric} histogram",
+        ]
+        with self._lock:
+            items = sorted(self._histograms.items())
+        for name, histogram in items:
+            with histogram._lock:
+                counts = list(histogram.total_counts)
+                total_sum = histogram.total_sum
+                total_count = histogram.total_count
+            cumulative = 0
+            for bound, count in zip(BUCKETS, counts):
+                cumulative += count
+                out.append(f'{metric}_bucket{{stage="{name}",le="{bound:g}"}} {cumulative}')
+            out.append(f'{metric}_bucket{{stage="{name}",le="+Inf"}} {total_count}')
+            out.append(f'{metric}_sum{{stage="{name}"}} {total_sum:.6f}')
+            out.append(f'{metric}_count{{stage="{name}"}} {total_count}')
+        return "\n".join(out) + "\n"
+
+
+class MetricsExporter:
+    """
+    Periodically append a JSONL snapshot and rewrite a Prometheus textfile.
+
+    Args:
+        metrics: The `Metrics` registry.
+        jsonl_path / prom_path: Output files; either may be None to skip it.
+        interval: Seconds between flushes.
+        max_bytes: Rotate the JSONL file once it reaches this size (0 = never):
+            `metrics.jsonl` becomes `metrics.jsonl.1`, and so on.
+        backups: Rotated files kept; older ones are deleted.
+    """
+
+    def __init__(self, metrics, jsonl_path=None, prom_path=None, interval=10.0, max_bytes=10 * 1024 * 1024, backups=3):
+        self.metrics = metrics
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+
+    def start(self):
+        if self.metrics.enabled and (self.jsonl_path or self.prom_path):
+            self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+            self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"⚠️ Metrics flush failed: {e}")
+
+    def flush(self):
+        if self.jsonl_path:
+            line = {"time": datetime.now().isoformat(timespec="seconds"), "spans": self.metrics.snapshot()}
+            self._rotate()
+            with open(self.jsonl_path, "a") as f:
+                f.write(json.dumps(line) + "\n")
+        if self.prom_path:
+            tmp_path = f"{self.prom_path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(self.metrics.prometheus_text())
+            os.replace(tmp_path, self.prom_path)
+
+    def _rotate(self):
+        """Shift `path` → `path.1` → ... once it has reached `max_bytes`."""
+        if not self.max_bytes:
+            return
+        try:
+            if os.path.getsize(self.jsonl_path) < self.max_bytes:
+                return
+        except OSError:
+            return
+        if self.backups < 1:
+            os.remove(self.jsonl_path)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.jsonl_path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.jsonl_path}.{index + 1}")
+        os.replace(self.jsonl_path, f"{self.jsonl_path}.1")
@@ -0,0 +1,75 @@
+"""
+Background model loading and warm-up.
+
+Importing torch/Ultralytics and loading the weights takes seconds, and the
+first inference is slower again (lazy allocation, kernel selection). Doing
+both in `App.build` leaves the window blank. `ModelLoader` does them on a
+daemon thread while the UI is already up, and reports through callbacks so the
+app can enable its controls once the model is ready.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+
+class ModelLoader:
+    """
+    Args:
+        load: Callable returning the model, e.g. `detection.load_model`.
+        warmup_shape: Shape of the dummy frame for one warm-up inference (None skips it).
+        on_ready: Called from the loader thread with the model.
+        on_error: Called from the loader thread with the exception.
+    """
+
+    def __init__(self, load, warmup_shape=(720, 1280, 3), on_ready=None, on_error=None):
+        self.load = load
+        self.warmup_shape = warmup_shape
+        self.on_ready = on_ready
+        self.on_error = on_error
+
+        self.model = None
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="model-loader", daemon=True)
+
+    @property
+    def ready(self):
+        return self.model is not None
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Block until loading finished (successfully or not); returns `ready`."""
+        self._done.wait(timeout)
+        return self.ready
+
+    def _run(self):
+        try:
+            started = time.perf_counter()
+            model = self.load()
+            self.load_seconds = time.perf_counter() - started
+
+            if self.warmup_shape is not None:
+                started = time.perf_counter()
+                model(np.zeros(self.warmup_shape, dtype=np.uint8), verbose=False)
+                self.warmup_seconds = time.perf_counter() - started
+
+            self.model = model
+        except Exception as e:
+            self.error = e
+            print(f"❌ Model failed to load: {e}")
+            if self.on_error is not None:
+                self.on_error(e)
+            return
+        finally:
+            self._done.set()
+
+        print(f"✅ Model ready (load {self.load_seconds:.1f}s, warm-up {self.warmup_seconds or 0:.1f}s)")
+        if self.on_ready is not None:
+            self.on_ready(model)
@@ -0,0 +1,133 @@
+"""
+Detection parity between the PyTorch model and an exported artifact.
+
+Runs both models on the same frames, matches boxes by IoU and checks that box
+overlap, confidence and the derived inch measurements agree within tolerances.
+Used after export by `convert_yolo_to_tfjs.py --parity-images` and on its own:
+
+Usage:
+python model_parity.py --candidate exports/best_SMF.onnx --images "captures/*.jpg"
+"""
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from batch_detect import iter_frames
+from detection import MODEL_PATH, load_model, measure_results
+from tracker import greedy_match, iou_matrix
+
+DEFAULT_TOLERANCES = {
+    "min_iou": 0.9,
+    "max_conf_diff": 0.05,
+    "max_length_diff_in": 0.1,
+    "max_width_diff_in": 0.1,
+    "min_recall": 0.95,
+}
+
+
+def compare_measurements(ref, cand, iou_threshold=0.5):
+    """Match two `BoxMeasurements` by IoU and return agreement figures."""
+    iou = iou_matrix(ref.xyxy, cand.xyxy)
+    pairs = greedy_match(iou, iou_threshold)
+
+    result = {
+        "reference_boxes": int(len(ref.conf)),
+        "candidate_boxes": int(len(cand.conf)),
+        "matched": len(pairs),
+        "ious": [],
+        "conf_diffs": [],
+        "length_diffs_in": [],
+        "width_diffs_in": [],
+        "stage_matches": 0,
+    }
+    for r, c in pairs:
+        result["ious"].append(float(iou[r, c]))
+        result["conf_diffs"].append(abs(float(ref.conf[r]) - float(cand.conf[c])))
+        result["length_diffs_in"].append(abs(float(ref.length_in[r]) - float(cand.length_in[c])))
+        result["width_diffs_in"].append(abs(float(ref.width_in[r]) - float(cand.width_in[c])))
+        result["stage_matches"] += int(ref.stage_codes[r] == cand.stage_codes[c])
+    return result
+
+
+def summarize(comparisons, tolerances=None):
+    tolerances = {**DEFAULT_TOLERANCES, **(tolerances or {})}
+
+    def collect(key):
+        return np.array([v for c in comparisons for v in c[key]], dtype=np.float64)
+
+    ious = collect("ious")
+    conf = collect("conf_diffs")
+    length = collect("length_diffs_in")
+    width = collect("width_diffs_in")
+    ref_boxes = sum(c["reference_boxes"] for c in comparisons)
+    cand_boxes = sum(c["candidate_boxes"] for c in comparisons)
+    matched = sum(c["matched"] for c in comparisons)
+    stages = sum(c["stage_matches"] for c in comparisons)
+
+    summary = {
+        "images": len(comparisons),
+        "reference_boxes": ref_boxes,
+        "candidate_boxes": cand_boxes,
+        "matched": matched,
+        "recall": round(matched / ref_boxes, 4) if ref_boxes else 1.0,
+        "precision": round(matched / cand_boxes, 4) if cand_boxes else 1.0,
+        "min_iou": round(float(ious.min()), 4) if ious.size else None,
+        "mean_iou": round(float(ious.mean()), 4) if ious.size else None,
+        "max_conf_diff": round(float(conf.max()), 4) if conf.size else 0.0,
+        "max_length_diff_in": round(float(length.max()), 4) if length.size else 0.0,
+        "max_width_diff_in": round(float(width.max()), 4) if width.size else 0.0,
+        "stage_agreement": round(stages / matched, 4) if matched else 1.0,
+        "tolerances": tolerances,
+    }
+    summary["passed"] = bool(
+        summary["recall"] >= tolerances["min_recall"]
+        and summary["precision"] >= tolerances["min_recall"]
+        and (summary["min_iou"] is None or summary["min_iou"] >= tolerances["min_iou"])
+        and summary["max_conf_diff"] <= tolerances["max_conf_diff"]
+        and summary["max_length_diff_in"] <= tolerances["max_length_diff_in"]
+        and summary["max_width_diff_in"] <= tolerances["max_width_diff_in"]
+    )
+    return summary
+
+
+def check_parity(reference, candidate, frames, conf_threshold=0.5, tolerances=None, imgsz=640):
+    """
+    Args:
+        reference / candidate: Loaded models (e.g. from `detection.load_model`).
+        frames: Iterable of `(frame_id, frame)` pairs.
+        conf_threshold: Boxes below this are ignored on both sides. Lower than the
+            app's 0.9 so more boxes take part in the comparison.
+    """
+    comparisons = []
+    for _, frame in frames:
+        ref = measure_results(reference(frame, imgsz=imgsz, verbose=False)[0].boxes, conf_threshold=conf_threshold)
+        cand = measure_results(candidate(frame, imgsz=imgsz, verbose=False)[0].boxes, conf_threshold=conf_threshold)
+        comparisons.append(compare_measurements(ref, cand))
+    return summarize(comparisons, tolerances)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check exported model detections against the PyTorch model")
+    parser.add_argument("--candidate", required=True, help="Exported artifact (.onnx file or OpenVINO directory)")
+    parser.add_argument("--reference", default=MODEL_PATH, help="Reference .pt model")
+    parser.add_argument("--images", required=True, help="Image directory, glob or video")
+    parser.add_argument("--limit", type=int, default=50, help="Max frames to compare")
+    parser.add_argument("--conf", type=float, default=0.5, help="Confidence threshold for both models")
+    parser.add_argument("--imgsz", type=int, default=640)
+    args = parser.parse_args(argv)
+
+    reference = load_model(args.reference)
+    candidate = load_model(args.candidate)
+
+    frames = (item for i, item in zip(range(args.limit), iter_frames(args.images)))
+    summary = check_parity(reference, candidate, frames, conf_threshold=args.conf, imgsz=args.imgsz)
+    print(json.dumps(summary, indent=2))
+    print("✅ Parity check passed" if summary["passed"] else "❌ Parity check failed")
+    return 0 if summary["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""
+One shared model serving several camera streams with cross-stream batching.
+
+Each registered stream has its own capture thread feeding a "latest frame wins"
+queue. A single inference thread takes the newest pending frame from every
+stream, asks each stream whether it wants inference for that frame (motion
+gate / rate limit), and runs all the frames that do in one batched model call.
+Results go back to each stream's own callback, so detections, tracking and
+saved frames stay per stream. There is only one copy of the model in memory,
+and a batch of N frames costs much less than N separate calls, so memory and
+per-stream latency grow sub-linearly with the number of streams.
+"""
+
+import threading
+import time
+from collections import deque
+
+from pipeline import LatestFrameQueue, StageStats
+
+
+class Stream:
+    """
+    One video source registered with `MultiStreamInference`.
+
+    Args:
+        stream_id: Name used in stats.
+        read_frame: Callable returning `(ok, frame)`.
+        on_result: Called on the inference thread with `(frame, boxes, latency, captured_at)`.
+            `boxes` is the Ultralytics `Boxes` of this frame, or None when the
+            frame was skipped (`latency` is then None too). `captured_at` is the
+            `time.perf_counter()` at which the frame was read.
+        should_infer: Optional `frame -> bool`; False skips the model for that frame.
+        roi: Optional `roi.RoiCropper`; the model sees only the crop and the
+            boxes are shifted back to full-frame coordinates before `on_result`.
+    """
+
+    def __init__(self, stream_id, read_frame, on_result, should_infer=None, roi=None):
+        self.id = stream_id
+        self.read_frame = read_frame
+        self.on_result = on_result
+        self.should_infer = should_infer
+        self.roi = roi
+
+        self.frames = LatestFrameQueue(1)
+        self.capture_stats = StageStats(f"{stream_id} capture")
+        self.latency_stats = StageStats(f"{stream_id} latency")
+        self.skipped = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def snapshot(self):
+        capture = self.capture_stats.snapshot(dropped=self.frames.dropped)
+        latency = self.latency_stats.snapshot()
+        return {
+            "stream": self.id,
+            "capture_fps": capture["fps"],
+            "inference_fps": latency["fps"],
+            "latency_ms": latency["avg_ms"],
+            "dropped": capture["dropped"],
+            "skipped": self.skipped,
+        }
+
+
+class MultiStreamInference:
+    """
+    Args:
+        model: Callable model (Ultralytics YOLO); may be set later with `set_model`.
+        max_batch: Upper bound on frames per model call.
+        imgsz: Inference size passed to the model.
+    """
+
+    def __init__(self, model=None, max_batch=8, imgsz=640):
+        self.model = model
+        self.max_batch = max_batch
+        self.imgsz = imgsz
+
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._frame_ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.batch_sizes = deque(maxlen=120)
+        self.inference_stats = StageStats("batch inference")
+
+    def set_model(self, model):
+        self.model = model
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._inference_loop, name="multi-stream-inference", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        for stream_id in list(self._streams):
+            self.remove_stream(stream_id, timeout)
+        self._stop.set()
+        self._frame_ready.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def add_stream(self, stream_id, read_frame, on_result, should_infer=None, roi=None):
+        stream = Stream(stream_id, read_frame, on_result, should_infer, roi)
+        with self._lock:
+            if stream_id in self._streams:
+                raise ValueError(f"Stream {stream_id!r} is already registered")
+            self._streams[stream_id] = stream
+        stream._thread = threading.Thread(target=self._capture_loop, args=(stream,), name=f"capture-{stream_id}", daemon=True)
+        stream._thread.start()
+        return stream
+
+    def remove_stream(self, stream_id, timeout=2.0):
+        with self._lock:
+            stream = self._streams.pop(stream_id, None)
+        if stream is None:
+            return
+        stream._stop.set()
+        stream.frames.close()
+        stream._thread.join(timeout)
+
+    def _capture_loop(self, stream):
+        while not stream._stop.is_set():
+            started = time.perf_counter()
+            try:
+                ok, frame = stream.read_frame()
+            except Exception as e:
+                print(f"Capture error on {stream.id}: {e}")
+                ok, frame = False, None
+
+            if not ok or frame is None:
+                time.sleep(0.05)
+                continue
+
+            captured_at = time.perf_counter()
+            stream.capture_stats.record(captured_at - started)
+            stream.frames.put((frame, captured_at))
+            self._frame_ready.set()
+
+    def _gather(self):
+        """Newest pending frame from every stream, as `(stream, frame, captured_at)`."""
+        with self._lock:
+            streams = list(self._streams.values())
+        batch = []
+        for stream in streams:
+            item = stream.frames.get_nowait()
+            if item is not None:
+                batch.append((stream, *item))
+        return batch
+
+    def _inference_loop(self):
+        while not self._stop.is_set():
+            if not self._frame_ready.wait(0.1):
+                continue
+            self._frame_ready.clear()
+
+            pending = self._gather()
+            if not pending:
+                continue
+
+            batch = []
+            for stream, frame, captured_at in pending:
+                if self.model is not None and (stream.should_infer is None or stream.should_infer(frame)):
+                    batch.append((stream, frame, captured_at))
+                else:
+                    stream.skipped += 1
+                    self._deliver(stream, frame, None, None, captured_at)
+
+            for i in range(0, len(batch), self.max_batch):
+                self._run_batch(batch[i:i + self.max_batch])
+
+    def _run_batch(self, batch):
+        # Streams with an ROI contribute only the crop; offsets map the boxes back.
+        inputs, offsets = [], []
+        for stream, frame, _ in batch:
+            model_input, offset = stream.roi.crop(frame) if stream.roi is not None else (frame, None)
+            inputs.append(model_input)
+            offsets.append(offset)
+
+        started = time.perf_counter()
+        try:
+            results = self.model(inputs, imgsz=self.imgsz, verbose=False)
+        except Exception as e:
+            print(f"Batched inference error: {e}")
+            results = [None] * len(batch)
+        latency = time.perf_counter() - started
+
+        self.inference_stats.record(latency)
+        self.batch_sizes.append(len(batch))
+
+        for (stream, frame, captured_at), result, offset in zip(batch, results, offsets):
+            boxes = result.boxes if result is not None else []
+            if stream.roi is not None:
+                boxes = stream.roi.restore(boxes, offset)
+            self._deliver(stream, frame, boxes, latency, captured_at)
+            stream.latency_stats.record(time.perf_counter() - captured_at)
+
+        # With `benchmark` on, a new ROI is timed against the full frame once, after its results are out.
+        for stream, frame, _ in batch:
+            if stream.roi is not None and stream.roi.needs_comparison:
+                try:
+                    stream.roi.compare(self.model, frame, self.imgsz)
+                except Exception as e:
+                    print(f"ROI comparison error on {stream.id}: {e}")
+
+    @staticmethod
+    def _deliver(stream, frame, boxes, latency, captured_at):
+        try:
+            stream.on_result(frame, boxes, latency, captured_at)
+        except Exception as e:
+            print(f"Result handler error on {stream.id}: {e}")
+
+    def stats(self):
+        with self._lock:
+            streams = list(self._streams.values())
+        batches = list(self.batch_sizes)
+        inference = self.inference_stats.snapshot()
+        return {
+            "streams": [s.snapshot() for s in streams],
+            "batch_fps": inference["fps"],
+            "batch_ms": inference["avg_ms"],
+            "avg_batch": round(sum(batches) / len(batches), 2) if batches else 0.0,
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        return f"{len(s['streams'])} stream(s), batch {s['avg_batch']:.1f} × {s['batch_ms']:.0f} ms @ {s['batch_fps']:.1f}/s"
+
+    def format_stream_stats(self, stream_id, display_dropped=0):
+        """One stream's stats line; `display_dropped` counts results the UI replaced before showing them."""
+        with self._lock:
+            stream = self._streams.get(stream_id)
+        if stream is None:
+            return ""
+        s = stream.snapshot()
+        text = f"capture {s['capture_fps']:.1f} fps"
+        if s["dropped"]:
+            text += f" (dropped {s['dropped']})"
+        text += f" | infer {s['inference_fps']:.1f}/s, {s['latency_ms']:.0f} ms capture→result"
+        if display_dropped:
+            text += f" | display (dropped {display_dropped})"
+        return text
@@ -0,0 +1,87 @@
+"""
+Building blocks of the threaded capture → inference → display pipeline.
+
+The Kivy UI thread must never block on the camera or the model. Capture and
+inference run on their own daemon threads (`multi_stream.MultiStreamInference`)
+and the stages are joined with bounded "latest frame wins" queues: when a
+consumer falls behind, the oldest pending item is discarded (and counted)
+instead of building up latency. The UI thread only polls its result queue
+(`get_nowait`) to pick up finished frames.
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class LatestFrameQueue:
+    """Bounded queue that keeps only the newest items; overflow drops the oldest."""
+
+    def __init__(self, maxsize=1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Block until an item is available; returns None on timeout or close."""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def get_nowait(self):
+        with self._cond:
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class StageStats:
+    """Throughput and latency of one pipeline stage over a sliding window."""
+
+    def __init__(self, name, window=60):
+        self.name = name
+        self.processed = 0
+        self._stamps = deque(maxlen=window)
+        self._durations = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, duration):
+        with self._lock:
+            self.processed += 1
+            self._stamps.append(time.perf_counter())
+            self._durations.append(duration)
+
+    def snapshot(self, dropped=0):
+        with self._lock:
+            stamps = list(self._stamps)
+            durations = list(self._durations)
+            processed = self.processed
+
+        fps = 0.0
+        if len(stamps) > 1 and stamps[-1] > stamps[0]:
+            fps = (len(stamps) - 1) / (stamps[-1] - stamps[0])
+        avg_ms = (sum(durations) / len(durations) * 1000.0) if durations else 0.0
+
+        return {
+            "stage": self.name,
+            "fps": round(fps, 2),
+            "avg_ms": round(avg_ms, 2),
+            "processed": processed,
+            "dropped": dropped,
+        }
@@ -0,0 +1,127 @@
+"""
+Preview rendering for the camera widget.
+
+Detection and measurement run on the full-resolution frame, but the widget is much
+smaller than 1280x720, so overlays are drawn on a preview-sized copy instead.
+Snapshots still get a full-resolution annotated copy (`annotate`).
+Preview buffers are allocated once per size and reused; allocation and timing
+counters make the per-frame saving visible.
+"""
+
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class PreviewRenderer:
+    """
+    Downscale frames to the widget size and draw detection overlays on the copy.
+
+    Args:
+        colors: Stage name → BGR colour for the boxes.
+        buffers: Number of preview buffers to rotate through. The pipeline can have
+            one preview queued, one being uploaded and one being drawn, so 3 keeps
+            the inference thread from writing into a buffer the UI is still reading.
+    """
+
+    def __init__(self, colors, buffers=3):
+        self.colors = colors
+        self._buffers = [None] * buffers
+        self._next = 0
+        self._lock = threading.Lock()
+
+        self.frames = 0
+        self.allocations = 0
+        self._render_durations = deque(maxlen=60)
+        self._upload_durations = deque(maxlen=60)
+
+    def preview_shape(self, frame_shape, preview_size):
+        h, w = frame_shape[:2]
+        pw, ph = preview_size
+        if pw <= 0 or ph <= 0:
+            return 1.0, (w, h)
+        scale = min(pw / w, ph / h, 1.0)
+        return scale, (max(1, int(w * scale)), max(1, int(h * scale)))
+
+    def _buffer_for(self, shape):
+        with self._lock:
+            index = self._next
+            self._next = (self._next + 1) % len(self._buffers)
+            buf = self._buffers[index]
+            if buf is None or buf.shape != shape:
+                buf = np.empty(shape, dtype=np.uint8)
+                self._buffers[index] = buf
+                self.allocations += 1
+        return buf
+
+    def render(self, frame, detected_info, preview_size, roi=None):
+        """
+        Return the preview image with overlays; `frame` itself is left untouched
+        unless it already fits the widget (then it is drawn on in place).
+        `roi` is the `(x1, y1, x2, y2)` inference region, outlined when given.
+        """
+        started = time.perf_counter()
+        scale, (pw, ph) = self.preview_shape(frame.shape, preview_size)
+
+        if scale < 1.0:
+            preview = self._buffer_for((ph, pw, frame.shape[2]))
+            cv2.resize(frame, (pw, ph), dst=preview, interpolation=cv2.INTER_AREA)
+        else:
+            # Replayed frames are read-only views into the recording.
+            preview = frame if frame.flags.writeable else frame.copy()
+
+        self._draw(preview, detected_info, scale, roi)
+
+        with self._lock:
+            self._render_durations.append(time.perf_counter() - started)
+        return preview
+
+    def annotate(self, frame, detected_info, roi=None):
+        """Full-resolution copy of `frame` with the overlays, for snapshots."""
+        image = frame.copy()
+        self._draw(image, detected_info, 1.0, roi)
+        return image
+
+    def _draw(self, image, detected_info, scale, roi):
+        thickness = 1 if scale < 0.5 else 2
+        font_scale = max(0.4, 0.7 * scale)
+        if roi is not None:
+            x1, y1, x2, y2 = (int(v * scale) for v in roi)
+            cv2.rectangle(image, (x1, y1), (x2 - 1, y2 - 1), (160, 160, 160), 1)
+        for stage, conf, formatted_width, formatted_length, xyxy, label in detected_info:
+            x1, y1, x2, y2 = (int(v * scale) for v in xyxy)
+            color = self.colors.get(stage, (0, 255, 0))
+            cv2.rectangle(image, (x1, y1), (x2, y2), color, thickness)
+            cv2.putText(image, f"Tilapia {label}", (x1, y1 - 8), cv2.FONT_HERSHEY_SIMPLEX, font_scale, color, thickness)
+
+    def record_upload(self, duration, allocations=0):
+        """Called by the widget after each texture upload (one displayed frame)."""
+        with self._lock:
+            self.frames += 1
+            self.allocations += allocations
+            self._upload_durations.append(duration)
+
+    def stats(self):
+        with self._lock:
+            render = list(self._render_durations)
+            upload = list(self._upload_durations)
+            frames = self.frames
+            allocations = self.allocations
+
+        render_ms = sum(render) / len(render) * 1000.0 if render else 0.0
+        upload_ms = sum(upload) / len(upload) * 1000.0 if upload else 0.0
+        return {
+            "frames": frames,
+            "allocations": allocations,
+            "allocs_per_frame": round(allocations / frames, 4) if frames else 0.0,
+            "render_ms": round(render_ms, 2),
+            "upload_ms": round(upload_ms, 2),
+            "ms_per_frame": round(render_ms + upload_ms, 2),
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        return f"render {s['ms_per_frame']:.1f} ms/frame, {s['allocs_per_frame']:.3f} allocs/frame"
@@ -1,14 +1,20 @@
 import os
+import re
 import time
+
+# Reference point for the startup report, taken before the heavy imports below.
+PROCESS_START = time.perf_counter()
+
 import cv2
 import numpy as np
-import requests
 from datetime import datetime
 
 # Kivy and KivyMD imports
 from kivy.core.window import Window
 from kivy.graphics.texture import Texture
 from kivy.clock import Clock
+from kivy.uix.floatlayout import FloatLayout
+from kivy.uix.gridlayout import GridLayout
 from kivy.uix.image import Image
 from kivy.uix.label import Label
 from kivymd.uix.anchorlayout import MDAnchorLayout
@@ -18,38 +24,130 @@ from kivymd.uix.boxlayout import MDBoxLayout
 from kivymd.uix.button import MDRaisedButton
 from kivymd.uix.textfield import MDTextField
 from kivymd.uix.label import MDIcon
-from kivymd.uix.snackbar import Snackbar
 
-# YOLOv8
-from ultralytics import YOLO
+from detection import (
+    BASE_DIR,
+    CONF_THRESHOLD,
+    IMAGE_LENGTH_PX,
+    IMAGE_WIDTH_PX,
+    REAL_LENGTH_CM,
+    REAL_WIDTH_CM,
+    classify_stage,
+    load_model,
+    measure_results,
+)
+from pipeline import LatestFrameQueue
+from adaptive_inference import RUN, InferenceScheduler
+from frame_writer import FrameWriter
+from metrics import Metrics, MetricsExporter
+from model_loader import ModelLoader
+from preview import PreviewRenderer
+from session_stats import SessionStats
+from tracker import FishTracker
+
+# Optional features (calibration, roi, tiled_inference, multi_stream) and frame_source are
+# imported where they are switched on, so a plain single-camera start doesn't load them.
 
 # --- Configuration ---
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_DIR = os.path.join(BASE_DIR, "output_frames")
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-MODEL_PATH = os.path.join(BASE_DIR, "best_SMF.pt")
-
-# Calibration constants
-REAL_LENGTH_CM = 2.54
-REAL_WIDTH_CM = 30.0
-IMAGE_WIDTH_PX = 1200
-IMAGE_LENGTH_PX = 127.13
-
-# Stage thresholds (in inches)
-STARTER_MAX_IN = 3.0
-GROWER_MAX_IN = 6.0
-
 # API key from environment variable
 # Set this in your .env file or environment: API_KEY=your-secret-key-here
 API_KEY = os.getenv("API_KEY", "default-api-key")
 
+# Snapshot persistence: format (jpg/webp/png), quality and retention (0 = unlimited)
+SAVE_FORMAT = os.getenv("SAVE_FORMAT", "jpg")
+SAVE_QUALITY = int(os.getenv("SAVE_QUALITY", "85"))
+SAVE_MAX_FILES = int(os.getenv("SAVE_MAX_FILES", "200"))
+SAVE_MAX_BYTES = int(os.getenv("SAVE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+# Local journal for measurements waiting to be uploaded (survives restarts and offline periods)
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", os.path.join(BASE_DIR, "measurements.db"))
+
+# Adaptive inference: starting model rate and per-inference latency budget
+INFERENCE_FPS = float(os.getenv("INFERENCE_FPS", "10"))
+LATENCY_BUDGET_MS = float(os.getenv("LATENCY_BUDGET_MS", "150"))
+
+# Run capture and inference on worker threads (set PIPELINE_MODE=0 for the single-threaded loop)
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "1") == "1"
+
+# Video sources as frame_source specs ("0", "v4l2:/dev/video0", "gst:...", "file:clip.mp4",
+# "replay:recording.npy", "rtsp://..."), separated by ";" (or "," when no spec contains a comma).
+# All streams share one model; their latest frames are batched into one inference call.
+_sources = os.getenv("CAMERA_SOURCES", "0")
+CAMERA_SOURCES = [s.strip() for s in _sources.split(";" if ";" in _sources else ",") if s.strip()]
+MAX_BATCH = int(os.getenv("MAX_BATCH", "8"))
+
+# Sliced inference for small fingerlings (TILED_INFERENCE=1): overlapping tiles plus the whole
+# frame, merged across seams; fewer, larger tiles are used when over the latency budget.
+TILED_INFERENCE = os.getenv("TILED_INFERENCE", "0") == "1"
+TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.2"))
+TILE_LATENCY_BUDGET_MS = float(os.getenv("TILE_LATENCY_BUDGET_MS", os.getenv("LATENCY_BUDGET_MS", "150")))
+TILE_WORKERS = int(os.getenv("TILE_WORKERS", "1"))
+# Cutoff for boxes found in tiles only (whole-frame boxes keep CONF_THRESHOLD): tiles see
+# starters at several times the resolution, so they pass a lower cutoff reliably
+TILE_CONF_THRESHOLD = float(os.getenv("TILE_CONF_THRESHOLD", "0.6"))
+
+# Per-DOC session summaries written by "Export Session" and on exit
+SESSION_DIR = os.getenv("SESSION_DIR", os.path.join(BASE_DIR, "sessions"))
+
+# Crop frames to the measuring tray before inference. ROI_RECTS fixes the tray per camera
+# ("x1,y1,x2,y2", ";"-separated in CAMERA_SOURCES order, e.g. from `roi.py select`); an empty
+# entry finds it automatically and searches again when the scene changes by ROI_CHANGE_THRESHOLD
+ROI_ENABLED = os.getenv("ROI", "0") == "1"
+ROI_RECTS = os.getenv("ROI_RECTS", "").split(";")
+ROI_CHANGE_THRESHOLD = float(os.getenv("ROI_CHANGE_THRESHOLD", "20"))
+# Time the model on the full frame vs. the ROI whenever the ROI changes (four extra inferences
+# on the inference thread each time); for tuning only
+ROI_BENCHMARK = os.getenv("ROI_BENCHMARK", "0") == "1"
+
+# Saved lens/tray calibrations (`calibration.py calibrate -o <dir>/<cam id>`); a camera without
+# its own subdirectory uses the one in the directory itself, or the global px constants
+CALIBRATION_DIR = os.getenv("CALIBRATION_DIR", os.path.join(BASE_DIR, "calibration"))
+
+# Per-stage timing spans (METRICS=0 disables them), flushed as JSONL and a Prometheus textfile
+METRICS_ENABLED = os.getenv("METRICS", "1") == "1"
+METRICS_LOG = os.getenv("METRICS_LOG", os.path.join(BASE_DIR, "metrics.jsonl"))
+METRICS_PROM = os.getenv("METRICS_PROM", os.path.join(BASE_DIR, "metrics.prom"))
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "10"))
+# The JSONL log is rotated at this size, keeping METRICS_LOG_BACKUPS old files (0 = no rotation)
+METRICS_LOG_MAX_BYTES = int(os.getenv("METRICS_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+METRICS_LOG_BACKUPS = int(os.getenv("METRICS_LOG_BACKUPS", "3"))
+
 Window.size = (1200, 760)
 Window.clearcolor = (0, 0, 0, 1)
 
 
+def show_snackbar(text):
+    # Imported on first use; it's only needed for error messages.
+    from kivymd.uix.snackbar import Snackbar
+
+    Snackbar(text=text).open()
+
+
 class KivyCamera(Image):
-    def __init__(self, info_label, saved_frame_widget, saved_info_label, saved_icon, app_ref, **kwargs):
+    """
+    One camera view. Capture and inference for every view run in the app's shared
+    `MultiStreamInference` (one model, batched across streams); each view keeps its
+    own tracker, scheduler, snapshots and labels.
+    """
+
+    def __init__(
+        self,
+        info_label,
+        saved_frame_widget,
+        saved_info_label,
+        saved_icon,
+        app_ref,
+        metrics,
+        engine=None,
+        source="0",
+        stream_id="cam0",
+        output_dir=OUTPUT_DIR,
+        roi=None,
+        **kwargs,
+    ):
         super().__init__(**kwargs)
         self.capture = None
         self.info_label = info_label
@@ -57,22 +155,52 @@ class KivyCamera(Image):
         self.saved_info_label = saved_info_label
         self.saved_icon = saved_icon
         self.app_ref = app_ref
+        self.metrics = metrics
+        self.engine = engine
+        self.source = source
+        self.stream_id = stream_id
+        # Optional RoiCropper: inference runs on the tray crop only.
+        self.roi = roi
 
-        print(f"⏳ Loading YOLO model: {MODEL_PATH}")
-        self.model = YOLO(MODEL_PATH)
-        print("✅ Model loaded successfully")
+        # Set by the app once the shared model has loaded (used directly only when PIPELINE_MODE=0).
+        self.model = None
+        self._first_detection_reported = False
 
         self.colors = {"Starter": (0, 255, 0), "Grower": (255, 255, 0), "Finisher": (255, 0, 0)}
         self.stage_icons = {"Starter": "sprout", "Grower": "fish", "Finisher": "flag-checkered"}
 
+        # Overlays are drawn on a widget-sized copy; the texture is reused until the size changes.
+        self.renderer = PreviewRenderer(self.colors)
+        self.preview_size = (0, 0)
+        self._texture = None
+        self.bind(size=self._on_size)
+
         self.real_length_cm = REAL_LENGTH_CM
         self.real_width_cm = REAL_WIDTH_CM
         self.image_width_pixels = IMAGE_WIDTH_PX
         self.image_length_pixels = IMAGE_LENGTH_PX
+        # Memory-mapped per-pixel scale map; replaces the constants above when present.
+        self.calibration = None
+        if os.path.isdir(CALIBRATION_DIR):
+            from calibration import load_calibration
+
+            self.calibration = load_calibration(os.path.join(CALIBRATION_DIR, stream_id), CALIBRATION_DIR)
+        if self.calibration is not None:
+            print(f"✅ {stream_id}: using calibration {self.calibration.image_size[0]}x{self.calibration.image_size[1]} ({self.calibration.meta.get('method')})")
 
         self.last_save_time = 0.0
         self.save_interval = 3.0
+        self.frame_writer = FrameWriter(
+            output_dir,
+            fmt=SAVE_FORMAT,
+            quality=SAVE_QUALITY,
+            max_files=SAVE_MAX_FILES,
+            max_bytes=SAVE_MAX_BYTES,
+            on_saved=self._on_frame_saved,
+            metrics=self.metrics,
+        )
         self._event = None
+        self.results = LatestFrameQueue(1)
 
         self.latest_width = None
         self.latest_length = None
@@ -80,210 +208,404 @@ class KivyCamera(Image):
 
         self.current_sampling_id = None
 
+        self.tracker = FishTracker()
+        self.scheduler = InferenceScheduler(target_fps=INFERENCE_FPS, latency_budget_ms=LATENCY_BUDGET_MS)
+        self._last_detected_info = []
+
+        # Shared journal/uploader, attached by the app once the window is up.
+        self.api_client = None
+        self.journal = None
+        self.uploader = None
+
+    def attach_services(self, api_client, journal, uploader):
+        self.api_client = api_client
+        self.journal = journal
+        self.uploader = uploader
+
     def start(self, fps=20):
+        """Open the source and start capture; returns False when the source could not be opened."""
+        self.tracker.reset()
+        self.scheduler.reset()
+        if self.roi is not None:
+            self.roi.reset()
+        self._last_detected_info = []
         if self.capture is None:
-            self.capture = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-            self.capture.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-            self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+            from frame_source import open_source
+
+            try:
+                capture = open_source(self.source)
+            except (ValueError, OSError) as e:
+                show_snackbar(f"Cannot open {self.source}: {e}")
+                return False
+            if not capture.isOpened():
+                capture.release()
+                show_snackbar(f"Cannot open {self.source}")
+                return False
+            self.capture = capture
             time.sleep(0.2)
 
-        if self._event is None:
+        if PIPELINE_MODE and self.engine is not None:
+            # Capture runs on this stream's thread and inference in the shared engine;
+            # the Clock only uploads finished frames.
+            self.results = LatestFrameQueue(1)
+            self.engine.add_stream(self.stream_id, self.read_frame, self.handle_inference, should_infer=self.should_infer, roi=self.roi)
+            self.engine.start()
+            if self._event is None:
+                self._event = Clock.schedule_interval(self.update_from_pipeline, 1.0 / fps)
+        elif self._event is None:
             self._event = Clock.schedule_interval(self.update, 1.0 / fps)
 
-        print("🎬 Camera started")
+        print(f"🎬 Camera {self.stream_id} started ({self.source})")
+        return True
 
     def stop(self):
         if self._event is not None:
             self._event.cancel()
             self._event = None
+        if self.engine is not None:
+            self.engine.remove_stream(self.stream_id)
         if self.capture is not None:
-            if self.capture.isOpened():
-                self.capture.release()
+            self.capture.release()
             self.capture = None
-        print("⏸ Camera stopped")
+        print(f"⏸ Camera {self.stream_id} stopped")
+
+    def read_frame(self):
+        with self.metrics.span("capture"):
+            return self.capture.read()
 
     def update(self, dt):
         if self.capture is None:
             frame = np.zeros((720, 1280, 3), dtype=np.uint8)
             cv2.putText(frame, "🎥 No camera detected", (200, 360), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (200, 200, 200), 2)
         else:
-            ret, frame = self.capture.read()
+            ret, frame = self.read_frame()
             if not ret or frame is None:
                 frame = np.zeros((720, 1280, 3), dtype=np.uint8)
                 cv2.putText(frame, "Waiting for camera...", (200, 360), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (200, 200, 200), 2)
             else:
-                try:
-                    results = self.model(frame, verbose=False)
-                    detections = results[0].boxes
-                except Exception as e:
-                    print(f"Model inference error: {e}")
-                    detections = []
-
-                detected_info = []
-                for box in detections:
-                    try:
-                        conf = float(box.conf)
-                        xyxy = box.xyxy[0].cpu().numpy().astype(int)
-                    except Exception:
-                        continue
-
-                    if conf < 0.9:
-                        continue
-
-                    pixel_width = xyxy[2] - xyxy[0]
-                    pixel_length = xyxy[3] - xyxy[1]
-
-                    real_world_length_cm = (pixel_length / self.image_length_pixels) * self.real_length_cm
-                    real_world_width_cm = (pixel_width / self.image_width_pixels) * self.real_width_cm
-
-                    real_world_length_in = real_world_length_cm / 2.54
-                    real_world_width_in = real_world_width_cm / 2.54
-
-                    # Standard length = longer bbox axis, width = shorter (matches sampling report / API).
-                    long_in = max(real_world_length_in, real_world_width_in)
-                    short_in = min(real_world_length_in, real_world_width_in)
-                    formatted_length = f"{long_in:.2f}"
-                    formatted_width = f"{short_in:.2f}"
-
-                    if long_in <= STARTER_MAX_IN:
-                        stage = "Starter"
-                    elif long_in <= GROWER_MAX_IN:
-                        stage = "Grower"
-                    else:
-                        stage = "Finisher"
-
-                    color = self.colors.get(stage, (0, 255, 0))
-                    cv2.rectangle(frame, (xyxy[0], xyxy[1]), (xyxy[2], xyxy[3]), color, 2)
-                    cv2.putText(frame, "Tilapia", (xyxy[0], xyxy[1] - 8), cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-
-                    detected_info.append((stage, conf, formatted_width, formatted_length))
-
-                    # Save frame and update info panel every save_interval seconds
-                    if time.time() - self.last_save_time > self.save_interval:
-                        output_path = os.path.join(OUTPUT_DIR, "frame.png")
-                        cv2.imwrite(output_path, frame)
-                        self.last_save_time = time.time()
-
-                        if self.saved_frame_widget:
-                            self.saved_frame_widget.source = output_path
-                            self.saved_frame_widget.reload()
-
-                        if self.saved_info_label:
-                            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            weight_display = self.latest_weight if self.latest_weight is not None else "---"
-                            self.saved_info_label.text = (
-                                f"[size=18][b]Stage:[/b] [color=00ffcc]{stage}[/color]\n"
-                                f"[b]Width:[/b] [color=00ffcc]{formatted_width}[/color] in\n"
-                                f"[b]Length:[/b] [color=00ffcc]{formatted_length}[/color] in\n"
-                                f"[b]Weight:[/b] [color=00ffcc]{weight_display}[/color] g\n"
-                                f"[b]Time:[/b] [color=cccccc]{now}[/color][/size]"
-                            )
-                            self.saved_icon.icon = self.stage_icons.get(stage, "fish")
-
-                            self.latest_width = formatted_width
-                            self.latest_length = formatted_length
-
-                if detected_info:
-                    summaries = [t[0] for t in detected_info]
-                    self.info_label.text = "Detected: " + ", ".join(summaries)
-                else:
-                    self.info_label.text = "No Tilapia detected."
-
-        if 'frame' in locals():
-            buf = cv2.flip(frame, 0).tobytes()
-            texture = Texture.create(size=(frame.shape[1], frame.shape[0]), colorfmt='bgr')
-            texture.blit_buffer(buf, colorfmt='bgr', bufferfmt='ubyte')
-            self.texture = texture
-
-    def fetch_weight_from_api(self, doc=None):
-        if not self.latest_width or not self.latest_length:
-            print("⚠️ No detection data available.")
-            return
+                captured_at = self.capture.captured_at
+                preview, detected_info = self.process_and_render(frame)
+                self.publish_detections(frame, detected_info)
+                self.show_frame(preview)
+                self.record_display(captured_at)
+                self.info_label.text += f"\n{self.capture.format_stats()} | {self.renderer.format_stats()}"
+                return
 
-        if not doc:
-            print("❌ DOC not provided.")
+        self.show_frame(self.renderer.render(frame, [], self.preview_size))
+
+    def update_from_pipeline(self, dt):
+        result = self.results.get_nowait()
+        if result is None:
             return
 
-        print(f"📡 Looking up sampling using DOC: {doc}")
+        preview, frame, detected_info, captured_at = result
+        self.publish_detections(frame, detected_info)
+        self.show_frame(preview)
+        self.record_display(captured_at)
 
-        try:
-            # Step 1: Get all cages with samplings
-            url_cages = f"https://sfm-ver-two.on-forge.com/api/cages?key={API_KEY}"
-            cages_response = requests.get(url_cages)
-            cages_json = cages_response.json()
+        stream_stats = self.engine.format_stream_stats(self.stream_id, display_dropped=self.results.dropped)
+        self.info_label.text += f"\n{stream_stats} | {self.capture.format_stats()} | {self.renderer.format_stats()}"
 
-            if cages_response.status_code != 200 or "data" not in cages_json:
-                print("❌ Failed to fetch cages data.")
-                return
+    def record_display(self, captured_at):
+        if self.capture is not None and captured_at is not None:
+            self.capture.record_display(captured_at)
+            self.metrics.record("capture_to_display", time.perf_counter() - captured_at)
 
-            # Step 2: Search for sampling with matching DOC and debug print all samplings found
-            sampling_id = None
-            print("🔍 Available samplings:")
-            for cage in cages_json["data"]:
-                samplings = cage.get("samplings", [])
-                for sampling in samplings:
-                    print(f"  Sampling ID: {sampling.get('id')}, DOC: {sampling.get('doc')}")
-                    if sampling.get("doc") == doc:
-                        sampling_id = sampling.get("id")
-                        print(f"✅ Matched DOC found with sampling ID: {sampling_id}")
-                        break
-                if sampling_id is not None:
-                    break
-
-            if sampling_id is None:
-                print(f"❌ Sampling with DOC {doc} not found.")
-                return
+    def should_infer(self, frame):
+        """Engine hook: skip the model when nothing moved or we're over the latency budget."""
+        return self.scheduler.decide(frame) == RUN
 
-            # Step 3: Calculate weight with the found sampling_id and doc included
-            url_weight = f"https://sfm-ver-two.on-forge.com/api/weight?key={API_KEY}"
-            payload = {
-                "sampling_id": sampling_id,
-                "doc": doc,  # Required by API
-                "width": float(self.latest_width),
-                "height": float(self.latest_length),
-                # Bbox values are in inches; API expects cm unless unit=in (see DocsController).
-                "unit": "in",
-            }
+    def handle_inference(self, frame, detections, latency, captured_at):
+        """Engine callback (inference thread): measure, track and render this stream's frame."""
+        if detections is None:
+            # Skipped frame; the previous boxes still apply.
+            detected_info = self._last_detected_info
+        else:
+            detected_info = self.process_detections(detections, latency, frame.shape)
+        with self.metrics.span("render"):
+            preview = self.renderer.render(frame, detected_info, self.preview_size, self.roi_rect())
+        # The full frame travels along for snapshots; only the preview is displayed.
+        self.results.put((preview, frame, detected_info, captured_at))
+
+    def process_frame(self, frame):
+        """Run YOLO on a full-resolution frame and measure the boxes (single-threaded mode)."""
+        if self.model is None:
+            return frame, []
+
+        # Skip the model when nothing moved or we're over the latency budget; the boxes still apply.
+        if self.scheduler.decide(frame) != RUN:
+            return frame, self._last_detected_info
+
+        model_input, offset = self.roi.crop(frame) if self.roi is not None else (frame, None)
+        started = time.perf_counter()
+        try:
+            results = self.model(model_input, verbose=False)
+            detections = results[0].boxes
+        except Exception as e:
+            print(f"Model inference error: {e}")
+            detections = []
+        latency = time.perf_counter() - started
+        if self.roi is not None:
+            detections = self.roi.restore(detections, offset)
+        detected_info = self.process_detections(detections, latency, frame.shape)
+
+        # ROI_BENCHMARK only: time a new ROI against the full frame once, after this frame's boxes.
+        if self.roi is not None and self.roi.needs_comparison:
+            try:
+                self.roi.compare(self.model, frame)
+            except Exception as e:
+                print(f"ROI comparison error: {e}")
+        return frame, detected_info
+
+    def process_detections(self, detections, latency, frame_shape=None):
+        """Measure and track one frame's boxes; `latency` is the model time for this frame (or its batch)."""
+        self.scheduler.record_latency(latency)
+        self.metrics.record("inference", latency)
+
+        with self.metrics.span("postprocess"):
+            detected_info = self._measure_and_track(detections, frame_shape)
+
+        if detected_info and not self._first_detection_reported:
+            self._first_detection_reported = True
+            elapsed = time.perf_counter() - PROCESS_START
+            self.metrics.record("startup_first_detection", elapsed)
+            print(f"⏱ Time to first detection: {elapsed:.2f}s since launch")
+
+        self._last_detected_info = detected_info
+        return detected_info
+
+    def _measure_and_track(self, detections, frame_shape=None):
+        measurements = measure_results(
+            detections,
+            real_length_cm=self.real_length_cm,
+            real_width_cm=self.real_width_cm,
+            image_width_px=self.image_width_pixels,
+            image_length_px=self.image_length_pixels,
+            # TiledDetector already applied the per-crop cutoffs; this only drops what none passed.
+            conf_threshold=min(CONF_THRESHOLD, TILE_CONF_THRESHOLD) if TILED_INFERENCE else CONF_THRESHOLD,
+            calibration=self.calibration,
+            frame_size=(frame_shape[1], frame_shape[0]) if frame_shape is not None else None,
+        )
 
-            print(f"📡 Sending weight calculation: {payload}")
+        # Per-fish tracks smooth length/width over frames; show the robust estimate, not this frame's box.
+        tracks = self.tracker.update(measurements.xyxy, measurements.length_in, measurements.width_in)
+        self._count_locked_fish(tracks)
 
-            weight_response = requests.post(url_weight, json=payload)
-            weight_json = weight_response.json()
+        detected_info = []
+        for xyxy, conf, track in zip(measurements.xyxy.tolist(), measurements.conf.tolist(), tracks):
+            stage = classify_stage(track.length_in)
+            formatted_length = f"{track.length_in:.2f}"
+            formatted_width = f"{track.width_in:.2f}"
 
-            print(f"📩 Weight status: {weight_response.status_code}")
-            print(f"📩 Weight response: {weight_json}")
+            detected_info.append((stage, conf, formatted_width, formatted_length, xyxy, track.label))
+        return detected_info
 
-            if weight_response.status_code != 200 or "data" not in weight_json:
-                print(f"❌ Weight calculation error: {weight_json.get('message', 'Unknown error')}")
-                return
+    def _count_locked_fish(self, tracks):
+        """Add each fish to the DOC's session stats once, when its track locks."""
+        fresh = [t for t in tracks if t.locked and not t.counted]
+        if not fresh or self.app_ref is None:
+            return
+        session = self.app_ref.current_session()
+        if session is None:
+            # No DOC yet; these fish are counted once one is entered.
+            return
+        session.add([t.length_in for t in fresh], [t.width_in for t in fresh])
+        for track in fresh:
+            track.counted = True
+
+    def process_and_render(self, frame):
+        """Measure on the full frame, then return the annotated preview-sized copy."""
+        frame, detected_info = self.process_frame(frame)
+        with self.metrics.span("render"):
+            preview = self.renderer.render(frame, detected_info, self.preview_size, self.roi_rect())
+        return preview, detected_info
+
+    def roi_rect(self):
+        return self.roi.last_rect if self.roi is not None else None
+
+    def publish_detections(self, frame, detected_info):
+        """Save a full-resolution snapshot of `frame` and refresh the info panels. UI thread only."""
+        if detected_info and time.time() - self.last_save_time > self.save_interval:
+            # Save frame and update info panel every save_interval seconds
+            stage, conf, formatted_width, formatted_length, _, _ = detected_info[0]
+
+            # Encoding and disk I/O happen on the writer thread; the preview reloads once it lands.
+            snapshot = self.renderer.annotate(frame, detected_info, self.roi_rect())
+            self.frame_writer.submit(snapshot, tag=self.sampling_tag())
+            self.last_save_time = time.time()
 
-            weight_in_grams = weight_json["data"]["weight"]
-            weight_text = f"{weight_in_grams:.2f}"
+            if self.saved_info_label:
+                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                weight_display = self.latest_weight if self.latest_weight is not None else "---"
+                camera_line = f"[b]Camera:[/b] [color=cccccc]{self.stream_id}[/color]\n" if len(CAMERA_SOURCES) > 1 else ""
+                self.saved_info_label.text = (
+                    f"[size=18]{camera_line}[b]Stage:[/b] [color=00ffcc]{stage}[/color]\n"
+                    f"[b]Width:[/b] [color=00ffcc]{formatted_width}[/color] in\n"
+                    f"[b]Length:[/b] [color=00ffcc]{formatted_length}[/color] in\n"
+                    f"[b]Weight:[/b] [color=00ffcc]{weight_display}[/color] g\n"
+                    f"[b]Time:[/b] [color=cccccc]{now}[/color][/size]"
+                )
+                self.saved_icon.icon = self.stage_icons.get(stage, "fish")
 
-            # Update stored latest weight and UI label
-            self.latest_weight = weight_text
+                self.latest_width = formatted_width
+                self.latest_length = formatted_length
 
-            if self.saved_info_label:
-                import re
-                text = self.saved_info_label.text
-                new_text = re.sub(
-                    r"\[b\]Weight:\[/b\] \[color=00ffcc\].*?\[/color\] g",
-                    f"[b]Weight:[/b] [color=00ffcc]{weight_text}[/color] g",
-                    text,
+        if detected_info:
+            summaries = [f"{t[0]} {t[5]}" for t in detected_info]
+            tracked, locked = self.tracker.summary()
+            self.info_label.text = "Detected: " + ", ".join(summaries) + f" | Tracks: {tracked} ({locked} locked)"
+        else:
+            self.info_label.text = "No Tilapia detected."
+        self.info_label.text += f"\n{self.scheduler.format_stats()}"
+        if self.roi is not None:
+            self.info_label.text += f" | {self.roi.format_stats()}"
+
+    def sampling_tag(self):
+        doc = self.app_ref.doc_field.text.strip() if self.app_ref is not None else ""
+        tag = doc if doc.startswith("DOC-") else "nodoc"
+        return f"{tag}_{self.stream_id}" if len(CAMERA_SOURCES) > 1 else tag
+
+    def _on_frame_saved(self, path):
+        # Called on the writer thread; widget updates must happen on the UI thread.
+        Clock.schedule_once(lambda dt: self._show_saved_frame(path))
+
+    def _show_saved_frame(self, path):
+        if self.saved_frame_widget and path == self.frame_writer.latest_path:
+            self.saved_frame_widget.source = path
+            self.saved_frame_widget.reload()
+
+    def _on_size(self, instance, size):
+        # Read by the inference thread; tuple assignment is atomic.
+        self.preview_size = (int(size[0]), int(size[1]))
+
+    def show_frame(self, frame):
+        started = time.perf_counter()
+        allocations = 0
+        size = (frame.shape[1], frame.shape[0])
+
+        if self._texture is None or tuple(self._texture.size) != size:
+            self._texture = Texture.create(size=size, colorfmt='bgr')
+            # Flip via texture coordinates instead of copying the pixels with cv2.flip.
+            self._texture.flip_vertical()
+            self.texture = self._texture
+            allocations += 1
+
+        # Upload straight from the array's memory (no tobytes() copy).
+        self._texture.blit_buffer(np.ascontiguousarray(frame).reshape(-1), colorfmt='bgr', bufferfmt='ubyte')
+        self.canvas.ask_update()
+
+        duration = time.perf_counter() - started
+        self.renderer.record_upload(duration, allocations)
+        self.metrics.record("upload", duration)
+
+    def fetch_weight_from_api(self, doc=None, sampling_id=None):
+        """Journal this camera's measurements for `doc` (`sampling_id` as resolved by the app)."""
+        if not doc:
+            print("❌ DOC not provided.")
+            return
+        if self.journal is None:
+            print("⚠️ Measurement journal not open yet.")
+            return
+
+        # One measurement per locked fish; fall back to the last displayed box if none has settled yet.
+        tracks = self.tracker.ready_to_submit()
+        if tracks:
+            measurements = [(f"{t.width_in:.2f}", f"{t.length_in:.2f}", t) for t in tracks]
+        elif self.tracker.has_locked():
+            # The fish in view were already submitted; the latest box is one of them.
+            print("ℹ️ Nothing new to submit: every locked fish in view was already submitted.")
+            return
+        elif self.latest_width and self.latest_length:
+            print("⚠️ No stable fish track yet; submitting the latest detection.")
+            measurements = [(self.latest_width, self.latest_length, None)]
+        else:
+            print("⚠️ No detection data available.")
+            return
+
+        for width, length, track in measurements:
+            # Journal first so the measurement survives a dropped connection; the uploader sends it.
+            with self.metrics.span("journal"):
+                self.journal.add(
+                    doc,
+                    width=width,
+                    height=length,
+                    unit="in",
+                    sampling_id=sampling_id,
+                    frame_ref=self.frame_writer.latest_path,
                 )
-                self.saved_info_label.text = new_text
-                self.saved_info_label.texture_update()
+            if track is not None:
+                self.tracker.mark_submitted(track)
+        self.uploader.wake()
 
-            print(f"✅ Weight updated: {weight_text} g")
+        pending = self.journal.counts().get("pending", 0)
+        print(f"📝 {len(measurements)} measurement(s) queued for DOC {doc} ({pending} pending upload)")
 
-        except Exception as e:
-            print(f"❌ Exception during API flow: {e}")
+    def _on_measurement_uploaded(self, row, result):
+        self._on_weight_received({"weight": result["weight"], "sampling_id": row.get("sampling_id")})
+
+    def _on_weight_received(self, data):
+        weight_text = f"{data['weight']:.2f}"
+
+        # Update stored latest weight and UI label
+        self.latest_weight = weight_text
+
+        if self.saved_info_label:
+            text = self.saved_info_label.text
+            new_text = re.sub(
+                r"\[b\]Weight:\[/b\] \[color=00ffcc\].*?\[/color\] g",
+                f"[b]Weight:[/b] [color=00ffcc]{weight_text}[/color] g",
+                text,
+            )
+            self.saved_info_label.text = new_text
+            self.saved_info_label.texture_update()
+
+        print(f"✅ Weight updated: {weight_text} g (sampling {data.get('sampling_id')})")
 
 
 class TilapiaApp(MDApp):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.api_key = API_KEY  # Using hardcoded API key
+        self.cameras = []
+        # SessionStats per DOC entered during this run
+        self.sessions = {}
+
+        self.metrics = Metrics(enabled=METRICS_ENABLED)
+        self.metrics_exporter = MetricsExporter(
+            self.metrics,
+            METRICS_LOG,
+            METRICS_PROM,
+            METRICS_INTERVAL,
+            max_bytes=METRICS_LOG_MAX_BYTES,
+            backups=METRICS_LOG_BACKUPS,
+        )
+        self.metrics_exporter.start()
+        self._metrics_event = None
+        # Rejected uploads collected until the next frame, then shown as one message
+        self._rejections = []
+
+        # One model for every camera; their latest frames are batched into a single call.
+        # PIPELINE_MODE=0 runs each camera's model on the UI thread without it.
+        self.engine = None
+        if PIPELINE_MODE:
+            from multi_stream import MultiStreamInference
+
+            self.engine = MultiStreamInference(max_batch=MAX_BATCH)
+        # The loaded model (a TiledDetector around it with TILED_INFERENCE=1)
+        self.model = None
+
+        # Created by `_on_first_frame` once the window is up, then shared by every camera.
+        self.api_client = None
+        self.journal = None
+        self.uploader = None
+
+        # Loaded and warmed up on a background thread so the window appears immediately;
+        # Start Camera stays disabled until `on_model_ready`.
+        self.model_loader = ModelLoader(
+            load_model,
+            on_ready=lambda model: Clock.schedule_once(lambda dt: self.on_model_ready(model)),
+            on_error=lambda e: Clock.schedule_once(lambda dt, exc=e: self.on_model_error(exc)),
+        ).start()
 
     def build(self):
         self.theme_cls.theme_style = "Dark"
@@ -314,7 +636,7 @@ class TilapiaApp(MDApp):
         saved_info_card = MDCard(
             orientation="vertical",
             size_hint=(1, None),
-            height=280,
+            height=340,
             md_bg_color=(0.1, 0.1, 0.1, 0.9),
             radius=[20, 20, 20, 20],
             padding=15,
@@ -330,29 +652,90 @@ class TilapiaApp(MDApp):
         saved_info_label = Label(text="[b][color=cccccc]No detections yet[/color][/b]", markup=True, halign="left", valign="top")
         saved_info_label.bind(size=saved_info_label.setter("text_size"))
 
+        # Running statistics of every fish counted for the current DOC
+        self.session_label = Label(text="", markup=True, font_size=13, halign="left", valign="top", size_hint_y=None, height=60)
+        self.session_label.bind(size=self.session_label.setter("text_size"))
+
         saved_info_card.add_widget(header_row)
         saved_info_card.add_widget(saved_info_label)
-
-        # Camera widget itself
-        self.camera_widget = KivyCamera(
-            info_label=self.info_label,
-            saved_frame_widget=saved_frame_widget,
-            saved_info_label=saved_info_label,
-            saved_icon=saved_icon,
-            app_ref=self,
+        saved_info_card.add_widget(self.session_label)
+
+        # Latency overlay drawn over the top-left of the camera view (hidden until toggled)
+        self.metrics_label = Label(
+            text="",
+            font_name="RobotoMono-Regular",
+            font_size=12,
+            color=(0.6, 1, 0.6, 1),
+            halign="left",
+            valign="top",
+            size_hint=(1, 1),
+            pos_hint={"x": 0, "top": 1},
+            padding=(8, 8),
+            opacity=0,
         )
+        self.metrics_label.bind(size=self.metrics_label.setter("text_size"))
+
+        # One camera widget per source; with several sources each tile gets its own info label
+        multi_camera = len(CAMERA_SOURCES) > 1
+        camera_grid = GridLayout(cols=min(len(CAMERA_SOURCES), 2), spacing=4)
+        for index, source in enumerate(CAMERA_SOURCES):
+            stream_id = f"cam{index}"
+            if multi_camera:
+                tile_info = Label(text=f"{stream_id}: no detections yet.", font_size=12, size_hint=(1, None), height=40)
+            else:
+                tile_info = self.info_label
+            roi = None
+            if ROI_ENABLED:
+                from roi import RoiCropper, parse_rect
+
+                rect = parse_rect(ROI_RECTS[index]) if index < len(ROI_RECTS) else None
+                roi = RoiCropper(rect, change_threshold=ROI_CHANGE_THRESHOLD, benchmark=ROI_BENCHMARK)
+            camera = KivyCamera(
+                info_label=tile_info,
+                saved_frame_widget=saved_frame_widget,
+                saved_info_label=saved_info_label,
+                saved_icon=saved_icon,
+                app_ref=self,
+                metrics=self.metrics,
+                engine=self.engine,
+                source=source,
+                stream_id=stream_id,
+                output_dir=os.path.join(OUTPUT_DIR, stream_id) if multi_camera else OUTPUT_DIR,
+                roi=roi,
+                size_hint=(1, 1),
+                pos_hint={"x": 0, "y": 0},
+            )
+            self.cameras.append(camera)
+
+            tile = FloatLayout()
+            tile.add_widget(camera)
+            if index == 0:
+                tile.add_widget(self.metrics_label)
+            if multi_camera:
+                column = MDBoxLayout(orientation="vertical")
+                column.add_widget(tile)
+                column.add_widget(tile_info)
+                camera_grid.add_widget(column)
+            else:
+                camera_grid.add_widget(tile)
+        camera_view = camera_grid
 
         # Buttons row
         buttons_anchor = MDAnchorLayout(anchor_x="center", anchor_y="center", size_hint=(1, 0.08))
         buttons_row = MDBoxLayout(orientation="horizontal", spacing=20, adaptive_size=True)
 
-        self.start_button = MDRaisedButton(text="Start Camera", md_bg_color=(0, 0.7, 0, 1), on_press=self.start_camera, size_hint=(None, None), size=(180, 50))
+        # Enabled by `on_model_ready` once the background load and warm-up finish.
+        self.start_button = MDRaisedButton(text="Loading model...", md_bg_color=(0, 0.7, 0, 1), on_press=self.start_camera, size_hint=(None, None), size=(180, 50), disabled=True)
         self.stop_button = MDRaisedButton(text="Stop Camera", md_bg_color=(0.8, 0, 0, 1), on_press=self.stop_camera, size_hint=(None, None), size=(180, 50), disabled=True)
         self.weight_button = MDRaisedButton(text="Get Weight", md_bg_color=(0.2, 0.4, 1, 1), on_press=self.get_weight, size_hint=(None, None), size=(180, 50))
+        self.metrics_button = MDRaisedButton(text="Show Metrics", md_bg_color=(0.3, 0.3, 0.3, 1), on_press=self.toggle_metrics, size_hint=(None, None), size=(180, 50))
+        self.session_button = MDRaisedButton(text="Export Session", md_bg_color=(0.5, 0.3, 0.7, 1), on_press=self.export_session, size_hint=(None, None), size=(180, 50))
 
         buttons_row.add_widget(self.start_button)
         buttons_row.add_widget(self.stop_button)
         buttons_row.add_widget(self.weight_button)
+        buttons_row.add_widget(self.metrics_button)
+        buttons_row.add_widget(self.session_button)
         buttons_anchor.add_widget(buttons_row)
 
         # Main layout split horizontal
@@ -360,7 +743,7 @@ class TilapiaApp(MDApp):
 
         # Left column: camera, buttons, info label
         left_col = MDBoxLayout(orientation="vertical")
-        left_col.add_widget(self.camera_widget)
+        left_col.add_widget(camera_view)
         left_col.add_widget(buttons_anchor)
         left_col.add_widget(self.info_label)
 
@@ -376,24 +759,211 @@ class TilapiaApp(MDApp):
 
         return root
 
+    def on_start(self):
+        # Runs after build(); the next Clock tick is the first drawn frame.
+        Clock.schedule_once(self._on_first_frame, 0)
+        Clock.schedule_interval(self._refresh_session_card, 1.0)
+
+    def _on_first_frame(self, dt):
+        elapsed = time.perf_counter() - PROCESS_START
+        self.metrics.record("startup_first_window", elapsed)
+        print(f"⏱ Time to first window: {elapsed:.2f}s since launch")
+        self.start_services()
+
+    def start_services(self):
+        """Open the measurement journal and start the uploader (deferred to after the first frame)."""
+        from measurement_queue import BulkUploader, MeasurementJournal
+        from weight_client import WeightApiClient
+
+        self.api_client = WeightApiClient(API_KEY)
+        self.journal = MeasurementJournal(JOURNAL_PATH)
+        self.uploader = BulkUploader(
+            self.journal,
+            self.api_client,
+            on_result=lambda row, result: Clock.schedule_once(lambda dt: self._on_measurement_uploaded(row, result)),
+            metrics=self.metrics,
+        )
+        self.uploader.start()
+        for camera in self.cameras:
+            camera.attach_services(self.api_client, self.journal, self.uploader)
+
+    def close_services(self):
+        if self.uploader is not None:
+            self.uploader.stop()
+        if self.journal is not None:
+            self.journal.close()
+        if self.api_client is not None:
+            self.api_client.close()
+
+    def _on_measurement_uploaded(self, row, result):
+        if result.get("status") == "rejected":
+            # A batch delivers its rows back to back; summarise them in one snackbar.
+            if not self._rejections:
+                Clock.schedule_once(self._report_rejections, 0)
+            self._rejections.append((row["doc"], result.get("message", "rejected")))
+            return
+
+        # Route the weight back to the camera whose snapshot the measurement came from.
+        frame_ref = row.get("frame_ref") or ""
+        camera = next(
+            (c for c in self.cameras if frame_ref.startswith(os.path.join(c.frame_writer.output_dir, ""))),
+            self.cameras[0],
+        )
+        camera._on_measurement_uploaded(row, result)
+
+    def _report_rejections(self, dt):
+        rejections, self._rejections = self._rejections, []
+        counts = {}
+        for doc, message in rejections:
+            counts[(doc, message)] = counts.get((doc, message), 0) + 1
+        for (doc, message), count in counts.items():
+            print(f"❌ {count} measurement(s) for {doc} rejected: {message}")
+
+        text = "; ".join(f"{doc}: {message} (×{count})" for (doc, message), count in counts.items())
+        show_snackbar(f"{len(rejections)} measurement(s) rejected - {text}")
+
+    def current_session(self):
+        """SessionStats of the DOC in the text field (None without a valid DOC)."""
+        doc = self.doc_field.text.strip()
+        if not doc.startswith("DOC-"):
+            return None
+        session = self.sessions.get(doc)
+        if session is None:
+            session = self.sessions.setdefault(doc, SessionStats(doc))
+        return session
+
+    def _refresh_session_card(self, dt):
+        session = self.current_session()
+        self.session_label.text = session.format_card() if session is not None else ""
+
+    def export_session(self, instance):
+        session = self.current_session()
+        if session is None or not session.count:
+            show_snackbar("No fish counted for this DOC yet.")
+            return
+        path = session.export(SESSION_DIR)
+        print(f"✅ Session summary for {session.doc} ({session.count} fish) written to {path}")
+        show_snackbar(f"Session exported: {os.path.basename(path)}")
+
+    def on_model_ready(self, model):
+        if TILED_INFERENCE:
+            from tiled_inference import TiledDetector
+
+            model = TiledDetector(
+                model,
+                overlap=TILE_OVERLAP,
+                conf=CONF_THRESHOLD,
+                tile_conf=TILE_CONF_THRESHOLD,
+                latency_budget_ms=TILE_LATENCY_BUDGET_MS,
+                max_batch=MAX_BATCH,
+                workers=TILE_WORKERS,
+                load=load_model,
+            )
+        self.model = model
+        if self.engine is not None:
+            self.engine.set_model(model)
+        for camera in self.cameras:
+            camera.model = model
+        loader = self.model_loader
+        self.info_label.text = f"Model ready (load {loader.load_seconds:.1f}s, warm-up {loader.warmup_seconds or 0:.1f}s)"
+        self.start_button.text = "Start Camera"
+        self.start_button.disabled = False
+
+    def on_model_error(self, error):
+        self.info_label.text = f"Model failed to load: {error}"
+        show_snackbar(f"Model failed to load: {error}")
+        self.start_button.text = "Model unavailable"
+
+    def on_stop(self):
+        for camera in self.cameras:
+            camera.stop()
+        if self.engine is not None:
+            self.engine.stop()
+        if TILED_INFERENCE and self.model is not None:
+            self.model.close()
+        for camera in self.cameras:
+            camera.frame_writer.close()
+        self.close_services()
+        self.metrics_exporter.stop()
+        for session in self.sessions.values():
+            if session.count:
+                session.export(SESSION_DIR)
+
     def start_camera(self, instance):
-        self.camera_widget.start()
-        self.start_button.disabled = True
-        self.stop_button.disabled = False
+        started = [camera.start() for camera in self.cameras]
+        # Leave Start enabled when no camera could be opened.
+        if any(started):
+            self.start_button.disabled = True
+            self.stop_button.disabled = False
 
     def stop_camera(self, instance):
-        self.camera_widget.stop()
+        for camera in self.cameras:
+            camera.stop()
         self.start_button.disabled = False
         self.stop_button.disabled = True
 
+    def toggle_metrics(self, instance):
+        """Show/hide the per-stage latency overlay; it refreshes twice a second while visible."""
+        if self._metrics_event is None:
+            self._metrics_event = Clock.schedule_interval(self._refresh_metrics_overlay, 0.5)
+            self._refresh_metrics_overlay(0)
+            self.metrics_label.opacity = 1
+            self.metrics_button.text = "Hide Metrics"
+            return
+        self._metrics_event.cancel()
+        self._metrics_event = None
+        self.metrics_label.opacity = 0
+        self.metrics_button.text = "Show Metrics"
+
+    def _refresh_metrics_overlay(self, dt):
+        if not self.metrics.enabled:
+            self.metrics_label.text = "Metrics disabled (METRICS=0)"
+            return
+        text = self.metrics.format_overlay()
+        if self.engine is not None:
+            text += f"\n{self.engine.format_stats()}"
+        if TILED_INFERENCE and self.model is not None:
+            text += f" | {self.model.format_stats()}"
+        self.metrics_label.text = text
+
     def get_weight(self, instance):
         doc_text = self.doc_field.text.strip()
 
         if not doc_text or not doc_text.startswith("DOC-"):
-            Snackbar(text="Please enter a valid DOC number.").open()
+            show_snackbar("Please enter a valid DOC number.")
+            return
+
+        if self.api_client is None:
+            show_snackbar("Still starting up, try again in a moment.")
+            return
+
+        # Resolve the DOC on the API worker first, so a mistyped DOC is caught before anything is queued.
+        self.api_client.resolve_doc_async(
+            doc_text,
+            on_done=self._on_doc_resolved,
+            dispatch=lambda fn: Clock.schedule_once(lambda dt: fn()),
+        )
+
+    def _on_doc_resolved(self, doc, sampling_id, error):
+        # Loaded by start_services already; imported here to keep them off the startup path.
+        import requests
+        from weight_client import ApiError
+
+        if error is not None:
+            offline = isinstance(error, requests.RequestException) or (
+                isinstance(error, ApiError) and (error.status_code or 0) >= 500
+            )
+            if not offline:
+                show_snackbar(f"DOC lookup failed: {error}")
+                return
+            # Offline: queue anyway; the uploader validates the DOC once the API is reachable.
+            print(f"📴 DOC lookup unavailable ({error}); queueing {doc} unverified")
+        elif sampling_id is None:
+            show_snackbar(f"Sampling with DOC {doc} not found.")
             return
 
-        self.camera_widget.fetch_weight_from_api(doc_text)
+        for camera in self.cameras:
+            camera.fetch_weight_from_api(doc, sampling_id)
 
 
 
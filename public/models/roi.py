@@ -0,0 +1,375 @@
+"""
+Region-of-interest cropping: run the model on the measuring tray, not the room.
+
+The fish only ever lie in the tray, which often covers less than half of a
+1280x720 frame. Feeding the whole frame wastes inference time on background
+pixels, and the fish shrink more when the frame is resized to the model input.
+`RoiCropper` finds the tray once, crops every frame to it before inference and
+shifts the boxes back to full-frame coordinates, so measurement, tracking and
+calibration are unchanged.
+
+The ROI is either fixed (a user-drawn rectangle, see `select` below) or found
+automatically: the largest roughly rectangular contour in the edge map, padded by
+a margin. An automatic ROI is cached. About once a second a 32x18 grayscale
+thumbnail of the frame is compared with the one the ROI was found in, and only a
+large change (camera moved, tray swapped, lights changed) triggers a new search.
+Fish moving inside the tray barely change the thumbnail, so the check costs a
+fraction of a millisecond per second. While no tray is found, frames run
+uncropped.
+
+`stats()` reports the share of pixels saved. With `benchmark=True` the
+inference thread also times the model on the crop and on the full frame once
+each time the ROI changes (`compare`, four extra model calls) and reports the
+latency difference; leave it off in production.
+
+Usage:
+    # Draw the tray on a frame and print the rectangle for ROI_RECTS
+    python roi.py select frame.jpg
+
+    # Show what the automatic detection finds
+    python roi.py detect frame.jpg -o roi.jpg
+
+    # Full frame vs ROI on a recording: pixels saved, latency, detections
+    python roi.py bench replay:recording.npy --frames 100
+"""
+
+import argparse
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from detection import to_numpy
+from tiled_inference import TiledBoxes
+
+THUMBNAIL_SIZE = (32, 18)
+
+
+def parse_rect(text):
+    """`"x1,y1,x2,y2"` → int tuple, or None for an empty string."""
+    if not text or not text.strip():
+        return None
+    values = [int(float(v)) for v in text.split(",")]
+    if len(values) != 4 or values[2] <= values[0] or values[3] <= values[1]:
+        raise ValueError(f"Invalid ROI rectangle: {text!r} (expected x1,y1,x2,y2)")
+    return tuple(values)
+
+
+def detect_tray(frame, min_area=0.05, max_area=0.9, min_fill=0.6):
+    """
+    Bounding rectangle `(x1, y1, x2, y2)` of the tray, or None.
+
+    Picks the largest external contour of the closed edge map whose bounding box
+    covers between `min_area` and `max_area` of the frame and which fills at
+    least `min_fill` of that box (i.e. is roughly rectangular).
+    """
+    height, width = frame.shape[:2]
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    # Edges on a half-size copy: the tray outline is large, and this is 4x cheaper.
+    small = cv2.resize(gray, (width // 2, height // 2), interpolation=cv2.INTER_AREA)
+    small = cv2.GaussianBlur(small, (5, 5), 0)
+    edges = cv2.Canny(small, 40, 120)
+    edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, np.ones((7, 7), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    frame_area = float(small.shape[0] * small.shape[1])
+    best, best_area = None, 0.0
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        box_area = float(w * h)
+        if not min_area * frame_area <= box_area <= max_area * frame_area:
+            continue
+        fill = cv2.contourArea(cv2.convexHull(contour)) / box_area
+        if fill >= min_fill and box_area > best_area:
+            best, best_area = (x * 2, y * 2, (x + w) * 2, (y + h) * 2), box_area
+    return best
+
+
+def thumbnail(frame):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.resize(gray, THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+
+class RoiCropper:
+    """
+    Args:
+        rect: Fixed `(x1, y1, x2, y2)` drawn by the user; None detects the tray.
+        margin: Fraction of the detected tray size added on every side.
+        min_area / max_area: Accepted tray size as a fraction of the frame. A
+            bigger ROI saves too little to be worth cropping.
+        check_interval: Seconds between scene-change checks (and between
+            detection attempts while no tray is found).
+        change_threshold: Mean absolute thumbnail difference (0-255) that
+            counts as a new scene.
+        align: ROI edges are widened to multiples of this (the model stride).
+        benchmark: Time the model on the full frame and the ROI whenever the
+            ROI changes (see `compare`).
+    """
+
+    def __init__(
+        self,
+        rect=None,
+        margin=0.03,
+        min_area=0.05,
+        max_area=0.9,
+        check_interval=1.0,
+        change_threshold=20.0,
+        align=32,
+        benchmark=False,
+    ):
+        self.fixed = rect is not None
+        self.margin = margin
+        self.min_area = min_area
+        self.max_area = max_area
+        self.check_interval = check_interval
+        self.change_threshold = change_threshold
+        self.align = align
+        self.benchmark = benchmark
+
+        self.rect = rect
+        # Frame-clipped ROI of the last `crop` (None: full frame).
+        self.last_rect = None
+        self.detections = 0
+        self.needs_comparison = benchmark and rect is not None
+        self._outside_reported = False
+        self._thumbnail = None
+        self._last_check = 0.0
+        self._pixels_total = 0
+        self._pixels_inferred = 0
+        self._full_ms = None
+        self._roi_ms = None
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Forget an automatic ROI (a fixed one stays)."""
+        with self._lock:
+            if not self.fixed:
+                self.rect = None
+            self._thumbnail = None
+            self._last_check = 0.0
+
+    def _fit(self, rect, frame_shape):
+        """Pad (automatic ROIs), align outward to `align` and clip to the frame; None if nothing is left."""
+        height, width = frame_shape[:2]
+        x1, y1, x2, y2 = rect
+        if not self.fixed:
+            pad_x, pad_y = int((x2 - x1) * self.margin), int((y2 - y1) * self.margin)
+            x1, y1, x2, y2 = x1 - pad_x, y1 - pad_y, x2 + pad_x, y2 + pad_y
+        if self.align > 1:
+            x1, y1 = x1 // self.align * self.align, y1 // self.align * self.align
+            x2, y2 = -(-x2 // self.align) * self.align, -(-y2 // self.align) * self.align
+        x1, y1, x2, y2 = max(0, x1), max(0, y1), min(width, x2), min(height, y2)
+        if x2 <= x1 or y2 <= y1:
+            return None
+        return x1, y1, x2, y2
+
+    def roi_for(self, frame):
+        """The ROI to use for this frame, or None for the full frame."""
+        if self.fixed:
+            rect = self._fit(self.rect, frame.shape)
+            if rect is None and not self._outside_reported:
+                self._outside_reported = True
+                print(f"⚠️ ROI {self.rect} lies outside the {frame.shape[1]}x{frame.shape[0]} frame; using the full frame")
+            return rect
+
+        now = time.perf_counter()
+        with self._lock:
+            if now - self._last_check < self.check_interval:
+                return self.rect
+            self._last_check = now
+            current = thumbnail(frame)
+            if self.rect is not None and self._thumbnail is not None:
+                if float(np.abs(current - self._thumbnail).mean()) < self.change_threshold:
+                    return self.rect
+
+            found = detect_tray(frame, self.min_area, self.max_area)
+            rect = self._fit(found, frame.shape) if found is not None else None
+            if rect is not None and (rect[2] - rect[0]) * (rect[3] - rect[1]) > self.max_area * frame.shape[0] * frame.shape[1]:
+                rect = None
+            if rect != self.rect:
+                self.detections += 1
+                self.needs_comparison = self.benchmark and rect is not None
+                print(f"🔲 ROI {'set to ' + str(rect) if rect else 'cleared'}")
+            self.rect = rect
+            self._thumbnail = current
+            return rect
+
+    def crop(self, frame):
+        """`(model_input, offset)`; offset is None when the full frame is used."""
+        rect = self.roi_for(frame)
+        pixels = frame.shape[0] * frame.shape[1]
+        with self._lock:
+            self.last_rect = rect
+            self._pixels_total += pixels
+            if rect is None:
+                self._pixels_inferred += pixels
+                return frame, None
+            x1, y1, x2, y2 = rect
+            self._pixels_inferred += (x2 - x1) * (y2 - y1)
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    @staticmethod
+    def restore(boxes, offset):
+        """Shift boxes detected in the crop back to full-frame coordinates."""
+        if offset is None or boxes is None or len(boxes) == 0:
+            return boxes
+        dx, dy = offset
+        xyxy = to_numpy(boxes.xyxy).reshape(-1, 4).astype(np.float32) + np.array([dx, dy, dx, dy], dtype=np.float32)
+        return TiledBoxes(xyxy, to_numpy(boxes.conf).reshape(-1), to_numpy(boxes.cls).reshape(-1))
+
+    def compare(self, model, frame, imgsz=640, repeat=2):
+        """Time the model on the full frame and on the ROI (best of `repeat`) for `stats()`."""
+        self.needs_comparison = False
+        rect = self.last_rect
+        if rect is None:
+            return
+        x1, y1, x2, y2 = rect
+        crop = frame[y1:y2, x1:x2]
+
+        def best_ms(image):
+            times = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                model(image, imgsz=imgsz, verbose=False)
+                times.append((time.perf_counter() - started) * 1000.0)
+            return min(times)
+
+        full_ms, roi_ms = best_ms(frame), best_ms(crop)
+        with self._lock:
+            self._full_ms, self._roi_ms = full_ms, roi_ms
+
+    def stats(self):
+        with self._lock:
+            saved = 1.0 - self._pixels_inferred / self._pixels_total if self._pixels_total else 0.0
+            return {
+                "roi": list(self.last_rect) if self.last_rect is not None else None,
+                "mode": "fixed" if self.fixed else "auto",
+                "detections": self.detections,
+                "pixels_saved_pct": round(saved * 100.0, 1),
+                "full_frame_ms": round(self._full_ms, 1) if self._full_ms is not None else None,
+                "roi_ms": round(self._roi_ms, 1) if self._roi_ms is not None else None,
+                "latency_saved_ms": round(self._full_ms - self._roi_ms, 1) if self._roi_ms is not None else None,
+            }
+
+    def format_stats(self):
+        s = self.stats()
+        if s["roi"] is None:
+            return "ROI: full frame"
+        x1, y1, x2, y2 = s["roi"]
+        text = f"ROI {x2 - x1}x{y2 - y1} (-{s['pixels_saved_pct']:.0f}% px)"
+        if s["roi_ms"] is not None:
+            text += f", {s['full_frame_ms']:.0f} → {s['roi_ms']:.0f} ms"
+        return text
+
+
+def _read_frame(spec):
+    image = cv2.imread(spec)
+    if image is not None:
+        return image
+    from frame_source import open_source
+
+    source = open_source(spec)
+    try:
+        for _ in range(30):
+            ok, frame = source.read()
+            if ok:
+                return frame.copy()
+    finally:
+        source.release()
+    raise RuntimeError(f"Could not read a frame from {spec}")
+
+
+def bench(spec, frames, rect=None, imgsz=640):
+    """Run the model on full frames and on ROI crops of the same frames."""
+    from benchmark_models import percentiles
+    from detection import CONF_THRESHOLD, load_model
+    from frame_source import open_source
+
+    model = load_model()
+    cropper = RoiCropper(rect, check_interval=0.0)
+    source = open_source(spec)
+    full_ms, roi_ms, full_count, roi_count = [], [], 0, 0
+    try:
+        for index in range(frames + 1):
+            ok, frame = source.read()
+            if not ok:
+                break
+            crop, offset = cropper.crop(frame)
+
+            started = time.perf_counter()
+            full = model(frame, imgsz=imgsz, verbose=False)[0].boxes
+            full_time = (time.perf_counter() - started) * 1000.0
+            started = time.perf_counter()
+            boxes = cropper.restore(model(crop, imgsz=imgsz, verbose=False)[0].boxes, offset)
+            roi_time = (time.perf_counter() - started) * 1000.0
+            if index == 0:
+                continue  # warm-up
+            full_ms.append(full_time)
+            roi_ms.append(roi_time)
+            full_count += int((to_numpy(full.conf) >= CONF_THRESHOLD).sum()) if len(full) else 0
+            roi_count += int((to_numpy(boxes.conf) >= CONF_THRESHOLD).sum()) if len(boxes) else 0
+    finally:
+        source.release()
+
+    return {
+        "frames": len(full_ms),
+        "roi": cropper.stats(),
+        "full_frame_ms": percentiles(full_ms),
+        "roi_ms": percentiles(roi_ms),
+        "detections": {"full_frame": full_count, "roi": roi_count},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measuring-tray ROI tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    select = sub.add_parser("select", help="Draw the ROI on a frame and print it")
+    select.add_argument("source", help="Image path or frame source spec")
+
+    detect = sub.add_parser("detect", help="Run the automatic tray detection on a frame")
+    detect.add_argument("source", help="Image path or frame source spec")
+    detect.add_argument("-o", "--output", default=None, help="Write the frame with the ROI drawn")
+
+    bench_parser = sub.add_parser("bench", help="Compare full-frame and ROI inference")
+    bench_parser.add_argument("source", help="Frame source spec (e.g. replay:recording.npy?fps=0)")
+    bench_parser.add_argument("--frames", type=int, default=100)
+    bench_parser.add_argument("--rect", type=parse_rect, default=None, help="Fixed x1,y1,x2,y2 instead of detection")
+    bench_parser.add_argument("--imgsz", type=int, default=640)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        import json
+
+        print(json.dumps(bench(args.source, args.frames, args.rect, args.imgsz), indent=2))
+        return 0
+
+    frame = _read_frame(args.source)
+    if args.command == "select":
+        x, y, w, h = cv2.selectROI("Draw the measuring tray, then press Enter", frame, showCrosshair=False)
+        cv2.destroyAllWindows()
+        if not w or not h:
+            print("❌ No ROI drawn")
+            return 1
+        print(f"{x},{y},{x + w},{y + h}")
+        return 0
+
+    cropper = RoiCropper()
+    rect = cropper.roi_for(frame)
+    if rect is None:
+        print("❌ No tray found; frames would run uncropped")
+        return 1
+    x1, y1, x2, y2 = rect
+    saved = 1.0 - (x2 - x1) * (y2 - y1) / (frame.shape[0] * frame.shape[1])
+    print(f"✅ ROI {x1},{y1},{x2},{y2} ({saved:.0%} of the pixels saved)")
+    if args.output:
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 200, 255), 2)
+        cv2.imwrite(args.output, frame)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Running statistics for one sampling session (one DOC), in constant memory.
+
+The app used to keep only the last box's width/length/weight. `SessionStats`
+folds every counted fish into fixed-size accumulators as it arrives:
+
+* count, mean, variance, min and max of length, width and estimated weight
+  (Welford's online algorithm, numerically stable for long sessions);
+* a fixed-bin length histogram;
+* Starter/Grower/Finisher counts and proportions.
+
+Memory does not grow with the session length, so a cage's ABW can be sanity
+checked on the device before anything is uploaded. The unit is a fish, not a
+frame: the app adds each tracked fish once, when its track locks, so a fish
+that stays in view for 200 frames counts once.
+
+Usage:
+    stats = SessionStats("DOC-20251117-04481")
+    stats.add(length_in, width_in)          # scalars or arrays
+    print(stats.format_card())
+    stats.export("sessions/")
+"""
+
+import json
+import math
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from detection import STAGES, classify_stages, estimate_weight_g
+
+
+class RunningStats:
+    """Welford mean/variance plus min/max of a stream of values."""
+
+    __slots__ = ("count", "mean", "_m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values):
+        """Fold in a scalar or an array (merged with Chan et al.'s parallel update)."""
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        n = len(values)
+        if not n:
+            return
+        batch_mean = float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum())
+
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += batch_m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    @property
+    def variance(self):
+        """Sample variance (n - 1), 0 until there are two values."""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def to_dict(self, digits=3):
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": round(self.mean, digits),
+            "std": round(self.std, digits),
+            "min": round(self.min, digits),
+            "max": round(self.max, digits),
+        }
+
+
+class FixedHistogram:
+    """
+    Args:
+        low / high: Range covered by the bins; values outside go to the under/overflow counts.
+        bins: Number of equal-width bins.
+    """
+
+    def __init__(self, low, high, bins):
+        self.low = low
+        self.high = high
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        self.underflow += int(np.count_nonzero(values < self.low))
+        self.overflow += int(np.count_nonzero(values >= self.high))
+        inside = values[(values >= self.low) & (values < self.high)]
+        index = ((inside - self.low) / (self.high - self.low) * len(self.counts)).astype(np.int64)
+        np.add.at(self.counts, np.minimum(index, len(self.counts) - 1), 1)
+
+    def to_dict(self):
+        return {
+            "low": self.low,
+            "high": self.high,
+            "bins": len(self.counts),
+            "counts": self.counts.tolist(),
+            "underflow": self.underflow,
+            "overflow": self.overflow,
+        }
+
+
+class SessionStats:
+    """
+    Args:
+        doc: DOC number of the sampling.
+        length_range: `(low, high, bins)` of the length histogram, in inches.
+    """
+
+    def __init__(self, doc, length_range=(0.0, 12.0, 24)):
+        self.doc = doc
+        self.started = datetime.now()
+        self.length = RunningStats()
+        self.width = RunningStats()
+        self.weight = RunningStats()
+        self.histogram = FixedHistogram(*length_range)
+        self.stage_counts = np.zeros(len(STAGES), dtype=np.int64)
+        self._lock = threading.Lock()
+
+    @property
+    def count(self):
+        return self.length.count
+
+    def add(self, length_in, width_in):
+        """Add one fish (scalars) or several (arrays)."""
+        length_in = np.asarray(length_in, dtype=np.float64).reshape(-1)
+        width_in = np.asarray(width_in, dtype=np.float64).reshape(-1)
+        weight_g = estimate_weight_g(length_in, width_in)
+        stages = classify_stages(length_in)
+        with self._lock:
+            self.length.add(length_in)
+            self.width.add(width_in)
+            self.weight.add(weight_g)
+            self.histogram.add(length_in)
+            self.stage_counts += np.bincount(stages, minlength=len(STAGES))
+
+    def proportions(self):
+        total = int(self.stage_counts.sum())
+        return {stage: round(int(c) / total, 3) if total else 0.0 for stage, c in zip(STAGES, self.stage_counts)}
+
+    def summary(self):
+        with self._lock:
+            return {
+                "doc": self.doc,
+                "started": self.started.isoformat(timespec="seconds"),
+                "updated": datetime.now().isoformat(timespec="seconds"),
+                "fish": self.count,
+                "length_in": self.length.to_dict(),
+                "width_in": self.width.to_dict(),
+                "weight_g": self.weight.to_dict(digits=2),
+                "stages": dict(zip(STAGES, self.stage_counts.tolist())),
+                "stage_proportions": self.proportions(),
+                "length_histogram": self.histogram.to_dict(),
+            }
+
+    def format_card(self):
+        """Kivy markup lines for the info card."""
+        with self._lock:
+            if not self.count:
+                return f"[b]Session:[/b] [color=cccccc]{self.doc} - no fish counted yet[/color]"
+            shares = " / ".join(f"{stage[0]} {share:.0%}" for stage, share in self.proportions().items())
+            return (
+                f"[b]Session:[/b] [color=cccccc]{self.doc}[/color] [b]n=[/b][color=00ffcc]{self.count}[/color]\n"
+                f"[b]ABW:[/b] [color=00ffcc]{self.weight.mean:.1f}[/color] ± {self.weight.std:.1f} g  "
+                f"[b]L:[/b] {self.length.mean:.2f} ± {self.length.std:.2f} in\n"
+                f"[b]Stages:[/b] {shares}"
+            )
+
+    def export(self, directory):
+        """Write the summary as `<directory>/<doc>_session.json` and return the path."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{self.doc}_session.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        os.replace(tmp_path, path)
+        return path
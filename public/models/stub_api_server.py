@@ -0,0 +1,341 @@
+"""
+Local stand-in for the SFM API (`routes/api.php`), for exercising the Python
+clients without the Laravel app.
+
+It serves `/api/cages` (with `fields`, `sampling_fields` and `per_page`),
+`/api/samplings/lookup`, `/api/weight` and `/api/weight/bulk` from in-memory data
+shaped like the real responses, with the same weight formula, 5-slot sampling rule,
+idempotency keys and ETag/If-None-Match handling as `DocsController`. Optional
+latency makes client behaviour on slow links reproducible.
+
+Usage:
+python stub_api_server.py --cages 300 --samplings 20 --port 8765
+API_BASE_URL=http://127.0.0.1:8765 API_KEY=stub-key python redRilapia.py
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SAMPLES_PER_SAMPLING = 5
+MAX_PER_PAGE = 200
+LOOKUP_FIELDS = ("id", "doc", "cage_no", "investor_id", "date_sampling", "updated_at")
+
+
+def calculate_weight(height, width, unit="cm"):
+    """Port of the formula in DocsController::getWeight (returns grams, length_cm, width_cm)."""
+    if unit == "in":
+        height *= 2.54
+        width *= 2.54
+    length_cm = max(height, width)
+    width_cm = min(height, width)
+    height_in = (length_cm * 0.3937) * 1.9
+    width_in = width_cm * 0.3937
+    weight = (width_in * (height_in * height_in)) / 690
+    return weight * 453.592, length_cm, width_cm
+
+
+class StubApi:
+    """In-memory cages/samplings/samples."""
+
+    def __init__(self, api_key="stub-key", cages=50, samplings_per_cage=10, latency=0.0):
+        self.api_key = api_key
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.idempotency = {}
+
+        self.cages = []
+        self.samplings = {}
+        sampling_id = 1
+        for cage_id in range(1, cages + 1):
+            cage = {
+                "id": cage_id,
+                "investor_id": 1,
+                "feed_types_id": 1,
+                "number_of_fingerlings": 1000,
+                "samplings": [],
+                "investor": {"id": 1, "name": "Stub Investor", "address": "Stub Farm", "phone": "0000"},
+                "feed_type": {"id": 1, "feed_type": "Starter Mash", "brand": "Stub Feeds"},
+            }
+            for n in range(samplings_per_cage):
+                sampling = {
+                    "id": sampling_id,
+                    "investor_id": 1,
+                    "date_sampling": "2026-01-01",
+                    "doc": f"DOC-STUB-{cage_id:04d}-{n:02d}",
+                    "cage_no": str(cage_id),
+                    "mortality": 0,
+                    "created_at": "2026-01-01T00:00:00.000000Z",
+                    "updated_at": "2026-01-01T00:00:00.000000Z",
+                }
+                cage["samplings"].append(sampling)
+                self.samplings[sampling["doc"]] = {"sampling": sampling, "samples": []}
+                sampling_id += 1
+            self.cages.append(cage)
+
+    def count(self, path):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def add_weight(self, body):
+        doc = body.get("doc")
+        errors = {}
+        for field in ("height", "width", "doc"):
+            if body.get(field) in (None, ""):
+                errors[field] = [f"The {field} field is required."]
+        if not errors and doc not in self.samplings:
+            errors["doc"] = ["The selected doc is invalid."]
+        if errors:
+            return 422, {"errors": errors}
+
+        weight, length_cm, width_cm = calculate_weight(float(body["height"]), float(body["width"]), body.get("unit") or "cm")
+        with self.lock:
+            entry = self.samplings[doc]
+            if len(entry["samples"]) >= SAMPLES_PER_SAMPLING:
+                return 422, {"message": "All data is filled in this sampling."}
+            entry["samples"].append({"weight": round(weight, 3), "length": round(length_cm, 2), "width": round(width_cm, 2)})
+            total = sum(s["weight"] for s in entry["samples"])
+            filled = len(entry["samples"])
+
+        return 200, {
+            "message": "Successfully get the fish weight",
+            "data": {
+                "weight": round(weight, 3),
+                "sample_no": str(filled),
+                "abw": round(total / filled, 3),
+                "total_weight": round(total, 3),
+                "remaining_samples": SAMPLES_PER_SAMPLING - filled,
+            },
+        }
+
+    def add_weights_bulk(self, body):
+        measurements = body.get("measurements")
+        if not isinstance(measurements, list) or not measurements:
+            return 422, {"errors": {"measurements": ["The measurements field is required."]}}
+
+        # Field validation fails the whole request, like Laravel's validator.
+        errors = {}
+        for index, measurement in enumerate(measurements):
+            for field in ("height", "width"):
+                value = measurement.get(field)
+                if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+                    errors[f"measurements.{index}.{field}"] = [f"The measurements.{index}.{field} field must be a number of at least 0."]
+            if not isinstance(measurement.get("doc"), str) or not measurement["doc"]:
+                errors[f"measurements.{index}.doc"] = [f"The measurements.{index}.doc field is required."]
+            if measurement.get("unit") not in (None, "cm", "in"):
+                errors[f"measurements.{index}.unit"] = [f"The selected measurements.{index}.unit is invalid."]
+        if errors:
+            return 422, {"errors": errors}
+
+        results = []
+        samplings = {}
+        for index, measurement in enumerate(measurements):
+            key = measurement.get("idempotency_key")
+            doc = measurement.get("doc")
+            result = {"index": index, "idempotency_key": key, "doc": doc}
+
+            with self.lock:
+                previous = self.idempotency.get(key) if key else None
+            if previous is not None:
+                results.append({**result, "status": "duplicate", **previous})
+                continue
+
+            status, payload = self.add_weight(measurement)
+            if status != 200:
+                message = payload.get("message") or next(iter(payload.get("errors", {}).values()), ["Invalid"])[0]
+                results.append({**result, "status": "rejected", "message": message})
+                continue
+
+            data = payload["data"]
+            stored = {"sample_no": data["sample_no"], "weight": data["weight"]}
+            if key:
+                with self.lock:
+                    self.idempotency[key] = stored
+            results.append({**result, "status": "created", **stored})
+            samplings[doc] = {k: data[k] for k in ("abw", "total_weight", "remaining_samples")}
+
+        counts = {status: sum(1 for r in results if r["status"] == status) for status in ("created", "duplicate", "rejected")}
+        return 200, {
+            "message": "Bulk weights processed",
+            "data": {
+                "created": counts["created"],
+                "duplicates": counts["duplicate"],
+                "rejected": counts["rejected"],
+                "results": results,
+                "samplings": samplings,
+            },
+        }
+
+    def cages_payload(self, query):
+        """GET /api/cages with the optional fields / sampling_fields / per_page / page parameters."""
+
+        def fields(name, required):
+            value = query.get(name, [""])[0]
+            return None if not value else set(required) | {f.strip() for f in value.split(",")}
+
+        cage_fields = fields("fields", ["id"])
+        sampling_fields = fields("sampling_fields", ["id", "cage_no"])
+        cages = self.cages
+        if cage_fields is not None or sampling_fields is not None:
+            cages = [
+                {
+                    # Lean payloads never include the investor / feed type relations.
+                    **{
+                        k: v
+                        for k, v in cage.items()
+                        if k not in ("samplings", "investor", "feed_type") and (cage_fields is None or k in cage_fields)
+                    },
+                    "samplings": [
+                        {k: v for k, v in s.items() if sampling_fields is None or k in sampling_fields} for s in cage["samplings"]
+                    ],
+                }
+                for cage in cages
+            ]
+
+        per_page = query.get("per_page", [""])[0]
+        if not per_page:
+            return 200, {"message": "Cages fetch successfully", "data": cages}
+        per_page = max(1, min(MAX_PER_PAGE, int(per_page)))
+        page = max(1, int(query.get("page", ["1"])[0]))
+        last_page = max(1, -(-len(cages) // per_page))
+        return 200, {
+            "message": "Cages fetch successfully",
+            "data": cages[(page - 1) * per_page:page * per_page],
+            "meta": {"current_page": page, "last_page": last_page, "per_page": per_page, "total": len(cages)},
+        }
+
+    def lookup(self, doc):
+        if not doc:
+            return 422, {"errors": {"doc": ["The doc field is required."]}}
+        entry = self.samplings.get(doc)
+        if entry is None:
+            return 404, {"message": "Sampling not found for this DOC.", "data": None}
+        sampling = entry["sampling"]
+        return 200, {"message": "Sampling found", "data": {k: sampling[k] for k in LOOKUP_FIELDS if k in sampling}}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    api = None  # set by make_server
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_conditional(self, status, payload):
+        """Like `_send`, with a strong ETag and 304 for a matching If-None-Match."""
+        if status != 200:
+            return self._send(status, payload)
+        etag = '"' + hashlib.md5(json.dumps(payload).encode()).hexdigest() + '"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag in (self.headers.get("If-None-Match") or ""):
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        return self._send(status, payload, headers)
+
+    def _authorized(self, query):
+        return query.get("key", [None])[0] == self.api.api_key
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.api.count(url.path)
+        if self.api.latency:
+            time.sleep(self.api.latency)
+
+        if not self._authorized(query):
+            return self._send(422, {"message": "Key is required or the key is invalid"})
+
+        if url.path == "/api/cages":
+            return self._send_conditional(*self.api.cages_payload(query))
+
+        if url.path == "/api/samplings/lookup":
+            return self._send_conditional(*self.api.lookup(query.get("doc", [""])[0]))
+
+        return self._send(404, {"message": "Not Found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.api.count(url.path)
+        body = self._read_json()
+        if self.api.latency:
+            time.sleep(self.api.latency)
+
+        if not self._authorized(query):
+            return self._send(422, {"message": "Key is required or the key is invalid"})
+
+        if url.path == "/api/weight":
+            return self._send(*self.api.add_weight(body))
+
+        if url.path == "/api/weight/bulk":
+            return self._send(*self.api.add_weights_bulk(body))
+
+        return self._send(404, {"message": "Not Found"})
+
+
+def make_server(api, host="127.0.0.1", port=0):
+    handler = type("BoundStubHandler", (StubHandler,), {"api": api})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve_in_thread(api, host="127.0.0.1", port=0):
+    """Start a server on a daemon thread; returns `(server, base_url)`."""
+    server = make_server(api, host, port)
+    thread = threading.Thread(target=server.serve_forever, name="stub-api", daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the SFM API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--key", default="stub-key", help="API key clients must send")
+    parser.add_argument("--cages", type=int, default=50)
+    parser.add_argument("--samplings", type=int, default=10, help="Samplings per cage")
+    parser.add_argument("--latency", type=float, default=0.0, help="Artificial delay per request, seconds")
+    args = parser.parse_args(argv)
+
+    api = StubApi(args.key, args.cages, args.samplings, args.latency)
+    server = make_server(api, args.host, args.port)
+    print(f"🧪 Stub API on http://{args.host}:{server.server_address[1]} ({len(api.samplings)} samplings, key={args.key})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Tests for `metrics.MetricsExporter` output files.
+
+Usage:
+    cd public/models && python -m pytest -q test_metrics.py
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from metrics import Metrics, MetricsExporter
+
+
+class MetricsExporterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "metrics.jsonl")
+        self.metrics = Metrics()
+        self.metrics.record("inference", 0.02)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_jsonl_is_rotated_and_old_files_dropped(self):
+        exporter = MetricsExporter(self.metrics, self.path, max_bytes=500, backups=2)
+        for _ in range(50):
+            exporter.flush()
+
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["metrics.jsonl", "metrics.jsonl.1", "metrics.jsonl.2"])
+        for name in os.listdir(self.tmp.name):
+            path = os.path.join(self.tmp.name, name)
+            self.assertLess(os.path.getsize(path), 1000)
+            with open(path) as f:
+                self.assertIn("inference", json.loads(f.readline())["spans"])
+
+    def test_no_rotation_without_max_bytes(self):
+        exporter = MetricsExporter(self.metrics, self.path, max_bytes=0)
+        for _ in range(20):
+            exporter.flush()
+        self.assertEqual(os.listdir(self.tmp.name), ["metrics.jsonl"])
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
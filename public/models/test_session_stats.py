@@ -0,0 +1,96 @@
+"""
+Tests for `session_stats`: the batched Welford merge, the histogram and the
+per-session summary.
+
+Usage:
+    cd public/models && python -m pytest -q test_session_stats.py
+"""
+
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from detection import STAGES, classify_stages
+from session_stats import FixedHistogram, RunningStats, SessionStats
+
+
+class RunningStatsTest(unittest.TestCase):
+    def test_batches_match_numpy(self):
+        rng = np.random.default_rng(0)
+        values = rng.normal(5.0, 1.5, 1000)
+        stats = RunningStats()
+        start = 0
+        for size in [1, 7, 0, 250, 1, 741]:
+            stats.add(values[start:start + size])
+            start += size
+
+        self.assertEqual(stats.count, 1000)
+        self.assertAlmostEqual(stats.mean, values.mean(), places=10)
+        self.assertAlmostEqual(stats.variance, values.var(ddof=1), places=10)
+        self.assertEqual(stats.min, values.min())
+        self.assertEqual(stats.max, values.max())
+
+    def test_scalars_match_batches(self):
+        values = [3.1, 4.2, 2.9, 5.5, 4.0]
+        one_by_one, batched = RunningStats(), RunningStats()
+        for value in values:
+            one_by_one.add(value)
+        batched.add(values)
+        self.assertAlmostEqual(one_by_one.mean, batched.mean)
+        self.assertAlmostEqual(one_by_one.variance, batched.variance)
+
+    def test_stable_with_a_large_offset(self):
+        values = 1e9 + np.array([4.0, 7.0, 13.0, 16.0])
+        stats = RunningStats()
+        stats.add(values[:2])
+        stats.add(values[2:])
+        self.assertAlmostEqual(stats.variance, 30.0, places=6)
+
+    def test_variance_is_zero_until_two_values(self):
+        stats = RunningStats()
+        self.assertEqual(stats.to_dict(), {"count": 0})
+        stats.add(4.0)
+        self.assertEqual(stats.variance, 0.0)
+
+
+class FixedHistogramTest(unittest.TestCase):
+    def test_bins_and_overflow(self):
+        histogram = FixedHistogram(0.0, 12.0, 24)
+        histogram.add([-1.0, 0.0, 0.49, 0.5, 11.99, 12.0, 20.0])
+        self.assertEqual(histogram.underflow, 1)
+        self.assertEqual(histogram.overflow, 2)
+        self.assertEqual(histogram.counts[0], 2)
+        self.assertEqual(histogram.counts[1], 1)
+        self.assertEqual(histogram.counts[-1], 1)
+        self.assertEqual(int(histogram.counts.sum()), 4)
+
+
+class SessionStatsTest(unittest.TestCase):
+    def test_summary_counts_fish_and_stages(self):
+        lengths = [2.0, 2.5, 5.0, 7.5, 9.0]
+        session = SessionStats("DOC-TEST")
+        session.add(lengths[:2], [0.6, 0.7])
+        session.add(lengths[2:], [1.5, 2.2, 2.8])
+
+        summary = session.summary()
+        expected = np.bincount(classify_stages(np.array(lengths)), minlength=len(STAGES))
+        self.assertEqual(summary["fish"], 5)
+        self.assertEqual(summary["stages"], dict(zip(STAGES, expected.tolist())))
+        self.assertAlmostEqual(sum(summary["stage_proportions"].values()), 1.0, places=2)
+        self.assertAlmostEqual(summary["length_in"]["mean"], round(float(np.mean(lengths)), 3))
+
+    def test_export_writes_the_summary(self):
+        session = SessionStats("DOC-TEST")
+        session.add(4.0, 1.2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = session.export(directory)
+            self.assertEqual(os.path.basename(path), "DOC-TEST_session.json")
+            with open(path) as f:
+                self.assertEqual(json.load(f)["fish"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+"""
+Tests for `tiled_inference`: tile grid, seam detection, box merging and the
+per-crop confidence floors.
+
+Usage:
+    cd public/models && python -m pytest -q test_tiled_inference.py
+"""
+
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+
+from tiled_inference import TiledDetector, merge_boxes, seam_cut, tile_grid
+
+
+class FakeModel:
+    """Returns the same boxes (crop coordinates) for every crop; records the conf it was called with."""
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+        self.confs = []
+
+    def __call__(self, crops, imgsz=640, conf=0.25, verbose=False, **kwargs):
+        self.confs.append(conf)
+        results = []
+        for crop in crops:
+            whole = crop.shape[:2] == (720, 1280)
+            rows = [b for b in self.boxes if b[5] == ("frame" if whole else "tile")]
+            boxes = SimpleNamespace(
+                xyxy=np.array([b[:4] for b in rows], dtype=np.float32).reshape(-1, 4),
+                conf=np.array([b[4] for b in rows], dtype=np.float32),
+                cls=np.zeros(len(rows), dtype=np.float32),
+            )
+            results.append(SimpleNamespace(boxes=boxes))
+        return results
+
+
+class TileGridTest(unittest.TestCase):
+    def test_tiles_cover_the_frame_and_stay_full_size(self):
+        tiles = tile_grid(1280, 720, 640, overlap=0.2)
+        self.assertEqual(tiles[:, 0].min(), 0)
+        self.assertEqual(tiles[:, 2].max(), 1280)
+        self.assertEqual(tiles[:, 3].max(), 720)
+        self.assertTrue(((tiles[:, 2] - tiles[:, 0]) == 640).all())
+        self.assertTrue(((tiles[:, 3] - tiles[:, 1]) == 640).all())
+
+    def test_small_frame_is_one_tile(self):
+        np.testing.assert_array_equal(tile_grid(320, 240, 640), [[0, 0, 320, 240]])
+
+
+class SeamCutTest(unittest.TestCase):
+    def test_only_inner_tile_edges_count(self):
+        tile = (512, 0, 1152, 640)
+        boxes = [
+            [512, 100, 600, 150],  # touches the left seam
+            [1100, 100, 1152, 150],  # touches the right seam
+            [700, 0, 800, 50],  # touches the top, which is the frame edge
+            [700, 300, 800, 350],  # inside
+        ]
+        np.testing.assert_array_equal(seam_cut(boxes, tile, (720, 1280)), [True, True, False, False])
+
+    def test_whole_frame_has_no_seams(self):
+        self.assertFalse(seam_cut([[0, 0, 1280, 720]], (0, 0, 1280, 720), (720, 1280)).any())
+
+
+class MergeBoxesTest(unittest.TestCase):
+    def test_duplicates_keep_the_most_confident_box(self):
+        xyxy, conf, _ = merge_boxes([[0, 0, 100, 50], [2, 0, 102, 50]], [0.7, 0.9])
+        np.testing.assert_array_equal(xyxy, [[2, 0, 102, 50]])
+        np.testing.assert_allclose(conf, [0.9])
+
+    def test_starter_on_a_larger_fish_is_kept(self):
+        xyxy, _, _ = merge_boxes([[0, 0, 300, 120], [100, 40, 140, 60]], [0.9, 0.8], cut=[False, False])
+        self.assertEqual(len(xyxy), 2)
+
+    def test_halves_cut_at_a_seam_are_joined(self):
+        xyxy, conf, _ = merge_boxes([[450, 100, 640, 150], [512, 100, 750, 150]], [0.8, 0.85], cut=[True, True])
+        np.testing.assert_array_equal(xyxy, [[450, 100, 750, 150]])
+        np.testing.assert_allclose(conf, [0.85])
+
+    def test_cut_part_is_joined_to_the_whole_fish(self):
+        xyxy, _, _ = merge_boxes([[450, 100, 750, 150], [512, 100, 640, 150]], [0.8, 0.9], cut=[False, True])
+        np.testing.assert_array_equal(xyxy, [[450, 100, 750, 150]])
+
+    def test_different_classes_are_not_merged(self):
+        xyxy, _, cls = merge_boxes([[0, 0, 100, 50], [0, 0, 100, 50]], [0.9, 0.8], cls=[0, 1])
+        self.assertEqual(sorted(cls.tolist()), [0.0, 1.0])
+
+
+class TiledDetectorTest(unittest.TestCase):
+    def test_tile_floor_applies_to_tile_boxes_only(self):
+        model = FakeModel([
+            (100, 100, 200, 150, 0.65, "frame"),
+            (300, 300, 340, 320, 0.65, "tile"),
+        ])
+        detector = TiledDetector(model, conf=0.9, tile_conf=0.6, tile_scales=(1.0,))
+        boxes = detector(np.zeros((720, 1280, 3), dtype=np.uint8))[0].boxes
+
+        self.assertEqual(model.confs, [0.6])
+        self.assertEqual(detector.last_tiles, 1 + len(tile_grid(1280, 720, 640)))
+        self.assertGreater(len(boxes), 0)
+        self.assertFalse(np.any((boxes.xyxy == [100, 100, 200, 150]).all(axis=1)))
+
+    def test_without_tile_conf_every_box_uses_conf(self):
+        model = FakeModel([(300, 300, 340, 320, 0.65, "tile")])
+        detector = TiledDetector(model, conf=0.9, tile_scales=(1.0,))
+        self.assertEqual(len(detector(np.zeros((720, 1280, 3), dtype=np.uint8))[0].boxes), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
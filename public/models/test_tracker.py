@@ -0,0 +1,105 @@
+"""
+Tests for `tracker`: matching, locking and the pending list.
+
+Usage:
+    cd public/models && python -m pytest -q test_tracker.py
+"""
+
+import unittest
+
+import numpy as np
+
+from tracker import FishTracker, greedy_match, iou_matrix, trimmed_mean
+
+NO_BOXES = np.zeros((0, 4), dtype=np.float32)
+
+
+class MatchingTest(unittest.TestCase):
+    def test_iou_matrix(self):
+        iou = iou_matrix([[0, 0, 10, 10]], [[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]])
+        np.testing.assert_allclose(iou, [[1.0, 50 / 150, 0.0]], rtol=1e-6)
+
+    def test_greedy_match_takes_the_best_pairs_first(self):
+        score = np.array([[0.9, 0.8], [0.85, 0.1]])
+        self.assertEqual(greedy_match(score, 0.3), [(0, 0)])
+        self.assertEqual(greedy_match(score, 0.05), [(0, 0), (1, 1)])
+
+    def test_trimmed_mean_ignores_outliers(self):
+        self.assertAlmostEqual(trimmed_mean([5.0] * 9 + [50.0], trim=0.1), 5.0)
+
+
+class FishTrackerTest(unittest.TestCase):
+    def test_overlapping_boxes_keep_their_ids(self):
+        tracker = FishTracker()
+        first = tracker.update([[0, 0, 100, 40], [200, 0, 300, 40]], [4.0, 5.0], [1.0, 1.2])
+        second = tracker.update([[205, 2, 305, 42], [3, 1, 103, 41]], [5.0, 4.0], [1.2, 1.0])
+        self.assertIs(second[0], first[1])
+        self.assertIs(second[1], first[0])
+
+    def test_centroid_fallback_follows_a_fast_fish(self):
+        tracker = FishTracker(iou_threshold=0.5, max_distance=0.5)
+        first = tracker.update([[0, 0, 100, 40]], [4.0], [1.0])
+        # IoU 0.43 is below the threshold, but the centre moved less than half the diagonal.
+        moved = tracker.update([[40, 0, 140, 40]], [4.0], [1.0])
+        self.assertIs(moved[0], first[0])
+        far = tracker.update([[600, 0, 700, 40]], [4.0], [1.0])
+        self.assertIsNot(far[0], first[0])
+
+    def test_locks_once_the_window_is_stable(self):
+        tracker = FishTracker(min_samples=8, stable_spread=0.03)
+        box = [[0, 0, 100, 40]]
+        for length in [4.0, 5.5, 3.2, 6.0]:
+            (track,) = tracker.update(box, [length], [1.0])
+        self.assertFalse(track.locked)
+        for _ in range(8):
+            (track,) = tracker.update(box, [4.0], [1.0])
+        self.assertTrue(track.locked)
+
+        frozen = track.length_in
+        tracker.update(box, [9.0], [3.0])
+        self.assertEqual(track.length_in, frozen)
+        self.assertEqual(track.label, f"#{track.id} locked")
+
+    def test_unlocked_tracks_are_pruned(self):
+        tracker = FishTracker(max_missed=2)
+        tracker.update([[0, 0, 100, 40]], [4.0], [1.0])
+        for _ in range(3):
+            tracker.update(NO_BOXES, [], [])
+        self.assertEqual(tracker.tracks, [])
+        self.assertEqual(tracker.ready_to_submit(), [])
+
+    def test_locked_fish_leaving_the_frame_stays_pending(self):
+        tracker = FishTracker(max_missed=2, min_samples=3)
+        for _ in range(3):
+            (track,) = tracker.update([[0, 0, 100, 40]], [4.0], [1.0])
+        self.assertTrue(tracker.has_locked())
+        for _ in range(3):
+            tracker.update(NO_BOXES, [], [])
+
+        self.assertEqual(tracker.tracks, [])
+        self.assertFalse(tracker.has_locked())
+        self.assertEqual(tracker.ready_to_submit(), [track])
+        tracker.mark_submitted(track)
+        self.assertEqual(tracker.ready_to_submit(), [])
+        self.assertEqual(tracker.pending, [])
+
+    def test_submitted_fish_is_not_ready_again(self):
+        tracker = FishTracker(min_samples=3)
+        for _ in range(3):
+            (track,) = tracker.update([[0, 0, 100, 40]], [4.0], [1.0])
+        tracker.mark_submitted(track)
+        self.assertEqual(tracker.ready_to_submit(), [])
+        self.assertTrue(tracker.has_locked())
+
+    def test_reset_drops_pending_tracks(self):
+        tracker = FishTracker(max_missed=0, min_samples=3)
+        for _ in range(3):
+            tracker.update([[0, 0, 100, 40]], [4.0], [1.0])
+        tracker.update(NO_BOXES, [], [])
+        self.assertEqual(len(tracker.pending), 1)
+        tracker.reset()
+        self.assertEqual(tracker.ready_to_submit(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
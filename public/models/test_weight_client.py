@@ -0,0 +1,107 @@
+"""
+Tests for `weight_client` and the bulk uploader against `stub_api_server`.
+
+Usage:
+    cd public/models && python -m pytest -q test_weight_client.py
+"""
+
+import os
+import tempfile
+import unittest
+
+from measurement_queue import BulkUploader, MeasurementJournal
+from stub_api_server import StubApi, serve_in_thread
+from weight_client import ApiError, WeightApiClient
+
+
+class WeightClientTest(unittest.TestCase):
+    def setUp(self):
+        self.api = StubApi("stub-key", cages=3, samplings_per_cage=2)
+        self.server, self.url = serve_in_thread(self.api)
+        self.client = WeightApiClient("stub-key", self.url)
+        self.doc = next(iter(self.api.samplings))
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_lookup_resolves_known_and_unknown_docs(self):
+        self.assertEqual(self.client.lookup_sampling_id(self.doc), self.api.samplings[self.doc]["sampling"]["id"])
+        self.assertIsNone(self.client.lookup_sampling_id("DOC-UNKNOWN"))
+
+    def test_expired_lookup_is_revalidated_with_etag(self):
+        self.client.doc_ttl = 0
+        first = self.client.lookup_sampling_id(self.doc)
+        second = self.client.lookup_sampling_id(self.doc)
+        self.assertEqual(first, second)
+        self.assertEqual(self.client.lookup_stats["requests"], 2)
+        self.assertEqual(self.client.lookup_stats["not_modified"], 1)
+
+    def test_fresh_lookup_is_served_from_cache(self):
+        self.client.lookup_sampling_id(self.doc)
+        self.client.lookup_sampling_id(self.doc)
+        self.assertEqual(self.client.lookup_stats["requests"], 1)
+        self.assertEqual(self.client.lookup_stats["cache_hits"], 1)
+
+    def test_lean_index_fallback(self):
+        self.assertEqual(self.client.refresh_index(), len(self.api.samplings))
+        self.assertEqual(self.client._lookup_from_index(self.doc), self.api.samplings[self.doc]["sampling"]["id"])
+
+    def test_invalidated_doc_comes_back_on_the_next_index_refresh(self):
+        self.client.refresh_index()
+        self.client.invalidate(self.doc)
+        self.client.refresh_index()
+        self.assertEqual(self.client._lookup_from_index(self.doc), self.api.samplings[self.doc]["sampling"]["id"])
+
+    def test_resolve_doc_async_reports_through_dispatch(self):
+        calls = []
+        self.client.resolve_doc_async(self.doc, lambda *args: calls.append(args), dispatch=lambda fn: fn()).result(5)
+        bad = WeightApiClient("wrong-key", self.url)
+        bad.resolve_doc_async(self.doc, lambda *args: calls.append(args)).result(5)
+        bad.close()
+
+        self.assertEqual(calls[0], (self.doc, self.api.samplings[self.doc]["sampling"]["id"], None))
+        self.assertIsNone(calls[1][1])
+        self.assertIsInstance(calls[1][2], ApiError)
+
+
+class BulkUploaderTest(unittest.TestCase):
+    def setUp(self):
+        self.api = StubApi("stub-key", cages=1, samplings_per_cage=1)
+        self.server, self.url = serve_in_thread(self.api)
+        self.client = WeightApiClient("stub-key", self.url)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = MeasurementJournal(os.path.join(self.tmp.name, "journal.db"))
+        self.results = []
+        self.uploader = BulkUploader(self.journal, self.client, on_result=lambda row, result: self.results.append(result["status"]))
+        self.doc = next(iter(self.api.samplings))
+
+    def tearDown(self):
+        self.journal.close()
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def test_uploads_and_fills_sample_slots(self):
+        for _ in range(3):
+            self.journal.add(self.doc, 2.0, 5.0)
+        self.assertEqual(self.uploader.drain_once(), 3)
+        self.assertEqual(self.journal.counts(), {"uploaded": 3})
+        self.assertEqual(len(self.api.samplings[self.doc]["samples"]), 3)
+
+    def test_validation_error_rejects_only_the_invalid_row(self):
+        self.journal.add(self.doc, 2.0, 5.0)
+        self.journal.add(self.doc, 2.0, 5.0, unit="mm")
+        self.journal.add(self.doc, 2.0, 5.0)
+
+        self.assertEqual(self.uploader.drain_once(), 1)
+        self.assertEqual(self.journal.counts(), {"pending": 2, "rejected": 1})
+        self.assertEqual(self.uploader.drain_once(), 2)
+        self.assertEqual(self.journal.counts(), {"uploaded": 2, "rejected": 1})
+        self.assertEqual(sorted(self.results), ["created", "created", "rejected"])
+
+
+if __name__ == "__main__":
+    unittest.main()
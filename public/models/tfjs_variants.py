@@ -0,0 +1,173 @@
+"""
+Weight-quantized TF.js variants and their size/accuracy report.
+
+`tensorflowjs_converter` can store weights as float16 or as affine-quantized
+uint8/uint16 and split them into shards of a chosen size. Smaller weights load
+faster over mobile data but lose precision. `variant_report` measures the
+download footprint of each variant (total bytes and shard count). With sample
+images it also measures detection agreement with the float32 model. Each
+quantized graph model is turned back into a SavedModel and run next to the
+float32 one, and the boxes are compared with `model_parity`. The converter
+writes the result into `metadata.json`.
+
+Usage:
+python convert_yolo_to_tfjs.py --tfjs-variants float32,float16,uint8 --shard-size 1048576 --parity-images "captures/*.jpg"
+"""
+
+import json
+import os
+import subprocess
+
+import cv2
+import numpy as np
+
+from detection import measure_boxes
+
+# Variant name → tensorflowjs_converter quantization flag
+TFJS_VARIANTS = {
+    "float32": None,
+    "float16": "--quantize_float16",
+    "uint16": "--quantize_uint16",
+    "uint8": "--quantize_uint8",
+}
+
+# tensorflowjs_converter's own default (4 MiB)
+DEFAULT_SHARD_SIZE = 4 * 1024 * 1024
+
+
+def variant_dir_name(variant):
+    return "web_model" if variant == "float32" else f"web_model_{variant}"
+
+
+def converter_flags(variant, shard_size=DEFAULT_SHARD_SIZE):
+    flags = [f"--weight_shard_size_bytes={int(shard_size)}"]
+    if TFJS_VARIANTS[variant]:
+        flags.append(TFJS_VARIANTS[variant])
+    return flags
+
+
+def size_report(model_dir):
+    """Total bytes (model.json + shards) and shard count of a graph model directory."""
+    model_json = os.path.join(model_dir, "model.json")
+    with open(model_json) as f:
+        manifest = json.load(f).get("weightsManifest", [])
+
+    shards = [path for group in manifest for path in group.get("paths", [])]
+    total = os.path.getsize(model_json) + sum(os.path.getsize(os.path.join(model_dir, p)) for p in shards)
+    return {"totalBytes": total, "shardCount": len(shards)}
+
+
+def graph_model_to_saved_model(model_dir, output_dir):
+    """Convert a (possibly quantized) graph model back so it can run in Python."""
+    cmd = [
+        "tensorflowjs_converter",
+        "--input_format=tfjs_graph_model",
+        "--output_format=tf_saved_model",
+        model_dir,
+        output_dir,
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"tensorflowjs_converter failed: {result.stderr}")
+    return output_dir
+
+
+def decode_yolo_output(output, frame_shape, image_size, conf_threshold=0.25, iou_threshold=0.7):
+    """
+    Raw YOLOv8 head output `(1, 4 + classes, anchors)` → `(conf, xyxy)` in frame pixels.
+
+    Boxes are centre/size, either in input pixels or normalized to [0, 1]
+    (Ultralytics' TF exports normalize them).
+    """
+    pred = np.asarray(output, dtype=np.float32)[0]
+    if pred.shape[0] > pred.shape[1]:
+        pred = pred.T
+    boxes = pred[:4].T
+    scores = pred[4:].max(axis=0)
+
+    keep = scores >= conf_threshold
+    boxes, scores = boxes[keep], scores[keep]
+    if not len(scores):
+        return np.zeros(0), np.zeros((0, 4))
+
+    if boxes.max() <= 2.0:
+        boxes = boxes * image_size
+    height, width = frame_shape[:2]
+    scale = np.array([width / image_size, height / image_size] * 2, dtype=np.float32)
+
+    xywh = np.column_stack([boxes[:, 0] - boxes[:, 2] / 2, boxes[:, 1] - boxes[:, 3] / 2, boxes[:, 2], boxes[:, 3]])
+    picked = cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(), conf_threshold, iou_threshold)
+    picked = np.asarray(picked, dtype=np.int64).reshape(-1)
+
+    xyxy = np.column_stack([xywh[:, :2], xywh[:, :2] + xywh[:, 2:]])[picked] * scale
+    return scores[picked], xyxy
+
+
+class SavedModelDetector:
+    """Runs a SavedModel's serving signature on BGR frames (stretched to `image_size`)."""
+
+    def __init__(self, saved_model_dir, image_size=640):
+        import tensorflow as tf
+
+        self.image_size = image_size
+        self._tf = tf
+        self._fn = tf.saved_model.load(saved_model_dir).signatures["serving_default"]
+
+    def __call__(self, frame, conf_threshold=0.5):
+        rgb = cv2.cvtColor(cv2.resize(frame, (self.image_size, self.image_size)), cv2.COLOR_BGR2RGB)
+        batch = self._tf.constant(rgb[None].astype(np.float32) / 255.0)
+        output = next(iter(self._fn(batch).values())).numpy()
+        conf, xyxy = decode_yolo_output(output, frame.shape, self.image_size, conf_threshold)
+        return measure_boxes(conf, xyxy, conf_threshold=conf_threshold)
+
+
+def variant_agreement(baseline_dir, variant_dir, frames, work_dir, image_size=640, conf_threshold=0.5):
+    """Run both graph models on `frames` and summarize agreement (see `model_parity.summarize`)."""
+    from model_parity import compare_measurements, summarize
+
+    baseline = SavedModelDetector(graph_model_to_saved_model(baseline_dir, os.path.join(work_dir, "baseline")), image_size)
+    candidate = SavedModelDetector(graph_model_to_saved_model(variant_dir, os.path.join(work_dir, "candidate")), image_size)
+    comparisons = [compare_measurements(baseline(frame, conf_threshold), candidate(frame, conf_threshold)) for frame in frames]
+    return summarize(comparisons)
+
+
+def variant_report(model_dirs, frames=None, work_dir=None, image_size=640, shard_size=DEFAULT_SHARD_SIZE):
+    """
+    Args:
+        model_dirs: `{variant: published graph model dir}`; must include "float32"
+            for agreement to be measured.
+        frames: Optional list of BGR frames for the agreement check.
+        work_dir: Scratch space for the round-tripped SavedModels.
+
+    Returns `{variant: {...}}` ready to be stored in metadata.json.
+    """
+    import tempfile
+
+    baseline_bytes = None
+    if "float32" in model_dirs:
+        baseline_bytes = size_report(model_dirs["float32"])["totalBytes"]
+
+    report = {}
+    for variant, model_dir in model_dirs.items():
+        entry = {
+            "path": variant_dir_name(variant),
+            "quantization": variant,
+            "shardSizeBytes": int(shard_size),
+            **size_report(model_dir),
+        }
+        if baseline_bytes:
+            entry["sizeRatio"] = round(entry["totalBytes"] / baseline_bytes, 4)
+
+        if frames and variant != "float32" and "float32" in model_dirs:
+            try:
+                with tempfile.TemporaryDirectory(dir=work_dir) as scratch:
+                    entry["agreement"] = variant_agreement(model_dirs["float32"], model_dir, frames, scratch, image_size)
+            except Exception as e:
+                entry["agreement"] = {"error": str(e)}
+
+        report[variant] = entry
+        agreement = entry.get("agreement", {})
+        recall = f", recall {agreement['recall']:.3f}" if "recall" in agreement else ""
+        print(f"  {variant:<8} {entry['totalBytes'] / 1e6:.2f} MB in {entry['shardCount']} shard(s){recall}")
+
+    return report
@@ -0,0 +1,353 @@
+"""
+Sliced (tiled) inference for small fish on high-resolution frames.
+
+A 1280x720 frame shrunk to the model's 640 input leaves a 2-3 in starter only a
+few pixels long, so it is missed or scored below the confidence cutoff.
+`TiledDetector` cuts the frame into overlapping tiles that are each resized to
+the model input (much less downscaling). The tiles, plus one downscaled copy of
+the whole frame for the large fish a tile would cut in half, run through the
+model together. Tile boxes are shifted back into frame coordinates and merged
+with non-maximum suppression:
+
+* boxes of the same fish from neighbouring tiles overlap mostly (IoU), so the
+  most confident one is kept and the others are dropped;
+* a fish cut by a tile edge leaves a partial box touching that seam. A cut box
+  that lies mostly inside another box (intersection-over-smaller, IoS) is
+  joined to it (box union, best confidence), so two halves from neighbouring
+  tiles make one whole fish. Only boxes cut at a seam are joined: a starter
+  lying on top of a larger fish is a separate detection and stays one.
+
+Tiles may use a lower confidence floor than the whole frame (`tile_conf`),
+since a starter is scored more reliably at tile resolution; whole-frame boxes
+keep `conf`.
+
+The tile size adapts to a latency budget the way `InferenceScheduler` adapts
+its rate: when the smoothed call latency exceeds the budget the next larger
+tile size (fewer tiles) is used, and when there is headroom it steps back down.
+Once the tile size reaches the frame size only the whole frame is run, which is
+plain inference.
+
+`TiledDetector` is called like an Ultralytics model (a frame or a list of
+frames; results with `.boxes.xyxy/.conf/.cls`), so it drops in wherever the
+model is used. All tiles of all frames in a call go to the model as batches of
+`max_batch`, or are split across `workers` threads that each hold their own
+model copy.
+
+Usage:
+    from tiled_inference import TiledDetector
+    detector = TiledDetector(load_model(), latency_budget_ms=150)
+    boxes = detector(frame)[0].boxes
+"""
+
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+from detection import to_numpy
+
+
+def tile_grid(width, height, tile_size, overlap=0.2):
+    """
+    Top-left corners and sizes of overlapping tiles covering the frame.
+
+    Returns an `(N, 4)` int array of `x1, y1, x2, y2`. The last row/column is
+    aligned to the frame edge, so every tile is full-size (unless the frame is
+    smaller than a tile along that axis).
+    """
+
+    def starts(length):
+        if tile_size >= length:
+            return [0]
+        step = max(1, int(tile_size * (1.0 - overlap)))
+        count = math.ceil((length - tile_size) / step) + 1
+        return [min(i * step, length - tile_size) for i in range(count)]
+
+    tw, th = min(tile_size, width), min(tile_size, height)
+    return np.array([(x, y, x + tw, y + th) for y in starts(height) for x in starts(width)], dtype=np.int32)
+
+
+def seam_cut(xyxy, tile, frame_shape, margin=2.0):
+    """
+    Which boxes touch an edge of `tile` that lies inside the frame (a seam), i.e.
+    may be only part of a fish. Boxes and tile are in frame coordinates.
+    """
+    xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+    height, width = frame_shape[:2]
+    x1, y1, x2, y2 = tile
+    return (
+        ((x1 > 0) & (xyxy[:, 0] <= x1 + margin))
+        | ((y1 > 0) & (xyxy[:, 1] <= y1 + margin))
+        | ((x2 < width) & (xyxy[:, 2] >= x2 - margin))
+        | ((y2 < height) & (xyxy[:, 3] >= y2 - margin))
+    )
+
+
+def merge_boxes(xyxy, conf, cls=None, iou_threshold=0.5, match_threshold=0.5, cut=None):
+    """
+    Non-maximum suppression that joins boxes cut at tile seams.
+
+    Boxes are visited by descending confidence. A remaining box of the same
+    class is dropped when its IoU with the current one reaches
+    `iou_threshold`; it is folded into the current one (box union, higher
+    confidence kept) when the smaller of the two is `cut` at a seam and their
+    intersection-over-smaller reaches `match_threshold`. Without `cut` this is
+    plain NMS.
+
+    Returns `(xyxy, conf, cls)` of the kept boxes.
+    """
+    xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+    conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+    cls = np.zeros(len(conf), dtype=np.float32) if cls is None else np.asarray(cls, dtype=np.float32).reshape(-1)
+    cut = np.zeros(len(conf), dtype=bool) if cut is None else np.asarray(cut, dtype=bool).reshape(-1)
+    if len(conf) < 2:
+        return xyxy, conf, cls
+
+    order = np.argsort(-conf, kind="stable")
+    xyxy, conf, cls, cut = xyxy[order], conf[order], cls[order], cut[order]
+    areas = (xyxy[:, 2] - xyxy[:, 0]) * (xyxy[:, 3] - xyxy[:, 1])
+
+    alive = np.ones(len(conf), dtype=bool)
+    out_xyxy, out_conf, out_cls = [], [], []
+    for i in range(len(conf)):
+        if not alive[i]:
+            continue
+        rest = np.flatnonzero(alive[i + 1:]) + i + 1
+        rest = rest[cls[rest] == cls[i]]
+        box = xyxy[i].copy()
+        if len(rest):
+            ix1 = np.maximum(xyxy[i, 0], xyxy[rest, 0])
+            iy1 = np.maximum(xyxy[i, 1], xyxy[rest, 1])
+            ix2 = np.minimum(xyxy[i, 2], xyxy[rest, 2])
+            iy2 = np.minimum(xyxy[i, 3], xyxy[rest, 3])
+            inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+            iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-6)
+            ios = inter / np.maximum(np.minimum(areas[i], areas[rest]), 1e-6)
+            smaller_cut = np.where(areas[rest] <= areas[i], cut[rest], cut[i])
+
+            duplicate = iou >= iou_threshold
+            joined = rest[~duplicate & smaller_cut & (ios >= match_threshold)]
+            alive[rest[duplicate]] = False
+            if len(joined):
+                alive[joined] = False
+                box[:2] = np.minimum(box[:2], xyxy[joined, :2].min(axis=0))
+                box[2:] = np.maximum(box[2:], xyxy[joined, 2:].max(axis=0))
+        out_xyxy.append(box)
+        out_conf.append(conf[i])
+        out_cls.append(cls[i])
+
+    return np.array(out_xyxy, dtype=np.float32), np.array(out_conf, dtype=np.float32), np.array(out_cls, dtype=np.float32)
+
+
+class TiledBoxes:
+    """Minimal stand-in for Ultralytics `Boxes` (NumPy `xyxy`, `conf`, `cls`)."""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class TiledDetector:
+    """
+    Args:
+        model: Ultralytics model (or anything with the same call signature).
+        imgsz: Model input size; also the smallest tile size.
+        overlap: Fraction of a tile shared with its neighbour.
+        tile_scales: Tile sizes to choose from, as multiples of `imgsz`,
+            smallest (most tiles, most accurate) first.
+        latency_budget_ms: Per-call latency above which fewer tiles are used
+            (None keeps the first tile size).
+        include_full_frame: Also run the downscaled whole frame (for large fish).
+        conf: Confidence floor for whole-frame boxes.
+        tile_conf: Confidence floor for tile boxes (None: same as `conf`).
+        iou_threshold: IoU at which overlapping boxes count as one fish.
+        match_threshold: IoS at which a box cut at a tile seam is joined to
+            the box it lies in.
+        max_batch: Images per model call.
+        workers: >1 splits the tiles across this many threads, each with its
+            own model from `load` (Ultralytics models are not thread-safe).
+        load: Model factory for the worker threads.
+    """
+
+    def __init__(
+        self,
+        model,
+        imgsz=640,
+        overlap=0.2,
+        tile_scales=(1.0, 1.5, 2.0, 3.0),
+        latency_budget_ms=None,
+        include_full_frame=True,
+        conf=0.25,
+        tile_conf=None,
+        iou_threshold=0.5,
+        match_threshold=0.5,
+        max_batch=16,
+        workers=1,
+        load=None,
+    ):
+        if workers > 1 and load is None:
+            raise ValueError("workers > 1 needs a `load` factory for the per-thread models")
+
+        self.model = model
+        self.imgsz = imgsz
+        self.overlap = overlap
+        self.tile_sizes = [int(imgsz * s) for s in tile_scales]
+        self.latency_budget = latency_budget_ms / 1000.0 if latency_budget_ms else None
+        self.include_full_frame = include_full_frame
+        self.conf = conf
+        self.tile_conf = tile_conf
+        self.iou_threshold = iou_threshold
+        self.match_threshold = match_threshold
+        self.max_batch = max_batch
+        self.workers = workers
+        self.load = load
+
+        self.level = 0
+        self.last_tiles = 0
+        self._latency = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="tile-worker") if workers > 1 else None
+
+    @property
+    def tile_size(self):
+        return self.tile_sizes[self.level]
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+    def plan(self, frame_shape, level=None):
+        """Tile boxes for a frame at the current tile size (empty when one tile covers it)."""
+        height, width = frame_shape[:2]
+        tile_size = self.tile_sizes[self.level if level is None else level]
+        if tile_size >= max(width, height):
+            return np.zeros((0, 4), dtype=np.int32)
+        return tile_grid(width, height, tile_size, self.overlap)
+
+    def crops_per_frame(self, frame_shape, level=None):
+        tiles = len(self.plan(frame_shape, level))
+        return tiles + 1 if self.include_full_frame or not tiles else tiles
+
+    def __call__(self, source, imgsz=None, conf=None, verbose=False, **kwargs):
+        frames = source if isinstance(source, (list, tuple)) else [source]
+        conf = self.conf if conf is None else conf
+        tile_conf = conf if self.tile_conf is None else self.tile_conf
+        started = time.perf_counter()
+
+        # Every crop of every frame, with the frame it belongs to, its bounds in it
+        # and its confidence floor.
+        crops, owners, bounds, floors = [], [], [], []
+        for index, frame in enumerate(frames):
+            height, width = frame.shape[:2]
+            tiles = self.plan(frame.shape)
+            if self.include_full_frame or not len(tiles):
+                crops.append(frame)
+                owners.append(index)
+                bounds.append((0, 0, width, height))
+                floors.append(conf)
+            for x1, y1, x2, y2 in tiles:
+                crops.append(frame[y1:y2, x1:x2])
+                owners.append(index)
+                bounds.append((x1, y1, x2, y2))
+                floors.append(tile_conf)
+
+        predictions = self._predict(crops, min(conf, tile_conf), **kwargs)
+
+        per_frame = [([], [], [], []) for _ in frames]
+        for owner, tile, floor, (xyxy, scores, classes) in zip(owners, bounds, floors, predictions):
+            keep = scores >= floor
+            if keep.any():
+                dx, dy = tile[:2]
+                shifted = xyxy[keep] + np.array([dx, dy, dx, dy], dtype=np.float32)
+                per_frame[owner][0].append(shifted)
+                per_frame[owner][1].append(scores[keep])
+                per_frame[owner][2].append(classes[keep])
+                per_frame[owner][3].append(seam_cut(shifted, tile, frames[owner].shape))
+
+        results = []
+        for xyxy, scores, classes, cut in per_frame:
+            if scores:
+                merged = merge_boxes(
+                    np.concatenate(xyxy),
+                    np.concatenate(scores),
+                    np.concatenate(classes),
+                    self.iou_threshold,
+                    self.match_threshold,
+                    np.concatenate(cut),
+                )
+            else:
+                merged = (np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32))
+            results.append(SimpleNamespace(boxes=TiledBoxes(*merged)))
+
+        self.last_tiles = len(crops)
+        self._adapt(time.perf_counter() - started, frames[0].shape, len(frames))
+        return results
+
+    def _predict(self, crops, conf, **kwargs):
+        """`(xyxy, conf, cls)` NumPy arrays per crop, in crop order."""
+        if self._pool is None:
+            return self._run(self.model, crops, conf, **kwargs)
+
+        chunk = math.ceil(len(crops) / self.workers)
+        parts = [crops[i:i + chunk] for i in range(0, len(crops), chunk)]
+        futures = [self._pool.submit(self._run_worker, part, conf, **kwargs) for part in parts]
+        return [prediction for future in futures for prediction in future.result()]
+
+    def _run_worker(self, crops, conf, **kwargs):
+        model = getattr(self._local, "model", None)
+        if model is None:
+            model = self._local.model = self.load()
+        return self._run(model, crops, conf, **kwargs)
+
+    def _run(self, model, crops, conf, **kwargs):
+        predictions = []
+        for i in range(0, len(crops), self.max_batch):
+            for result in model(crops[i:i + self.max_batch], imgsz=self.imgsz, conf=conf, verbose=False, **kwargs):
+                boxes = result.boxes
+                predictions.append((
+                    to_numpy(boxes.xyxy).reshape(-1, 4).astype(np.float32),
+                    to_numpy(boxes.conf).reshape(-1).astype(np.float32),
+                    to_numpy(boxes.cls).reshape(-1).astype(np.float32),
+                ))
+        return predictions
+
+    def _adapt(self, seconds, frame_shape, frames):
+        """
+        Step the tile size up when over the latency budget, and back down when the
+        smaller tiles are predicted (from the per-crop cost) to fit comfortably.
+        """
+        if self.latency_budget is None:
+            return
+        with self._lock:
+            self._latency = seconds if self._latency is None else 0.8 * self._latency + 0.2 * seconds
+            if self._latency > self.latency_budget and self.level < len(self.tile_sizes) - 1:
+                self.level += 1
+                self._latency = None
+            elif self.level > 0:
+                per_crop = self._latency / max(1, self.last_tiles)
+                predicted = per_crop * self.crops_per_frame(frame_shape, self.level - 1) * frames
+                if predicted < 0.8 * self.latency_budget:
+                    self.level -= 1
+                    self._latency = None
+
+    def stats(self):
+        with self._lock:
+            latency = self._latency
+        return {
+            "tile_size": self.tile_size,
+            "tiles": self.last_tiles,
+            "latency_ms": round(latency * 1000.0, 1) if latency is not None else None,
+        }
+
+    def format_stats(self):
+        s = self.stats()
+        latency = f", {s['latency_ms']:.0f} ms" if s["latency_ms"] is not None else ""
+        return f"tiles {s['tiles']} × {s['tile_size']}px{latency}"
@@ -0,0 +1,206 @@
+"""
+Lightweight per-fish tracking across frames.
+
+Each frame's boxes are matched to existing tracks by IoU (falling back to centroid
+distance for fast-moving fish), so every fish keeps a stable id. Tracks keep a
+window of length/width samples and report a robust estimate (trimmed mean); once
+the spread of that window is small enough the track is locked, its estimate is
+frozen and it is submitted once instead of whichever noisy frame came last.
+A locked fish that leaves the frame before it is submitted is kept aside until
+it is submitted or the session is reset.
+"""
+
+import threading
+from collections import deque
+
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between `(N, 4)` and `(M, 4)` xyxy arrays."""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def greedy_match(score, threshold):
+    """Pair rows/cols with the highest score first; returns `[(row, col), ...]`."""
+    pairs = []
+    if score.size == 0:
+        return pairs
+    order = np.dstack(np.unravel_index(np.argsort(-score, axis=None), score.shape))[0]
+    used_rows, used_cols = set(), set()
+    for r, c in order:
+        if score[r, c] < threshold:
+            break
+        if r in used_rows or c in used_cols:
+            continue
+        pairs.append((int(r), int(c)))
+        used_rows.add(r)
+        used_cols.add(c)
+    return pairs
+
+
+def trimmed_mean(values, trim=0.1):
+    values = np.sort(np.asarray(values, dtype=np.float64))
+    k = int(len(values) * trim)
+    if len(values) > 2 * k:
+        values = values[k:len(values) - k]
+    return float(values.mean())
+
+
+class Track:
+    def __init__(self, track_id, xyxy, window):
+        self.id = track_id
+        self.xyxy = np.asarray(xyxy, dtype=np.float32)
+        self.lengths = deque(maxlen=window)
+        self.widths = deque(maxlen=window)
+        self.hits = 0
+        self.missed = 0
+        self.locked = False
+        self.submitted = False
+        self.counted = False
+        self.length_in = None
+        self.width_in = None
+
+    def add(self, xyxy, length_in, width_in):
+        self.xyxy = np.asarray(xyxy, dtype=np.float32)
+        self.hits += 1
+        self.missed = 0
+        if self.locked:
+            # Already measured; just follow the fish.
+            return
+        self.lengths.append(length_in)
+        self.widths.append(width_in)
+        self.length_in = trimmed_mean(self.lengths)
+        self.width_in = trimmed_mean(self.widths)
+
+    def spread(self):
+        """Relative median absolute deviation of the length and width windows."""
+        spreads = []
+        for values in (self.lengths, self.widths):
+            arr = np.asarray(values, dtype=np.float64)
+            median = np.median(arr)
+            spreads.append(np.median(np.abs(arr - median)) / median if median > 0 else np.inf)
+        return max(spreads)
+
+    @property
+    def centroid(self):
+        return (self.xyxy[:2] + self.xyxy[2:]) / 2.0
+
+    @property
+    def label(self):
+        return f"#{self.id}" + (" locked" if self.locked else "")
+
+
+class FishTracker:
+    """
+    Args:
+        iou_threshold: Minimum IoU to continue a track.
+        max_distance: Centroid fallback, as a fraction of the track's box diagonal.
+        max_missed: Frames a track survives without a match (a locked, unsubmitted
+            track then moves to `pending`).
+        window: Samples kept per track for the robust estimate.
+        min_samples: Samples needed before a track can lock.
+        stable_spread: Lock once the relative MAD of length and width is below this.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_distance=0.5, max_missed=15, window=30, min_samples=8, stable_spread=0.03):
+        self.iou_threshold = iou_threshold
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.window = window
+        self.min_samples = min_samples
+        self.stable_spread = stable_spread
+
+        self.tracks = []
+        # Locked, unsubmitted tracks that were pruned from `tracks`.
+        self.pending = []
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def update(self, xyxy, length_in, width_in):
+        """
+        Match one frame's boxes (arrays from `detection.measure_boxes`) to tracks.
+
+        Returns the list of `Track` objects aligned with the input rows.
+        """
+        xyxy = np.asarray(xyxy, dtype=np.float32).reshape(-1, 4)
+        with self._lock:
+            assigned = [None] * len(xyxy)
+            track_boxes = np.array([t.xyxy for t in self.tracks], dtype=np.float32).reshape(-1, 4)
+
+            pairs = greedy_match(iou_matrix(track_boxes, xyxy), self.iou_threshold)
+            matched_tracks = {r for r, _ in pairs}
+            for r, c in pairs:
+                assigned[c] = self.tracks[r]
+
+            # Centroid fallback for fish that moved too far for any overlap.
+            free_tracks = [i for i in range(len(self.tracks)) if i not in matched_tracks]
+            free_boxes = [i for i in range(len(xyxy)) if assigned[i] is None]
+            if free_tracks and free_boxes:
+                t_centers = np.array([self.tracks[i].centroid for i in free_tracks])
+                b_centers = (xyxy[free_boxes, :2] + xyxy[free_boxes, 2:]) / 2.0
+                diag = np.array([np.linalg.norm(self.tracks[i].xyxy[2:] - self.tracks[i].xyxy[:2]) for i in free_tracks])
+                dist = np.linalg.norm(t_centers[:, None, :] - b_centers[None, :, :], axis=2) / np.maximum(diag[:, None], 1.0)
+                for r, c in greedy_match(-dist, -self.max_distance):
+                    assigned[free_boxes[c]] = self.tracks[free_tracks[r]]
+                    matched_tracks.add(free_tracks[r])
+
+            for i, track in enumerate(self.tracks):
+                if i not in matched_tracks:
+                    track.missed += 1
+
+            for i in range(len(xyxy)):
+                if assigned[i] is None:
+                    assigned[i] = Track(self._next_id, xyxy[i], self.window)
+                    self._next_id += 1
+                    self.tracks.append(assigned[i])
+                track = assigned[i]
+                track.add(xyxy[i], float(length_in[i]), float(width_in[i]))
+                if not track.locked and len(track.lengths) >= self.min_samples and track.spread() <= self.stable_spread:
+                    track.locked = True
+
+            kept = []
+            for track in self.tracks:
+                if track.missed <= self.max_missed:
+                    kept.append(track)
+                elif track.locked and not track.submitted:
+                    self.pending.append(track)
+            self.tracks = kept
+            return assigned
+
+    def ready_to_submit(self):
+        """Locked tracks that haven't been submitted yet, including those no longer in view."""
+        with self._lock:
+            return self.pending + [t for t in self.tracks if t.locked and not t.submitted]
+
+    def has_locked(self):
+        """Whether any fish in view has locked (submitted or not)."""
+        with self._lock:
+            return any(t.locked for t in self.tracks)
+
+    def mark_submitted(self, track):
+        with self._lock:
+            track.submitted = True
+            if track in self.pending:
+                self.pending.remove(track)
+
+    def summary(self):
+        with self._lock:
+            return len(self.tracks), sum(1 for t in self.tracks if t.locked)
+
+    def reset(self):
+        with self._lock:
+            self.tracks = []
+            self.pending = []
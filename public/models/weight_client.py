@@ -0,0 +1,223 @@
+"""
+HTTP client for the SFM weight API used by the desktop app.
+
+One pooled `requests.Session` (keep-alive, timeouts, retries on idempotent GETs)
+is shared by every call. DOC → sampling_id lookups use the indexed
+`/api/samplings/lookup` endpoint: answers are cached per DOC, re-checked after the
+TTL with If-None-Match (a 304 has no body), and unknown DOCs are not re-asked
+more often than `min_refresh_interval`. Against a server without that endpoint
+the client falls back to a lean, conditional `/api/cages` index. The blocking
+work runs on a single worker thread whose results are handed back through a
+`dispatch` callable (e.g. Kivy's `Clock.schedule_once`) so the UI never waits.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_BASE_URL = os.getenv("API_BASE_URL", "https://sfm-ver-two.on-forge.com")
+
+
+class ApiError(Exception):
+    """Raised when the API rejects a request or returns an unexpected payload."""
+
+    def __init__(self, message, status_code=None, payload=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.payload = payload
+
+
+class WeightApiClient:
+    """
+    Args:
+        api_key: Value sent as the `key` query parameter.
+        base_url: API host, e.g. "http://127.0.0.1:8765" for a local stand-in.
+        timeout: `(connect, read)` timeout in seconds for every request.
+        doc_ttl: Seconds before the DOC index is considered stale.
+        min_refresh_interval: Minimum seconds between index rebuilds triggered by
+            unknown DOCs, so typos don't re-download the cages list on every click.
+        pool_size: Max keep-alive connections to the API host.
+    """
+
+    def __init__(self, api_key, base_url=API_BASE_URL, timeout=(3.05, 15), doc_ttl=300, min_refresh_interval=10, pool_size=4):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.doc_ttl = doc_ttl
+        self.min_refresh_interval = min_refresh_interval
+
+        self.session = requests.Session()
+        retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept": "application/json"})
+
+        # doc -> (sampling_id or None, etag, checked_at) from /api/samplings/lookup
+        self._doc_cache = {}
+        self._lookup_supported = True
+        self.lookup_stats = {"requests": 0, "not_modified": 0, "cache_hits": 0}
+
+        self._doc_index = {}
+        self._index_etag = None
+        self._index_loaded_at = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="weight-api")
+
+    def _url(self, path):
+        return f"{self.base_url}/api/{path}"
+
+    def _json(self, response):
+        try:
+            payload = response.json()
+        except ValueError:
+            raise ApiError(f"Invalid JSON from {response.url}", response.status_code)
+
+        if response.status_code != 200 or "data" not in payload:
+            message = payload.get("message") or payload.get("errors") or "Unknown error"
+            raise ApiError(str(message), response.status_code, payload)
+        return payload
+
+    # --- DOC index ---
+
+    def refresh_index(self):
+        """Rebuild the DOC index from a lean /api/cages (fallback for servers without the lookup)."""
+        params = {"key": self.api_key, "fields": "id", "sampling_fields": "id,doc"}
+        headers = {"If-None-Match": self._index_etag} if self._index_etag else {}
+        response = self.session.get(self._url("cages"), params=params, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            with self._lock:
+                self._index_loaded_at = time.monotonic()
+                return len(self._doc_index)
+        payload = self._json(response)
+
+        index = {}
+        for cage in payload["data"]:
+            for sampling in cage.get("samplings", []):
+                if sampling.get("doc"):
+                    index[sampling["doc"]] = sampling.get("id")
+
+        with self._lock:
+            self._doc_index = index
+            self._index_etag = response.headers.get("ETag")
+            self._index_loaded_at = time.monotonic()
+        return len(index)
+
+    def _index_age(self):
+        if self._index_loaded_at is None:
+            return None
+        return time.monotonic() - self._index_loaded_at
+
+    def lookup_sampling_id(self, doc):
+        """Return the sampling id for `doc`, or None if the API doesn't know it."""
+        if not self._lookup_supported:
+            return self._lookup_from_index(doc)
+
+        with self._lock:
+            entry = self._doc_cache.get(doc)
+        if entry is not None:
+            sampling_id, etag, checked_at = entry
+            # Known DOCs are trusted for the TTL; unknown ones are re-asked sooner.
+            max_age = self.doc_ttl if sampling_id is not None else self.min_refresh_interval
+            if time.monotonic() - checked_at < max_age:
+                self.lookup_stats["cache_hits"] += 1
+                return sampling_id
+        else:
+            etag = None
+
+        headers = {"If-None-Match": etag} if etag else {}
+        response = self.session.get(
+            self._url("samplings/lookup"),
+            params={"key": self.api_key, "doc": doc},
+            headers=headers,
+            timeout=self.timeout,
+        )
+        self.lookup_stats["requests"] += 1
+
+        if response.status_code == 304 and entry is not None:
+            self.lookup_stats["not_modified"] += 1
+            sampling_id = entry[0]
+        elif response.status_code == 404:
+            try:
+                payload = response.json()
+            except ValueError:
+                payload = {}
+            if "data" not in payload:
+                # The route itself is missing: an older server.
+                self._lookup_supported = False
+                return self._lookup_from_index(doc)
+            sampling_id, etag = None, None
+        else:
+            data = self._json(response)["data"]
+            sampling_id, etag = data.get("id"), response.headers.get("ETag")
+
+        with self._lock:
+            self._doc_cache[doc] = (sampling_id, etag, time.monotonic())
+        return sampling_id
+
+    def _lookup_from_index(self, doc):
+        age = self._index_age()
+        if age is None or age > self.doc_ttl:
+            self.refresh_index()
+        elif doc not in self._doc_index and age > self.min_refresh_interval:
+            # Possibly a sampling created after the last refresh.
+            self.refresh_index()
+
+        with self._lock:
+            return self._doc_index.get(doc)
+
+    def resolve_doc_async(self, doc, on_done, dispatch=None):
+        """
+        Run `lookup_sampling_id` on the worker thread.
+
+        `on_done(doc, sampling_id, error)` is invoked through `dispatch(fn)`
+        (default: call directly on the worker thread); `error` is None on
+        success, in which case a None `sampling_id` means the DOC is unknown.
+        """
+        dispatch = dispatch or (lambda fn: fn())
+
+        def job():
+            try:
+                sampling_id = self.lookup_sampling_id(doc)
+            except Exception as e:
+                dispatch(lambda exc=e: on_done(doc, None, exc))
+            else:
+                dispatch(lambda: on_done(doc, sampling_id, None))
+
+        return self._executor.submit(job)
+
+    def invalidate(self, doc=None):
+        """Forget one DOC (or the whole index) so the next lookup hits the API."""
+        with self._lock:
+            if doc is None:
+                self._doc_cache = {}
+                self._doc_index = {}
+                self._index_etag = None
+                self._index_loaded_at = None
+            else:
+                self._doc_cache.pop(doc, None)
+                if self._doc_index.pop(doc, None) is not None:
+                    # The pruned index no longer matches its ETag; a 304 would keep the gap.
+                    self._index_etag = None
+                    self._index_loaded_at = None
+
+    # --- Weight ---
+
+    def submit_weights_bulk(self, measurements):
+        """POST many measurements to /api/weight/bulk; returns the API `data` dict."""
+        response = self.session.post(
+            self._url("weight/bulk"),
+            params={"key": self.api_key},
+            json={"measurements": measurements},
+            timeout=self.timeout,
+        )
+        return self._json(response)["data"]
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
@@ -10,9 +10,15 @@
 // Cages endpoint - Get all cages with samplings
 Route::get('cages', [DocsController::class, 'index']);
 
+// DOC lookup endpoint - Resolve one DOC to its sampling (indexed, conditional)
+Route::get('samplings/lookup', [DocsController::class, 'lookupDoc']);
+
 // Weight calculation endpoint - Calculate weight from dimensions
 Route::post('weight', [DocsController::class, 'getWeight']);
 
+// Bulk weight endpoint - Fill many samples in one request (offline device queues)
+Route::post('weight/bulk', [DocsController::class, 'getWeightBulk']);
+
 // Calculate samplings endpoint - Get next sample to measure
 Route::post('sampling/calculate', [DocsController::class, 'calculateSamplings']);
 
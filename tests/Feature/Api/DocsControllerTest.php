@@ -72,6 +72,90 @@ public function test_cages_endpoint_returns_cages()
         $this->assertCount(1, $response->json('data'));
     }
 
+    public function test_cages_endpoint_paginates_and_selects_fields()
+    {
+        $investor = Investor::factory()->create();
+        $feedType = FeedType::factory()->create();
+        $cages = Cage::factory()->count(3)->create([
+            'investor_id' => $investor->id,
+            'feed_types_id' => $feedType->id,
+        ]);
+
+        Sampling::factory()->create([
+            'investor_id' => $investor->id,
+            'cage_no' => $cages[0]->id,
+            'doc' => 'DOC-PAGE-TEST',
+        ]);
+
+        $response = $this->getJson("/api/cages?key={$this->apiKey}&fields=id&sampling_fields=doc&per_page=2");
+        $response->assertStatus(200)
+                 ->assertJsonPath('meta.total', 3)
+                 ->assertJsonPath('meta.last_page', 2)
+                 ->assertJsonPath('data.0.samplings.0.doc', 'DOC-PAGE-TEST');
+
+        $this->assertCount(2, $response->json('data'));
+        $this->assertEquals(['id', 'samplings'], array_keys($response->json('data.0')));
+        $this->assertArrayNotHasKey('date_sampling', $response->json('data.0.samplings.0'));
+    }
+
+    public function test_cages_endpoint_returns_304_for_matching_etag()
+    {
+        $investor = Investor::factory()->create();
+        $feedType = FeedType::factory()->create();
+        Cage::factory()->create([
+            'investor_id' => $investor->id,
+            'feed_types_id' => $feedType->id,
+        ]);
+
+        $first = $this->getJson("/api/cages?key={$this->apiKey}");
+        $first->assertStatus(200)->assertHeader('ETag');
+
+        $second = $this->getJson("/api/cages?key={$this->apiKey}", ['If-None-Match' => $first->headers->get('ETag')]);
+        $second->assertStatus(304);
+        $this->assertEmpty($second->getContent());
+    }
+
+    public function test_doc_lookup_returns_only_the_sampling()
+    {
+        $investor = Investor::factory()->create();
+        $feedType = FeedType::factory()->create();
+        $cage = Cage::factory()->create([
+            'investor_id' => $investor->id,
+            'feed_types_id' => $feedType->id,
+        ]);
+
+        $sampling = Sampling::factory()->create([
+            'investor_id' => $investor->id,
+            'cage_no' => $cage->id,
+            'doc' => 'DOC-LOOKUP-TEST',
+        ]);
+
+        $response = $this->getJson("/api/samplings/lookup?key={$this->apiKey}&doc=DOC-LOOKUP-TEST");
+        $response->assertStatus(200)
+                 ->assertJsonPath('data.id', $sampling->id)
+                 ->assertJsonPath('data.doc', 'DOC-LOOKUP-TEST')
+                 ->assertHeader('ETag');
+
+        $this->assertArrayNotHasKey('samples', $response->json('data'));
+
+        $cached = $this->getJson(
+            "/api/samplings/lookup?key={$this->apiKey}&doc=DOC-LOOKUP-TEST",
+            ['If-None-Match' => $response->headers->get('ETag')]
+        );
+        $cached->assertStatus(304);
+    }
+
+    public function test_doc_lookup_unknown_doc_returns_404()
+    {
+        $response = $this->getJson("/api/samplings/lookup?key={$this->apiKey}&doc=DOC-DOES-NOT-EXIST");
+        $response->assertStatus(404)
+                 ->assertJson(['data' => null]);
+
+        $this->getJson("/api/samplings/lookup?key={$this->apiKey}")
+             ->assertStatus(422)
+             ->assertJsonValidationErrors(['doc']);
+    }
+
     public function test_weight_endpoint_requires_valid_data()
     {
         $response = $this->postJson("/api/weight?key={$this->apiKey}", []);
@@ -199,6 +283,126 @@ public function test_weight_endpoint_rejects_when_all_samples_filled()
                  ->assertJson(['message' => 'All data is filled in this sampling.']);
     }
 
+    public function test_bulk_weight_endpoint_requires_measurements()
+    {
+        $response = $this->postJson("/api/weight/bulk?key={$this->apiKey}", []);
+        $response->assertStatus(422)
+                 ->assertJsonValidationErrors(['measurements']);
+    }
+
+    public function test_bulk_weight_endpoint_fills_samples_in_one_request()
+    {
+        $investor = Investor::factory()->create();
+        $feedType = FeedType::factory()->create();
+        $cage = Cage::factory()->create([
+            'investor_id' => $investor->id,
+            'feed_types_id' => $feedType->id,
+        ]);
+
+        $sampling = Sampling::factory()->create([
+            'investor_id' => $investor->id,
+            'cage_no' => $cage->id,
+            'doc' => 'DOC-BULK-TEST-1',
+        ]);
+
+        $measurements = [];
+        for ($i = 1; $i <= 6; $i++) {
+            $measurements[] = [
+                'doc' => $sampling->doc,
+                'height' => 2.27,
+                'width' => 8.23,
+                'unit' => 'in',
+                'idempotency_key' => "bulk-key-{$i}",
+            ];
+        }
+        $measurements[] = ['doc' => 'DOC-DOES-NOT-EXIST', 'height' => 10, 'width' => 5];
+
+        $response = $this->postJson("/api/weight/bulk?key={$this->apiKey}", [
+            'measurements' => $measurements,
+        ]);
+
+        $response->assertStatus(200)
+                 ->assertJsonPath('data.created', 5)
+                 ->assertJsonPath('data.rejected', 2)
+                 ->assertJsonPath('data.results.5.message', 'All data is filled in this sampling.')
+                 ->assertJsonPath('data.results.6.message', 'The selected doc is invalid.')
+                 ->assertJsonPath("data.samplings.{$sampling->doc}.remaining_samples", 0);
+
+        $filled = Sample::where('sampling_id', $sampling->id)->where('weight', '>', 0)->get();
+        $this->assertCount(5, $filled);
+        $this->assertEqualsWithDelta(20.9, (float) $filled->first()->length, 0.05);
+        $this->assertEqualsWithDelta(5.77, (float) $filled->first()->width, 0.05);
+    }
+
+    public function test_bulk_weight_endpoint_ignores_repeated_idempotency_keys()
+    {
+        $investor = Investor::factory()->create();
+        $feedType = FeedType::factory()->create();
+        $cage = Cage::factory()->create([
+            'investor_id' => $investor->id,
+            'feed_types_id' => $feedType->id,
+        ]);
+
+        $sampling = Sampling::factory()->create([
+            'investor_id' => $investor->id,
+            'cage_no' => $cage->id,
+            'doc' => 'DOC-BULK-TEST-2',
+        ]);
+
+        $payload = [
+            'measurements' => [
+                ['doc' => $sampling->doc, 'height' => 10, 'width' => 5, 'idempotency_key' => 'retry-key-1'],
+            ],
+        ];
+
+        $first = $this->postJson("/api/weight/bulk?key={$this->apiKey}", $payload);
+        $first->assertStatus(200)->assertJsonPath('data.created', 1);
+
+        // A retried upload of the same measurement must not fill a second slot.
+        $retry = $this->postJson("/api/weight/bulk?key={$this->apiKey}", $payload);
+        $retry->assertStatus(200)
+              ->assertJsonPath('data.created', 0)
+              ->assertJsonPath('data.duplicates', 1)
+              ->assertJsonPath('data.results.0.sample_no', $first->json('data.results.0.sample_no'));
+
+        $this->assertEquals(1, Sample::where('sampling_id', $sampling->id)->where('weight', '>', 0)->count());
+    }
+
+    public function test_doc_with_several_samplings_resolves_to_the_newest_everywhere()
+    {
+        $investor = Investor::factory()->create();
+        $feedType = FeedType::factory()->create();
+        $cage = Cage::factory()->create([
+            'investor_id' => $investor->id,
+            'feed_types_id' => $feedType->id,
+        ]);
+
+        $attributes = [
+            'investor_id' => $investor->id,
+            'cage_no' => $cage->id,
+            'doc' => 'DOC-SHARED-TEST',
+        ];
+        $older = Sampling::factory()->create($attributes);
+        $newer = Sampling::factory()->create($attributes);
+
+        $this->getJson("/api/samplings/lookup?key={$this->apiKey}&doc=DOC-SHARED-TEST")
+             ->assertStatus(200)
+             ->assertJsonPath('data.id', $newer->id);
+
+        $this->postJson("/api/weight?key={$this->apiKey}", [
+            'height' => 10,
+            'width' => 5,
+            'doc' => 'DOC-SHARED-TEST',
+        ])->assertStatus(200);
+
+        $this->postJson("/api/weight/bulk?key={$this->apiKey}", [
+            'measurements' => [['doc' => 'DOC-SHARED-TEST', 'height' => 10, 'width' => 5]],
+        ])->assertStatus(200)->assertJsonPath('data.created', 1);
+
+        $this->assertEquals(2, Sample::where('sampling_id', $newer->id)->where('weight', '>', 0)->count());
+        $this->assertEquals(0, Sample::where('sampling_id', $older->id)->where('weight', '>', 0)->count());
+    }
+
     public function test_calculate_samplings_endpoint_requires_sampling_id()
     {
         $response = $this->postJson("/api/sampling/calculate?key={$this->apiKey}", []);